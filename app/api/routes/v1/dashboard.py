@@ -1,277 +1,86 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
 from fastapi.responses import HTMLResponse
 from app.services.monitoring import system_monitor
-import json
-from datetime import datetime
-import subprocess
-import sys
-import os
+import time
 
 router = APIRouter(prefix="/dashboard", tags=["Dashboard"])
 
+# Chart range -> (rollup resolution, number of periods)
+RANGES = {"1h": ("minute", 60), "2h": ("minute", 120), "24h": ("hour", 24), "7d": ("hour", 168)}
 
-def run_self_healing_test():
-    """Run the self-healing test in a background task"""
-    try:
-        python_executable = sys.executable
-        script_path = os.path.join(os.getcwd(), "test_ai_integration.py")
-        subprocess.run(
-            [python_executable, script_path, "self-healing"],
-            check=True,
-            capture_output=True,
-        )
-    except Exception as e:
-        print(f"Error running self-healing test: {str(e)}")
+# Rollup service name of the LLM cost series
+COST_SERVICE = "LLM"
 
 
-@router.post("/run-self-healing-test")
-async def trigger_self_healing_test(background_tasks: BackgroundTasks):
-    """
-    Triggers the self-healing test in the background
-    """
-    try:
-        background_tasks.add_task(run_self_healing_test)
-        return {
-            "status": "success",
-            "message": "Self-healing test started in background",
-        }
-    except Exception as e:
-        raise HTTPException(
-            status_code=500, detail=f"Error triggering self-healing test: {str(e)}"
-        )
+def _summary(operations: Optional[dict] = None) -> dict:
+    totals = system_monitor._totals(operations)
+    uptime = time.time() - system_monitor.start_time
+    requests = totals["requests"]
+    return {
+        "uptime": uptime,
+        "uptime_formatted": system_monitor._format_duration(uptime),
+        "total_requests": requests,
+        "error_rate": 1 - totals["successful"] / requests if requests else 0.0,
+        "retry_rate": totals["retries"] / requests if requests else 0.0,
+        "avg_response_time": totals["duration"] / requests if requests else 0.0,
+    }
+
+
+def _recent_events() -> dict:
+    # Copy the deques first: other threads append to them while we read
+    return {
+        "recent_errors": list(system_monitor.errors)[-5:],
+        "recent_retries": list(system_monitor.retries)[-5:],
+    }
 
 
 @router.get("/monitoring", response_class=HTMLResponse)
 async def get_monitoring_dashboard():
     """
-    Renders a dashboard with system monitoring information.
-    Displays metrics like request counts, error rates, and system health.
+    Renders the monitoring dashboard.
+    The page is static; its charts are drawn in the browser from /dashboard/data.
     """
-    try:
-        # Get monitoring data
-        system_monitor.print_summary()
-
-        # Get statistics for HTML display
-        stats = system_monitor.get_service_stats()
-
-        # Format the monitoring data for display
-        uptime = system_monitor._format_duration(
-            (datetime.now() - system_monitor.start_time).total_seconds()
-        )
-        total_requests = sum(service["requests"] for service in stats)
-        error_rate = system_monitor.get_error_rate()
-        retry_rate = system_monitor.get_retry_rate()
-        avg_response_time = system_monitor.get_avg_response_time()
+    return DASHBOARD_HTML
 
-        # Get recent errors and retries
-        recent_errors = system_monitor.errors[-5:] if system_monitor.errors else []
-        recent_retries = system_monitor.retries[-5:] if system_monitor.retries else []
 
-        # Build HTML response
-        html = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <title>System Monitoring Dashboard</title>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <style>
-                body {{
-                    font-family: Arial, sans-serif;
-                    line-height: 1.6;
-                    color: #333;
-                    max-width: 1200px;
-                    margin: 0 auto;
-                    padding: 20px;
-                }}
-                h1, h2, h3 {{
-                    color: #2c3e50;
-                }}
-                .card {{
-                    background: #fff;
-                    border-radius: 5px;
-                    box-shadow: 0 2px 5px rgba(0,0,0,0.1);
-                    padding: 20px;
-                    margin-bottom: 20px;
-                }}
-                .metric {{
-                    display: inline-block;
-                    text-align: center;
-                    margin: 10px;
-                    min-width: 150px;
-                }}
-                .metric .value {{
-                    font-size: 24px;
-                    font-weight: bold;
-                    color: #3498db;
-                }}
-                .metric .label {{
-                    font-size: 14px;
-                    color: #7f8c8d;
-                }}
-                table {{
-                    width: 100%;
-                    border-collapse: collapse;
-                    margin-top: 10px;
-                }}
-                th, td {{
-                    padding: 12px 15px;
-                    text-align: left;
-                    border-bottom: 1px solid #ddd;
-                }}
-                th {{
-                    background-color: #f2f2f2;
-                }}
-                tr:hover {{
-                    background-color: #f5f5f5;
-                }}
-                .error {{
-                    color: #e74c3c;
-                }}
-                .retry {{
-                    color: #f39c12;
-                }}
-                .button {{
-                    background: #3498db;
-                    color: white;
-                    border: none;
-                    padding: 10px 15px;
-                    border-radius: 4px;
-                    cursor: pointer;
-                    margin-right: 10px;
-                }}
-                .refresh {{
-                    float: right;
-                }}
-                .button:hover {{
-                    background: #2980b9;
-                }}
-                .button.test {{
-                    background: #e67e22;
-                }}
-                .button.test:hover {{
-                    background: #d35400;
-                }}
-                .actions {{
-                    margin-bottom: 20px;
-                }}
-            </style>
-        </head>
-        <body>
-            <div class="actions">
-                <button class="button refresh" onclick="location.reload()">Refresh Data</button>
-                <button class="button test" onclick="runSelfHealingTest()">Run Self-Healing Test</button>
-            </div>
-            <h1>System Monitoring Dashboard</h1>
-            <div class="card">
-                <h2>System Overview</h2>
-                <div>
-                    <div class="metric">
-                        <div class="value">{uptime}</div>
-                        <div class="label">Uptime</div>
-                    </div>
-                    <div class="metric">
-                        <div class="value">{total_requests}</div>
-                        <div class="label">Total Requests</div>
-                    </div>
-                    <div class="metric">
-                        <div class="value">{error_rate:.2f}%</div>
-                        <div class="label">Error Rate</div>
-                    </div>
-                    <div class="metric">
-                        <div class="value">{retry_rate:.2f}%</div>
-                        <div class="label">Retry Rate</div>
-                    </div>
-                    <div class="metric">
-                        <div class="value">{avg_response_time:.2f}s</div>
-                        <div class="label">Avg Response Time</div>
-                    </div>
-                </div>
-            </div>
-            
-            <div class="card">
-                <h2>Service Statistics</h2>
-                <table>
-                    <tr>
-                        <th>Service</th>
-                        <th>Requests</th>
-                        <th>Success</th>
-                        <th>Errors</th>
-                        <th>Retries</th>
-                        <th>Error Rate</th>
-                        <th>Avg Time</th>
-                    </tr>
-                    {"".join([f"""<tr>
-                        <td>{service['name']}</td>
-                        <td>{service['requests']}</td>
-                        <td>{service['success']}</td>
-                        <td>{service['errors']}</td>
-                        <td>{service['retries']}</td>
-                        <td>{service['error_rate']:.2f}%</td>
-                        <td>{service['avg_time']:.2f}s</td>
-                    </tr>""" for service in stats])}
-                </table>
-            </div>
-            
-            <div class="card">
-                <h2>Recent Errors</h2>
-                {f'<table><tr><th>Time</th><th>Service</th><th>Operation</th><th>Error</th></tr>' +
-                ''.join([f"""<tr>
-                    <td>{datetime.fromtimestamp(error['timestamp']).strftime('%H:%M:%S')}</td>
-                    <td>{error['service']}</td>
-                    <td>{error['operation']}</td>
-                    <td class="error">{error['message']}</td>
-                </tr>""" for error in reversed(recent_errors)]) + '</table>'
-                if recent_errors else "<p>No recent errors</p>"}
-            </div>
-            
-            <div class="card">
-                <h2>Recent Retries</h2>
-                {f'<table><tr><th>Time</th><th>Service</th><th>Operation</th><th>Attempt</th><th>Message</th></tr>' +
-                ''.join([f"""<tr>
-                    <td>{datetime.fromtimestamp(retry['timestamp']).strftime('%H:%M:%S')}</td>
-                    <td>{retry['service']}</td>
-                    <td>{retry['operation']}</td>
-                    <td>{retry['attempt']}</td>
-                    <td class="retry">{retry['message']}</td>
-                </tr>""" for retry in reversed(recent_retries)]) + '</table>'
-                if recent_retries else "<p>No recent retries</p>"}
-            </div>
-            
-            <script>
-                // Auto-refresh the page every 30 seconds
-                setTimeout(function() {{
-                    location.reload();
-                }}, 30000);
-                
-                // Function to run self-healing test
-                function runSelfHealingTest() {{
-                    fetch('/api/v1/dashboard/run-self-healing-test', {{
-                        method: 'POST',
-                        headers: {{
-                            'Content-Type': 'application/json'
-                        }}
-                    }})
-                    .then(response => response.json())
-                    .then(data => {{
-                        alert('Self-healing test started. The dashboard will refresh to show results.');
-                        setTimeout(() => location.reload(), 5000);
-                    }})
-                    .catch(error => {{
-                        console.error('Error:', error);
-                        alert('Error starting self-healing test. Check console for details.');
-                    }});
-                }}
-            </script>
-        </body>
-        </html>
-        """
-
-        return html
-    except Exception as e:
+@router.get("/data")
+def get_dashboard_data(range: str = Query("1h", description="Chart range: 1h, 2h, 24h or 7d")):
+    """
+    Chart data for the dashboard: per-minute or per-hour latency percentiles,
+    throughput, errors and LLM cost per operation, read from the monitor's
+    precomputed rollups so the cost does not grow with the traffic
+    """
+    if range not in RANGES:
         raise HTTPException(
-            status_code=500, detail=f"Error generating monitoring dashboard: {str(e)}"
+            status_code=400, detail=f"Unknown range {range!r}, expected one of {', '.join(RANGES)}"
         )
+    resolution, periods = RANGES[range]
+    rollups = system_monitor.get_series(resolution, periods)
+    operations = {}
+    costs = {}
+    for name, points in rollups["series"].items():
+        service, operation = name.split("/", 1)
+        if service == COST_SERVICE:
+            costs[operation] = [
+                {key: point[key] for key in ("t", "cost", "input_tokens", "output_tokens")}
+                for point in points
+            ]
+        else:
+            operations[name] = [
+                {key: point[key] for key in ("t", "requests", "errors", "retries", "throughput", "avg", "p50", "p95")}
+                for point in points
+            ]
+    return {
+        "range": range,
+        "resolution": resolution,
+        "period": rollups["period"],
+        "starts": rollups["starts"],
+        "summary": _summary(),
+        "operations": operations,
+        "costs": costs,
+        **_recent_events(),
+    }
 
 
 @router.get("/metrics")
@@ -280,29 +89,216 @@ async def get_monitoring_metrics():
     Returns JSON metrics data for the system monitoring
     """
     try:
-        stats = system_monitor.get_service_stats()
-        uptime = (datetime.now() - system_monitor.start_time).total_seconds()
-
-        metrics = {
-            "system": {
-                "uptime": uptime,
-                "uptime_formatted": system_monitor._format_duration(uptime),
-                "total_requests": sum(service["requests"] for service in stats),
-                "error_rate": system_monitor.get_error_rate(),
-                "retry_rate": system_monitor.get_retry_rate(),
-                "avg_response_time": system_monitor.get_avg_response_time(),
-            },
-            "services": stats,
-            "recent_errors": (
-                system_monitor.errors[-5:] if system_monitor.errors else []
-            ),
-            "recent_retries": (
-                system_monitor.retries[-5:] if system_monitor.retries else []
-            ),
+        # Merge the monitor's thread shards once for both sections
+        operations = system_monitor.operations
+        return {
+            "system": _summary(operations),
+            "services": system_monitor.get_service_stats(operations),
+            "latency": system_monitor.regressions.status(),
+            **_recent_events(),
         }
-
-        return metrics
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Error retrieving monitoring metrics: {str(e)}"
         )
+
+
+DASHBOARD_HTML = """<!DOCTYPE html>
+<html>
+<head>
+    <title>System Monitoring Dashboard</title>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <style>
+        body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; max-width: 1200px; margin: 0 auto; padding: 20px; }
+        h1, h2 { color: #2c3e50; }
+        h2 { font-size: 18px; margin: 0 0 10px; }
+        .card { background: #fff; border-radius: 5px; box-shadow: 0 2px 5px rgba(0,0,0,0.1); padding: 20px; margin-bottom: 20px; }
+        .metric { display: inline-block; text-align: center; margin: 10px; min-width: 150px; }
+        .metric .value { font-size: 24px; font-weight: bold; color: #3498db; }
+        .metric .label { font-size: 14px; color: #7f8c8d; }
+        .grid { display: grid; grid-template-columns: 1fr 1fr; gap: 20px; }
+        .grid .card { margin-bottom: 0; }
+        svg { width: 100%; height: 220px; }
+        svg text { font-size: 10px; fill: #7f8c8d; }
+        .legend span { display: inline-block; margin-right: 12px; font-size: 12px; }
+        .legend i { display: inline-block; width: 10px; height: 10px; margin-right: 4px; }
+        table { width: 100%; border-collapse: collapse; margin-top: 10px; }
+        th, td { padding: 8px 12px; text-align: left; border-bottom: 1px solid #ddd; }
+        th { background-color: #f2f2f2; }
+        .error { color: #e74c3c; }
+        .retry { color: #f39c12; }
+        .button { background: #3498db; color: white; border: none; padding: 10px 15px; border-radius: 4px; cursor: pointer; margin-right: 10px; }
+        .button:hover { background: #2980b9; }
+        .actions { margin-bottom: 20px; }
+        .actions select { padding: 9px; float: right; }
+    </style>
+</head>
+<body>
+    <div class="actions">
+        <select id="range" onchange="refresh()">
+            <option value="1h">Last hour (per minute)</option>
+            <option value="2h">Last 2 hours (per minute)</option>
+            <option value="24h">Last 24 hours (per hour)</option>
+            <option value="7d">Last 7 days (per hour)</option>
+        </select>
+        <button class="button" onclick="refresh()">Refresh Data</button>
+    </div>
+    <h1>System Monitoring Dashboard</h1>
+    <div class="card">
+        <h2>System Overview</h2>
+        <div id="summary"></div>
+    </div>
+    <div class="grid">
+        <div class="card"><h2>p95 Latency (s)</h2><svg id="p95"></svg><div class="legend" id="p95-legend"></div></div>
+        <div class="card"><h2>p50 Latency (s)</h2><svg id="p50"></svg><div class="legend" id="p50-legend"></div></div>
+        <div class="card"><h2>Throughput (successful requests / min)</h2><svg id="throughput"></svg><div class="legend" id="throughput-legend"></div></div>
+        <div class="card"><h2>Errors and Retries</h2><svg id="failures"></svg><div class="legend" id="failures-legend"></div></div>
+        <div class="card"><h2>LLM Cost ($)</h2><svg id="cost"></svg><div class="legend" id="cost-legend"></div></div>
+        <div class="card"><h2>LLM Tokens</h2><svg id="tokens"></svg><div class="legend" id="tokens-legend"></div></div>
+    </div>
+    <div class="card" style="margin-top: 20px">
+        <h2>Recent Errors</h2>
+        <div id="errors"></div>
+    </div>
+    <div class="card">
+        <h2>Recent Retries</h2>
+        <div id="retries"></div>
+    </div>
+
+    <script>
+        const COLORS = ["#3498db", "#e74c3c", "#2ecc71", "#9b59b6", "#f39c12", "#1abc9c", "#34495e", "#e67e22", "#7f8c8d", "#c0392b"];
+        const SVG = "http://www.w3.org/2000/svg";
+
+        function escapeHtml(text) {
+            const div = document.createElement("div");
+            div.textContent = String(text);
+            return div.innerHTML;
+        }
+
+        function formatTime(t, resolution) {
+            const date = new Date(t * 1000);
+            const time = date.toTimeString().slice(0, 5);
+            return resolution === "hour" ? (date.getMonth() + 1) + "/" + date.getDate() + " " + time : time;
+        }
+
+        function svgElement(name, attributes) {
+            const element = document.createElementNS(SVG, name);
+            for (const key in attributes) element.setAttribute(key, attributes[key]);
+            return element;
+        }
+
+        // lines: [{name, values}] with one value (or null) per start
+        function drawChart(id, starts, lines, resolution) {
+            const svg = document.getElementById(id);
+            const legend = document.getElementById(id + "-legend");
+            svg.innerHTML = "";
+            legend.innerHTML = "";
+            const width = svg.clientWidth || 500, height = svg.clientHeight || 220;
+            const left = 50, right = 10, top = 10, bottom = 20;
+            let max = 0;
+            lines.forEach(line => line.values.forEach(v => { if (v !== null && v > max) max = v; }));
+            if (!lines.length || max === 0) {
+                const text = svgElement("text", {x: width / 2, y: height / 2, "text-anchor": "middle"});
+                text.textContent = "No data in this range";
+                svg.appendChild(text);
+                return;
+            }
+            const x = i => left + (starts.length > 1 ? i / (starts.length - 1) : 0.5) * (width - left - right);
+            const y = v => top + (1 - v / max) * (height - top - bottom);
+            for (let i = 0; i <= 4; i++) {
+                const value = max * i / 4;
+                svg.appendChild(svgElement("line", {x1: left, x2: width - right, y1: y(value), y2: y(value), stroke: "#eee"}));
+                const label = svgElement("text", {x: left - 4, y: y(value) + 3, "text-anchor": "end"});
+                label.textContent = value < 1 ? value.toPrecision(2) : value.toFixed(value < 10 ? 1 : 0);
+                svg.appendChild(label);
+            }
+            [0, Math.floor((starts.length - 1) / 2), starts.length - 1].forEach(i => {
+                const label = svgElement("text", {x: x(i), y: height - 4, "text-anchor": "middle"});
+                label.textContent = formatTime(starts[i], resolution);
+                svg.appendChild(label);
+            });
+            lines.forEach((line, n) => {
+                const color = COLORS[n % COLORS.length];
+                // Periods without requests break the line instead of dropping to zero
+                let path = "", pen = "M";
+                line.values.forEach((v, i) => {
+                    if (v === null) { pen = "M"; return; }
+                    path += pen + x(i).toFixed(1) + "," + y(v).toFixed(1) + " ";
+                    pen = "L";
+                });
+                svg.appendChild(svgElement("path", {d: path, fill: "none", stroke: color, "stroke-width": 1.5}));
+                line.values.forEach((v, i) => {
+                    if (v !== null) svg.appendChild(svgElement("circle", {cx: x(i), cy: y(v), r: 1.5, fill: color}));
+                });
+                legend.innerHTML += '<span><i style="background:' + color + '"></i>' + escapeHtml(line.name) + "</span>";
+            });
+        }
+
+        function series(source, field) {
+            return Object.keys(source).map(name => ({name: name, values: source[name].map(p => p[field])}));
+        }
+
+        function drawSummary(summary) {
+            const metrics = [
+                [summary.uptime_formatted, "Uptime"],
+                [summary.total_requests, "Total Requests"],
+                [(summary.error_rate * 100).toFixed(2) + "%", "Error Rate"],
+                [(summary.retry_rate * 100).toFixed(2) + "%", "Retry Rate"],
+                [summary.avg_response_time.toFixed(2) + "s", "Avg Response Time"],
+            ];
+            document.getElementById("summary").innerHTML = metrics.map(m =>
+                '<div class="metric"><div class="value">' + escapeHtml(m[0]) + '</div><div class="label">' + m[1] + "</div></div>"
+            ).join("");
+        }
+
+        function drawEvents(id, events, columns, cssClass) {
+            const element = document.getElementById(id);
+            if (!events.length) {
+                element.innerHTML = "<p>None in this process</p>";
+                return;
+            }
+            const rows = events.slice().reverse().map(event =>
+                "<tr><td>" + new Date(event.timestamp * 1000).toTimeString().slice(0, 8) + "</td>" +
+                columns.map(c => '<td class="' + (c === "error_message" ? cssClass : "") + '">' + escapeHtml(event[c]) + "</td>").join("") +
+                "</tr>"
+            ).join("");
+            element.innerHTML = "<table><tr><th>Time</th>" + columns.map(c => "<th>" + c + "</th>").join("") + "</tr>" + rows + "</table>";
+        }
+
+        function refresh() {
+            const range = document.getElementById("range").value;
+            fetch("/api/v1/dashboard/data?range=" + range)
+                .then(response => response.json())
+                .then(data => {
+                    drawSummary(data.summary);
+                    const ops = data.operations;
+                    drawChart("p95", data.starts, series(ops, "p95"), data.resolution);
+                    drawChart("p50", data.starts, series(ops, "p50"), data.resolution);
+                    drawChart("throughput", data.starts, series(ops, "throughput"), data.resolution);
+                    const failures = [];
+                    Object.keys(ops).forEach(name => {
+                        if (ops[name].some(p => p.errors)) failures.push({name: name + " errors", values: ops[name].map(p => p.errors)});
+                        if (ops[name].some(p => p.retries)) failures.push({name: name + " retries", values: ops[name].map(p => p.retries)});
+                    });
+                    drawChart("failures", data.starts, failures, data.resolution);
+                    drawChart("cost", data.starts, series(data.costs, "cost"), data.resolution);
+                    const tokens = [];
+                    Object.keys(data.costs).forEach(model => {
+                        tokens.push({name: model + " input", values: data.costs[model].map(p => p.input_tokens)});
+                        tokens.push({name: model + " output", values: data.costs[model].map(p => p.output_tokens)});
+                    });
+                    drawChart("tokens", data.starts, tokens, data.resolution);
+                    drawEvents("errors", data.recent_errors, ["service", "operation", "error_message"], "error");
+                    drawEvents("retries", data.recent_retries, ["service", "operation", "attempt", "error_message"], "retry");
+                })
+                .catch(error => console.error("Error loading dashboard data:", error));
+        }
+
+        refresh();
+        // Only the data is reloaded, every 30 seconds
+        setInterval(refresh, 30000);
+    </script>
+</body>
+</html>
+"""
@@ -1,5 +1,8 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import JSONResponse
 from datetime import datetime
+from app.services.container import services
+from app.services.readiness import DOWN
 
 router = APIRouter(prefix="/health", tags=["Health"])
 
@@ -14,3 +17,33 @@ async def health_check():
         "timestamp": datetime.now().isoformat(),
         "service": "rohdex-poc",
     }
+
+
+@router.get("/ready")
+def readiness_check(request: Request):
+    """
+    Checks the template, job queue, LLM, IMAP and SMTP. Returns 503 if any of them is down;
+    degraded components are listed with their last observed latency
+    """
+    report = request.app.state.readiness.get_report()
+    report["timestamp"] = datetime.now().isoformat()
+    return JSONResponse(report, status_code=503 if report["status"] == DOWN else 200)
+
+
+@router.get("/cluster")
+def cluster_health(request: Request):
+    """
+    Metrics and costs aggregated over all worker processes, and the current poller
+    """
+    summary = request.app.state.metrics_publisher.cluster_summary()
+    election = getattr(request.app.state, "poller_election", None)
+    summary["email_poller"] = election.store.lease_holder(election.name) if election else None
+    return summary
+
+
+@router.get("/startup")
+async def startup_report():
+    """
+    How long each startup step took and which services have been created so far
+    """
+    return services.get_startup_report()
@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Request, Response
+from app.services.container import services
+from app.services.metrics_exporter import CONTENT_TYPE, render_prometheus
+from app.services.monitoring import system_monitor
+
+router = APIRouter(prefix="/metrics", tags=["Metrics"])
+
+
+@router.get("")
+def prometheus_metrics(request: Request):
+    """
+    Request counters, latency histograms, retries, errors, LLM usage and queue
+    gauges of this process in the Prometheus text format
+    """
+    upload_jobs = getattr(request.app.state, "upload_jobs", None)
+    extra_gauges = []
+    if upload_jobs is not None:
+        extra_gauges.append(
+            (
+                "rohdex_upload_jobs_active",
+                "Upload jobs queued or running in this process",
+                upload_jobs.get_stats()["active_tasks"],
+            )
+        )
+    body = render_prometheus(
+        system_monitor,
+        cost_tracker=getattr(services.peek("ai_service"), "cost_tracker", None),
+        extra_gauges=extra_gauges,
+    )
+    return Response(content=body, media_type=CONTENT_TYPE)
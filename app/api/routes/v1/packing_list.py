@@ -1,10 +1,25 @@
-from fastapi import APIRouter, HTTPException
-from app.services.email_service import EmailService
+import asyncio
+import json
+from typing import List, Optional, Tuple
+from fastapi import APIRouter, File, Header, HTTPException, Request, Response, UploadFile
+from fastapi.responses import StreamingResponse
+from starlette.datastructures import UploadFile as StarletteUploadFile
+from app.core.config import get_settings
+from app.services.admission import AdmissionRejected
+from app.services.batch_service import group_shipments
+from app.services.container import services
+from app.services.job_queue import DONE, FAILED, JobFile, classify_input_file
+from app.services.progress import JOB_COMPLETED, JOB_FAILED, progress_bus
+from app.services.upload_jobs import UploadJobManager, UploadJobStore
 
 #
 router = APIRouter(prefix="/packing-list", tags=["Packing List"])
 
 
+def _get_upload_jobs(request: Request) -> UploadJobManager:
+    return request.app.state.upload_jobs
+
+
 @router.post("/process-email")
 async def process_rohdex_email():
     """
@@ -12,7 +27,8 @@ async def process_rohdex_email():
     generates packing list, and sends response email.
     """
     try:
-        email_service = EmailService()
+        # The shared service, so its pooled SMTP connections are reused and closed at shutdown
+        email_service = services.get("email_service")
         result = await email_service.process_rohdex_emails()
         return {
             "status": "success",
@@ -23,3 +39,250 @@ async def process_rohdex_email():
         raise HTTPException(status_code=400, detail=str(ve))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing email: {str(e)}")
+
+
+def _too_busy(error: AdmissionRejected) -> HTTPException:
+    return HTTPException(
+        status_code=429, detail=str(error), headers={"Retry-After": str(error.retry_after)}
+    )
+
+
+def _etag(fingerprint: str) -> str:
+    return f'"{fingerprint}"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header against an ETag (weak comparison)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in candidates
+
+
+@router.post("/jobs", status_code=202)
+async def submit_packing_list_job(
+    request: Request,
+    response: Response,
+    partie_files: List[UploadFile] = File(...),
+    wahrheit_file: UploadFile = File(...),
+    template_file: Optional[UploadFile] = File(None),
+):
+    """
+    Accepts Partie and Wahrheit files and generates the packing list in the background.
+    Returns a job ID at once; poll the status URL and download the result when done.
+
+    Identical inputs are answered from the result cache with 200 and a finished job,
+    or with the job already running them. The ETag is a fingerprint of the inputs;
+    use it in If-None-Match when downloading the result.
+
+    Returns 429 with Retry-After when too many packing lists are queued.
+    """
+    upload_jobs = _get_upload_jobs(request)
+    try:
+        # Before the uploads are read into memory
+        upload_jobs.check_admission()
+    except AdmissionRejected as e:
+        raise _too_busy(e)
+    partie_job_files = [
+        JobFile(kind="partie", filename=f.filename, content=await f.read())
+        for f in partie_files
+    ]
+    wahrheit_job_file = JobFile(
+        kind="wahrheit", filename=wahrheit_file.filename, content=await wahrheit_file.read()
+    )
+    template_job_file = await upload_jobs.resolve_template(
+        JobFile(
+            kind="template", filename=template_file.filename, content=await template_file.read()
+        )
+        if template_file is not None
+        else None
+    )
+
+    try:
+        job, cached = await upload_jobs.submit(
+            partie_files=partie_job_files,
+            wahrheit_file=wahrheit_job_file,
+            template_file=template_job_file,
+        )
+    except AdmissionRejected as e:
+        raise _too_busy(e)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+
+    if job.fingerprint:
+        response.headers["ETag"] = _etag(job.fingerprint)
+    status_url = request.url_for("get_packing_list_job", job_id=job.id).path
+    response.headers["Location"] = status_url
+    if cached:
+        response.status_code = 200
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "cached": cached,
+        "status_url": status_url,
+        "result_url": request.url_for("get_packing_list_job_result", job_id=job.id).path,
+    }
+
+
+@router.get("/jobs/{job_id}")
+def get_packing_list_job(job_id: str, request: Request):
+    """
+    Returns the status of a submitted packing list job.
+    """
+    job = _get_upload_jobs(request).store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+
+def _job_status(store: UploadJobStore, job_id: str) -> Optional[Tuple[str, str]]:
+    """(status, JSON body) of an upload job or an email job key, None if unknown"""
+    job = store.get(job_id)
+    if job is not None:
+        return job.status, job.model_dump_json()
+    email_service = services.peek("email_service")
+    if email_service is not None:
+        email_job = email_service.job_queue.get_by_key(job_id)
+        if email_job is not None:
+            return email_job["status"], json.dumps(email_job)
+    return None
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_packing_list_job_events(
+    job_id: str,
+    request: Request,
+    last_event_id: Optional[str] = Header(None),
+):
+    """
+    Streams the progress of a job as server-sent events: job_started,
+    wahrheit_extracted, partie_extracted, section_rendered, document_rendered,
+    reply_sent (email jobs, id "email-<queue id>-<job id>") and job_completed or job_failed.
+    Reconnecting clients resume after the Last-Event-ID they received.
+    """
+    store = _get_upload_jobs(request).store
+    if not progress_bus.has_job(job_id):
+        if await asyncio.to_thread(_job_status, store, job_id) is None:
+            raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    after = int(last_event_id) if last_event_id and last_event_id.isdigit() else 0
+
+    async def event_stream():
+        async for event in progress_bus.stream(job_id, after=after):
+            if event is not None:
+                yield f"id: {event.seq}\nevent: {event.stage}\ndata: {event.model_dump_json()}\n\n"
+                continue
+            # No events for a while: the job may be running in another server process
+            status = await asyncio.to_thread(_job_status, store, job_id)
+            if status is not None and status[0] in (DONE, FAILED):
+                stage = JOB_COMPLETED if status[0] == DONE else JOB_FAILED
+                yield f"event: {stage}\ndata: {status[1]}\n\n"
+                return
+            yield ": keepalive\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/jobs/{job_id}/result")
+def get_packing_list_job_result(
+    job_id: str, request: Request, if_none_match: Optional[str] = Header(None)
+):
+    """
+    Downloads the generated packing list once the job is done.
+    Supports If-None-Match with the ETag returned on submission.
+    """
+    store = _get_upload_jobs(request).store
+    job = store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    if job.status == FAILED:
+        raise HTTPException(status_code=409, detail=f"Job failed: {job.error}")
+    if job.status != DONE:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+
+    headers = {"Content-Disposition": f'attachment; filename="packing_list_{job_id}.csv"'}
+    if job.fingerprint:
+        headers["ETag"] = _etag(job.fingerprint)
+        if _etag_matches(if_none_match, headers["ETag"]):
+            return Response(status_code=304, headers={"ETag": headers["ETag"]})
+
+    return Response(content=store.get_result(job_id), media_type="text/csv", headers=headers)
+
+
+@router.post("/batches")
+async def submit_packing_list_batch(request: Request):
+    """
+    Generates packing lists for many shipments in one request.
+
+    Send each file as a multipart field named after its shipment, e.g.
+    `-F "2410270=@Partie 36223.csv" -F "2410270=@Wahrheitsdatei.csv"`, plus an
+    optional `template_file`. The response is streamed as NDJSON: one line
+    listing the job of every shipment, then one line per shipment as it completes.
+    Returns 429 with Retry-After when the shipments do not fit into the job queue.
+    """
+    settings = get_settings()
+    try:
+        _get_upload_jobs(request).check_admission()
+    except AdmissionRejected as e:
+        raise _too_busy(e)
+    template_file = None
+    files = []
+    form = await request.form(max_files=settings.BATCH_MAX_SHIPMENTS * 20)
+    for field, value in form.multi_items():
+        if not isinstance(value, StarletteUploadFile):
+            continue
+        content = await value.read()
+        if field == "template_file":
+            template_file = JobFile(kind="template", filename=value.filename, content=content)
+            continue
+        kind = classify_input_file(value.filename)
+        if kind is None:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Cannot tell whether {value.filename} is a Partie or Wahrheit file",
+            )
+        files.append((field, JobFile(kind=kind, filename=value.filename, content=content)))
+
+    try:
+        shipments = group_shipments(files)
+        if len(shipments) > settings.BATCH_MAX_SHIPMENTS:
+            raise ValueError(
+                f"Batch has {len(shipments)} shipments, the limit is {settings.BATCH_MAX_SHIPMENTS}"
+            )
+        batch = await _get_upload_jobs(request).submit_batch(
+            shipments,
+            extraction_concurrency=settings.BATCH_EXTRACTION_CONCURRENCY,
+            template_file=template_file,
+        )
+    except AdmissionRejected as e:
+        raise _too_busy(e)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+
+    async def stream_results():
+        yield json.dumps(
+            {
+                "shipments": {
+                    shipment_id: {
+                        "job_id": job.id,
+                        "status_url": request.url_for("get_packing_list_job", job_id=job.id).path,
+                    }
+                    for shipment_id, job in batch.jobs.items()
+                }
+            }
+        ) + "\n"
+        async for shipment_id, job in batch.as_completed():
+            line = {"shipment": shipment_id, **job.model_dump()}
+            if job.status == DONE:
+                line["result_url"] = request.url_for(
+                    "get_packing_list_job_result", job_id=job.id
+                ).path
+            yield json.dumps(line) + "\n"
+        yield json.dumps({"summary": batch.scheduler.get_stats()}) + "\n"
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
@@ -12,14 +12,84 @@ class Settings(BaseSettings):
 
     # Email Server Settings (with defaults)
     IMAP_SERVER: str = "imap.gmail.com"
+    IMAP_PORT: int = 993
+    IMAP_SSL: bool = True  # Plaintext IMAP is only meant for local load tests
     SMTP_SERVER: str = "smtp.gmail.com"
     SMTP_PORT: int = 465
+    SMTP_USE_TLS: bool = True  # Plaintext SMTP is only meant for local load tests
+    SMTP_POOL_SIZE: int = 2  # Authenticated SMTP connections kept open
+    SMTP_KEEPALIVE_INTERVAL: int = 30  # seconds idle before a NOOP health check
 
     # Email Polling Configuration
     EMAIL_POLLING_ENABLED: bool = True
     EMAIL_POLLING_INTERVAL: int = 2  # seconds (2 seconds)
-    EMAIL_LABEL_FILTER: str = "Rohdex-Automation"
-    EMAIL_MAX_FETCH: int = 2  # Max emails to process per polling cycle
+    EMAIL_LABEL_FILTER: str = "Rohdex-Automation"  # Gmail label; ignored on other IMAP servers
+    EMAIL_MAX_FETCH: int = 10  # Max emails to process per polling cycle
+    EMAIL_WORKER_CONCURRENCY: int = 4  # Job workers processing queued messages in parallel
+
+    # IMAP IDLE Configuration (falls back to polling when the server lacks IDLE)
+    EMAIL_IDLE_ENABLED: bool = True
+    EMAIL_IDLE_TIMEOUT: int = 300  # seconds before IDLE is re-issued (rfc2177: < 29 min)
+    EMAIL_RECONNECT_MAX_BACKOFF: int = 60  # seconds, cap for reconnect backoff
+
+    # Incremental IMAP sync (UIDVALIDITY/UID/MODSEQ watermark per folder)
+    EMAIL_SUBJECT_FILTER: str = "ROHDEX"
+    EMAIL_SYNC_STATE_PATH: str = "data/email_sync_state.json"
+
+    # Archive attachments (ZIP / gzip) are expanded member by member in memory
+    ARCHIVE_MAX_MEMBER_BYTES: int = 50 * 1024 * 1024
+    ARCHIVE_MAX_TOTAL_BYTES: int = 200 * 1024 * 1024
+    ARCHIVE_MAX_MEMBERS: int = 500
+
+    # Job Queue Configuration (durable queue between ingestion and processing)
+    JOB_QUEUE_PATH: str = "data/jobs.sqlite3"
+    JOB_WORKERS_ENABLED: bool = True
+    JOB_LEASE_SECONDS: int = 900  # a crashed worker's job is retried after this
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_POLL_INTERVAL: float = 1.0  # seconds between claims when the queue is empty
+
+    # Upload Job Configuration (packing lists submitted over HTTP)
+    UPLOAD_JOB_CONCURRENCY: int = 2  # Uploaded jobs generated in parallel
+    UPLOAD_JOB_TIMEOUT: int = 900  # seconds a running job may take before it fails
+    UPLOAD_JOB_RETENTION: int = 86400  # seconds a job and its result are kept
+    BATCH_EXTRACTION_CONCURRENCY: int = 8  # LLM extractions in flight per batch
+    BATCH_MAX_SHIPMENTS: int = 500
+
+    # Admission control shared by uploads, batches and email jobs (per process)
+    ADMISSION_MAX_JOBS: int = 8  # packing lists generated at once
+    ADMISSION_MAX_BYTES: int = 256 * 1024 * 1024  # input bytes of those packing lists
+    ADMISSION_MAX_QUEUE: int = 500  # waiting jobs before uploads get 429
+
+    # Result cache for identical upload sets (served with ETags)
+    RESULT_CACHE_ENABLED: bool = True
+    RESULT_CACHE_PATH: str = "data/result_cache"
+    RESULT_CACHE_MAX_BYTES: int = 100 * 1024 * 1024
+    RESULT_CACHE_MAX_ENTRIES: int = 1000
+
+    # Cluster state shared by multiple server processes (uvicorn --workers)
+    CLUSTER_STATE_PATH: str = "data/cluster.sqlite3"
+    LEADER_LEASE_SECONDS: int = 30  # a dead poller is replaced after this
+    CLUSTER_METRICS_INTERVAL: float = 5.0  # seconds between metric snapshots
+    CLUSTER_METRICS_RETENTION: int = 7 * 86400  # seconds an exited worker is still counted
+
+    # Readiness probes (GET /api/v1/health/ready)
+    READINESS_CACHE_TTL: float = 15.0  # seconds a probe result is reused
+    READINESS_PROBE_TIMEOUT: float = 5.0
+    READINESS_LLM_WINDOW: int = 300  # seconds of LLM call outcomes considered
+    READINESS_LLM_MAX_FAILURES: int = 3  # consecutive failed calls until the LLM is down
+    READINESS_MAX_QUEUE_DEPTH: int = 100  # open email jobs before the queue is degraded
+
+    # Per-stage tracing of packing list jobs (python -m tools.waterfall <job id>)
+    TRACING_ENABLED: bool = True
+    TRACE_DIR: str = "logs/traces"  # JSON-lines span files, rotated and gzipped
+
+    # Latency regression detection per operation (p50/p95 against a rolling baseline)
+    LATENCY_REGRESSION_ENABLED: bool = True
+    LATENCY_BASELINE_PATH: str = "data/latency_baselines.json"  # kept across restarts
+    LATENCY_REGRESSION_WINDOW: int = 30  # successful requests per compared window
+    LATENCY_REGRESSION_BASELINE_WINDOWS: int = 10  # closed windows in the baseline
+    LATENCY_REGRESSION_P_VALUE: float = 0.001  # significance of the binomial test
+    LATENCY_REGRESSION_MIN_RATIO: float = 1.2  # minimum slowdown of p50/p95 to report
 
     # Template Configuration
     TEMPLATE_PACKING_LIST_PATH: str = "template/template_packing_list.csv"
@@ -13,6 +13,7 @@ Version History:
 HOW TO UPDATE THIS FILE:
 1. When modifying existing prompts:
    - Update the version history with a new version number
+   - Set PROMPT_VERSION to the new version number (latency regressions are attributed to it)
    - Include a brief description of changes
    - Consider adding a comment above the modified prompt with the change details
 
@@ -27,6 +28,9 @@ HOW TO UPDATE THIS FILE:
    - [TASK]_USER_PROMPT_TEMPLATE: For user prompts with format placeholders
 """
 
+# Latest entry of the version history above
+PROMPT_VERSION = "v1.4"
+
 # System prompts
 WAHRHEIT_SYSTEM_PROMPT = """
 <role>
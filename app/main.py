@@ -1,12 +1,68 @@
+import time
+
+_import_started = time.perf_counter()
+
+import threading
 from fastapi import FastAPI
-from app.api.routes.v1 import packing_list, health
+from app.api.routes.v1 import packing_list, health, metrics, dashboard
 from app.services.monitoring import system_monitor
-from app.services.email_service import EmailService
+from app.services.container import services
+from app.services.upload_jobs import UploadJobManager, UploadJobStore
+from app.services.result_cache import ResultCache
+from app.services.cluster import ClusterStore, LeaderElector, MetricsPublisher
+from app.services import readiness, tracing
 from app.core.config import get_settings
+from app.core.logger import LoggerSingleton
+from app.utils.event_loop import background_loop
 from contextlib import asynccontextmanager
 
-# Create global email service instance
-email_service = EmailService()
+services.record("import app.main", time.perf_counter() - _import_started)
+
+# Get logger from singleton
+logger = LoggerSingleton.get_logger()
+
+
+def _start_email_pipeline(app: FastAPI, cluster_store: ClusterStore):
+    """Create the email service and start polling and job workers
+
+    Runs on a separate thread so the API serves requests while the email
+    pipeline is still being set up.
+    """
+    settings = get_settings()
+    started = time.perf_counter()
+    try:
+        email_service = services.get("email_service")
+    except Exception as e:
+        logger.error(f"Email pipeline not started: {str(e)}")
+        return
+    app.state.email_service = email_service
+
+    # Only the process holding the lease polls the mailbox; all of them run job workers
+    app.state.poller_election = LeaderElector(
+        cluster_store,
+        name="email-poller",
+        ttl=settings.LEADER_LEASE_SECONDS,
+        on_elected=email_service.start_polling,
+        on_demoted=email_service.stop_polling,
+    )
+
+    if settings.EMAIL_POLLING_ENABLED:
+        app.state.poller_election.start()
+        print(
+            f"Automatic email polling enabled with interval: {email_service.poll_interval}s "
+            "(runs in the elected worker)"
+        )
+    else:
+        print("Automatic email polling disabled by configuration")
+
+    if settings.JOB_WORKERS_ENABLED:
+        with services.timed("start job workers"):
+            email_service.start_workers()
+        print(f"Job workers started: {email_service.worker_concurrency}")
+    else:
+        print("Job workers disabled by configuration")
+
+    services.record("email pipeline ready", time.perf_counter() - started)
 
 
 @asynccontextmanager
@@ -16,18 +72,95 @@ async def lifespan(app: FastAPI):
     Handles both startup and shutdown events in a single function.
     """
     # Startup: Initialize services
+    startup_started = time.perf_counter()
     system_monitor.print_summary()
 
-    # Store email service in application state and start polling
-    app.state.email_service = email_service
+    # Long-lived loop shared by the background email pipeline
+    with services.timed("start background loop"):
+        background_loop.start()
 
-    if get_settings().EMAIL_POLLING_ENABLED:
-        email_service.start_polling()
-        print(
-            f"Automatic email polling started with interval: {email_service.poll_interval}s"
+    settings = get_settings()
+    tracing.tracer.configure(settings.TRACE_DIR, enabled=settings.TRACING_ENABLED)
+    system_monitor.regressions.configure(
+        settings.LATENCY_BASELINE_PATH,
+        enabled=settings.LATENCY_REGRESSION_ENABLED,
+        window_size=settings.LATENCY_REGRESSION_WINDOW,
+        baseline_windows=settings.LATENCY_REGRESSION_BASELINE_WINDOWS,
+        p_value=settings.LATENCY_REGRESSION_P_VALUE,
+        min_ratio=settings.LATENCY_REGRESSION_MIN_RATIO,
+    )
+
+    # Background runner for packing lists uploaded over HTTP
+    with services.timed("create upload jobs"):
+        app.state.upload_jobs = UploadJobManager(
+            store=UploadJobStore(
+                settings.JOB_QUEUE_PATH,
+                timeout=settings.UPLOAD_JOB_TIMEOUT,
+                retention=settings.UPLOAD_JOB_RETENTION,
+            ),
+            template_path=settings.TEMPLATE_PACKING_LIST_PATH,
+            concurrency=settings.UPLOAD_JOB_CONCURRENCY,
+            result_cache=(
+                ResultCache(
+                    settings.RESULT_CACHE_PATH,
+                    max_bytes=settings.RESULT_CACHE_MAX_BYTES,
+                    max_entries=settings.RESULT_CACHE_MAX_ENTRIES,
+                    model=settings.LITELLM_MODEL,
+                )
+                if settings.RESULT_CACHE_ENABLED
+                else None
+            ),
+            admission=services.get("admission"),
         )
-    else:
-        print("Automatic email polling disabled by configuration")
+
+    # Shared state so several worker processes act as one service
+    with services.timed("start cluster metrics"):
+        cluster_store = ClusterStore(settings.CLUSTER_STATE_PATH)
+        app.state.metrics_publisher = MetricsPublisher(
+            cluster_store,
+            interval=settings.CLUSTER_METRICS_INTERVAL,
+            retention=settings.CLUSTER_METRICS_RETENTION,
+            cost_tracker_getter=lambda: getattr(
+                services.peek("ai_service"), "cost_tracker", None
+            ),
+        )
+        app.state.metrics_publisher.start()
+
+    # Dependency probes behind GET /api/v1/health/ready
+    app.state.readiness = readiness.ReadinessChecker(
+        ttl=settings.READINESS_CACHE_TTL, timeout=settings.READINESS_PROBE_TIMEOUT
+    )
+    app.state.readiness.register(
+        "template", lambda: readiness.probe_template(settings.TEMPLATE_PACKING_LIST_PATH)
+    )
+    app.state.readiness.register(
+        "job_queue",
+        lambda: readiness.probe_job_queue(
+            settings.READINESS_MAX_QUEUE_DEPTH, settings.JOB_LEASE_SECONDS
+        ),
+    )
+    app.state.readiness.register(
+        "llm",
+        lambda: readiness.probe_llm(
+            settings.READINESS_LLM_WINDOW, settings.READINESS_LLM_MAX_FAILURES
+        ),
+    )
+    if settings.EMAIL_POLLING_ENABLED:
+        app.state.readiness.register("imap", readiness.probe_imap)
+    if settings.JOB_WORKERS_ENABLED:
+        app.state.readiness.register("smtp", readiness.probe_smtp)
+
+    # The AI service is created by the first extraction, the email pipeline in the background
+    email_startup = threading.Thread(
+        target=_start_email_pipeline,
+        args=(app, cluster_store),
+        name="email-pipeline-startup",
+        daemon=True,
+    )
+    email_startup.start()
+
+    services.record("startup (serving)", time.perf_counter() - startup_started)
+    services.print_startup_report()
 
     # Yield control back to FastAPI
     yield
@@ -35,14 +168,38 @@ async def lifespan(app: FastAPI):
     # Shutdown: Clean up resources
     print("Application shutting down")
 
+    email_startup.join()
+
+    await app.state.upload_jobs.shutdown()
+
+    if hasattr(app.state, "poller_election"):
+        app.state.poller_election.stop()
+
     if hasattr(app.state, "email_service"):
         app.state.email_service.stop_polling()
         print("Email polling stopped")
+        app.state.email_service.stop_workers()
+        print("Job workers stopped")
+
+    # Also used by POST /process-email when job workers are disabled
+    email_service = services.peek("email_service")
+    if email_service is not None:
+        email_service.outbox.close()
+
+    app.state.metrics_publisher.stop()
+    app.state.readiness.shutdown()
+
+    background_loop.stop()
+
+    # Monitor events and spans are written by background threads; make sure they reach disk
+    # (flushing the monitor also saves the latency baselines)
+    system_monitor.flush()
+    tracing.tracer.flush()
 
 
 # Create FastAPI app with lifespan handler
 app = FastAPI(title="Rohdex POC", lifespan=lifespan)
 app.include_router(packing_list.router, prefix="/api/v1")
 app.include_router(health.router, prefix="/api/v1")
-# Dashboard routes disabled as requested
-# app.include_router(dashboard.router, prefix="/api/v1")
+app.include_router(metrics.router, prefix="/api/v1")
+app.include_router(dashboard.router, prefix="/api/v1")
@@ -0,0 +1,235 @@
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Dict, Iterator, List, Optional
+from app.core.logger import LoggerSingleton
+from .monitoring import system_monitor
+from . import progress, tracing
+
+# Get logger from singleton
+logger = LoggerSingleton.get_logger()
+
+# Assumed generation time until the first job has finished
+DEFAULT_JOB_SECONDS = 30.0
+MAX_RETRY_AFTER = 600
+
+
+class AdmissionRejected(Exception):
+    """Raised when the admission queue is full"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Admission:
+    """A packing list generation that was accepted for admission"""
+
+    def __init__(self, nbytes: int):
+        self.nbytes = nbytes
+        self.enqueued_at = time.time()
+        self.granted_at: Optional[float] = None
+        self.released = False
+        self._notify: Optional[Callable[[], None]] = None
+
+
+class AdmissionController:
+    """Global budget for packing list generations in this process
+
+    Uploads, batch shipments and email jobs all pass through one controller.
+    At most `max_jobs` generations with at most `max_bytes` of input files run
+    at once; a single job larger than the byte budget runs alone. Further work
+    waits in FIFO order. Uploads are rejected once `max_queue` generations are
+    waiting, email jobs always wait since they are already stored durably.
+    """
+
+    def __init__(self, max_jobs: int, max_bytes: int, max_queue: int):
+        self.max_jobs = max(1, max_jobs)
+        self.max_bytes = max_bytes
+        self.max_queue = max_queue
+        self.in_flight_jobs = 0
+        self.in_flight_bytes = 0
+        self.rejected = 0
+        self.admitted = 0
+        self.last_queue_wait = 0.0
+        self.avg_queue_wait = 0.0
+        self._avg_job_seconds: Optional[float] = None
+        # Reserved but not yet running, whether or not they are waiting already
+        self._pending = 0
+        # Waiting to run, in arrival order
+        self._waiting: Deque[Admission] = deque()
+        self._lock = threading.Lock()
+
+    def _retry_after_locked(self) -> int:
+        job_seconds = self._avg_job_seconds or DEFAULT_JOB_SECONDS
+        estimate = job_seconds * (self._pending + 1) / self.max_jobs
+        return max(1, min(MAX_RETRY_AFTER, math.ceil(estimate)))
+
+    def _reject_locked(self, count: int):
+        if count > self.max_queue:
+            raise ValueError(
+                f"{count} packing lists can never be queued at once, the limit is {self.max_queue}"
+            )
+        if self._pending + count <= self.max_queue:
+            return
+        self.rejected += 1
+        self._update_gauges()
+        retry_after = self._retry_after_locked()
+        logger.warning(
+            f"Admission rejected {count} job(s): {self._pending} waiting, "
+            f"limit {self.max_queue}, retry after {retry_after}s"
+        )
+        raise AdmissionRejected(
+            f"Too many packing lists in progress, retry in {retry_after} seconds",
+            retry_after,
+        )
+
+    def check(self):
+        """Reject early, e.g. before reading an upload, if the queue is full
+
+        Raises:
+            AdmissionRejected: If no more work can be queued
+        """
+        with self._lock:
+            self._reject_locked(1)
+
+    def reserve(self, nbytes: int, bounded: bool = True) -> Admission:
+        """Queue a generation. Bounded reservations fail once the queue is full
+
+        Raises:
+            AdmissionRejected: If bounded and the queue is full
+        """
+        return self.reserve_many([nbytes], bounded)[0]
+
+    def reserve_many(self, sizes: List[int], bounded: bool = True) -> List[Admission]:
+        """Queue several generations at once, all or none
+
+        Raises:
+            AdmissionRejected: If bounded and they do not all fit into the queue
+            ValueError: If bounded and they would not even fit into an empty queue
+        """
+        with self._lock:
+            if bounded:
+                self._reject_locked(len(sizes))
+            self._pending += len(sizes)
+        self._update_gauges()
+        return [Admission(nbytes) for nbytes in sizes]
+
+    def _fits_locked(self, admission: Admission) -> bool:
+        if self.in_flight_jobs >= self.max_jobs:
+            return False
+        return self.in_flight_jobs == 0 or self.in_flight_bytes + admission.nbytes <= self.max_bytes
+
+    def _grant_locked(self):
+        while self._waiting and self._fits_locked(self._waiting[0]):
+            admission = self._waiting.popleft()
+            admission.granted_at = time.time()
+            self._pending -= 1
+            self.in_flight_jobs += 1
+            self.in_flight_bytes += admission.nbytes
+            wait = admission.granted_at - admission.enqueued_at
+            self.admitted += 1
+            self.last_queue_wait = wait
+            self.avg_queue_wait = 0.9 * self.avg_queue_wait + 0.1 * wait
+            admission._notify()
+
+    def _enqueue(self, admission: Admission, notify: Callable[[], None]):
+        with self._lock:
+            admission._notify = notify
+            self._waiting.append(admission)
+            self._grant_locked()
+        self._update_gauges()
+
+    async def acquire(self, admission: Admission):
+        """Wait until the generation may run"""
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def notify():
+            loop.call_soon_threadsafe(
+                lambda: granted.done() or granted.set_result(None)
+            )
+
+        with tracing.span("admission_wait", bytes=admission.nbytes):
+            self._enqueue(admission, notify)
+            await granted
+        self._admitted(admission)
+
+    def acquire_sync(self, admission: Admission):
+        """Block the calling thread until the generation may run"""
+        granted = threading.Event()
+        with tracing.span("admission_wait", bytes=admission.nbytes):
+            self._enqueue(admission, granted.set)
+            granted.wait()
+        self._admitted(admission)
+
+    def _admitted(self, admission: Admission):
+        wait = admission.granted_at - admission.enqueued_at
+        progress.emit("job_admitted", queue_wait=round(wait, 3))
+        # Every wait goes into the operation's latency sketch, exported as a histogram
+        system_monitor.record_request(
+            service="Admission",
+            operation="queue_wait",
+            success=True,
+            duration=wait,
+            metadata={"bytes": admission.nbytes},
+        )
+        if wait >= 1.0:
+            logger.info(f"Generation admitted after waiting {wait:.1f}s")
+
+    def release(self, admission: Admission):
+        """Free the budget of a finished generation, or drop one that never ran"""
+        with self._lock:
+            if admission.released:
+                return
+            admission.released = True
+            if admission.granted_at is not None:
+                self.in_flight_jobs -= 1
+                self.in_flight_bytes -= admission.nbytes
+                duration = time.time() - admission.granted_at
+                self._avg_job_seconds = (
+                    duration
+                    if self._avg_job_seconds is None
+                    else 0.8 * self._avg_job_seconds + 0.2 * duration
+                )
+            else:
+                self._pending -= 1
+                if admission in self._waiting:
+                    self._waiting.remove(admission)
+            self._grant_locked()
+        self._update_gauges()
+
+    @contextmanager
+    def admit_sync(self, nbytes: int) -> Iterator[Admission]:
+        """Run a block as an admitted generation; waits however long the queue is"""
+        admission = self.reserve(nbytes, bounded=False)
+        try:
+            self.acquire_sync(admission)
+            yield admission
+        finally:
+            self.release(admission)
+
+    def _update_gauges(self):
+        stats = self.get_stats()
+        system_monitor.set_gauge("admission_in_flight_jobs", stats["in_flight_jobs"])
+        system_monitor.set_gauge("admission_in_flight_bytes", stats["in_flight_bytes"])
+        system_monitor.set_gauge("admission_queue_depth", stats["queue_depth"])
+        system_monitor.set_counter("admission_rejected", stats["rejected"])
+        system_monitor.set_counter("admission_admitted", stats["admitted"])
+        # Convenience only; the distribution of waits is the Admission/queue_wait histogram
+        system_monitor.set_gauge("admission_queue_wait_seconds", stats["last_queue_wait"])
+        system_monitor.set_gauge("admission_queue_wait_avg_seconds", stats["avg_queue_wait"])
+
+    def get_stats(self) -> Dict[str, float]:
+        return {
+            "in_flight_jobs": self.in_flight_jobs,
+            "in_flight_bytes": self.in_flight_bytes,
+            "queue_depth": self._pending,
+            "rejected": self.rejected,
+            "admitted": self.admitted,
+            "last_queue_wait": round(self.last_queue_wait, 3),
+            "avg_queue_wait": round(self.avg_queue_wait, 3),
+        }
@@ -2,6 +2,9 @@ from litellm import completion, completion_cost, OpenAIError
 from app.core.config import get_settings
 from app.core.logger import LoggerSingleton
 from app.services.cost_tracker import CostTracker
+from app.services.progress import record_usage
+from app.services.monitoring import system_monitor
+from app.services import tracing
 from typing import Dict, Any, List, Optional, Type, TypeVar
 from pydantic import BaseModel
 import json, time, litellm
@@ -41,6 +44,7 @@ class AIService:
                 "No API keys provided. Please set ANTHROPIC_API_KEY or OPENAI_API_KEY in .env file."
             )
 
+    @tracing.traced("llm_call")
     def extract_structured_data(
         self,
         content: str,
@@ -50,6 +54,7 @@ class AIService:
         model: str = "gpt-4o",
         temperature: float = 0.1,
         description: str = "data",
+        operation: str = "llm_call",
     ) -> T:
         """
         Extract structured data using a Pydantic model for validation.
@@ -63,11 +68,14 @@ class AIService:
             model: The model to use (defaults to gpt-4o-mini)
             temperature: The temperature to use (defaults to 0.1)
             description: Description of what's being extracted (for logging)
+            operation: Operation the call's latency baseline is kept under, as service LLM;
+                the model is recorded with each call to attribute regressions
 
         Returns:
             An instance of the provided Pydantic model
         """
         start_time = time.time()
+        tracing.annotate(model=model, description=description)
 
         formatted_user_prompt = user_prompt.format(content=content)
 
@@ -100,6 +108,15 @@ class AIService:
 
             # Log the completion time (debug level only)
             logger.debug(f"AI completion for {description} took {duration:.2f}s")
+            system_monitor.record_latency("LLM", operation, duration, model=model)
+
+            # Report token usage to the job progress stream
+            usage = getattr(response, "usage", None)
+            if usage is not None:
+                record_usage(usage.prompt_tokens, usage.completion_tokens)
+                tracing.annotate(
+                    input_tokens=usage.prompt_tokens, output_tokens=usage.completion_tokens
+                )
 
             # Track cost if enabled
             if self.cost_tracking_enabled and self.cost_tracker:
@@ -0,0 +1,161 @@
+import asyncio
+import hashlib
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from pydantic import BaseModel
+from app.core.logger import LoggerSingleton
+from app.utils import file_processor
+from .job_queue import JobFile
+from . import progress, tracing
+
+# Get logger from singleton
+logger = LoggerSingleton.get_logger()
+
+
+class Shipment(BaseModel):
+    """One packing list of a batch: a Wahrheitsdatei and its Partie files"""
+
+    id: str
+    partie_files: List[JobFile]
+    wahrheit_file: JobFile
+
+
+def group_shipments(files: List[Tuple[str, JobFile]]) -> List[Shipment]:
+    """Group (shipment id, file) pairs into shipments, validating each one
+
+    Raises:
+        ValueError: If a shipment has no Partie file or not exactly one Wahrheitsdatei
+    """
+    grouped: Dict[str, Dict[str, List[JobFile]]] = {}
+    for shipment_id, job_file in files:
+        shipment = grouped.setdefault(shipment_id, {"partie": [], "wahrheit": []})
+        shipment[job_file.kind].append(job_file)
+
+    shipments = []
+    for shipment_id, shipment in grouped.items():
+        if not shipment["partie"]:
+            raise ValueError(f"Shipment {shipment_id} has no Partie file")
+        if len(shipment["wahrheit"]) != 1:
+            raise ValueError(f"Shipment {shipment_id} needs exactly one Wahrheitsdatei")
+        shipments.append(
+            Shipment(
+                id=shipment_id,
+                partie_files=shipment["partie"],
+                wahrheit_file=shipment["wahrheit"][0],
+            )
+        )
+    return shipments
+
+
+# A distinct input file: its kind and content hash
+Key = Tuple[str, str]
+
+
+class ExtractionScheduler:
+    """Runs the LLM extractions of many packing list jobs under one concurrency budget
+
+    Each distinct file is extracted once: jobs that share a file (the same
+    Wahrheitsdatei or a repeated Partie file) await the same task. Extractions
+    of all jobs are started up front and interleave freely, so a batch keeps
+    the provider busy instead of waiting on one job at a time.
+
+    The extraction's inner spans belong to the job that started it, but its
+    progress events are replayed to, and an "extraction" span is recorded in,
+    every job that awaits it. Jobs claim their extractions in prefetch() and
+    release them when they end; an extraction no job still claims is cancelled.
+    """
+
+    def __init__(self, concurrency: int):
+        self._slots = asyncio.Semaphore(max(1, concurrency))
+        self._tasks: Dict[Key, asyncio.Task] = {}
+        self._owners: Dict[Key, Optional[str]] = {}
+        self._claims: Dict[Key, int] = {}
+        self.files_requested = 0
+
+    def _schedule(
+        self, kind: str, content: bytes, factory: Callable[[], Awaitable[Any]]
+    ) -> Key:
+        key = (kind, hashlib.sha256(content).hexdigest())
+        task = self._tasks.get(key)
+        # A cancelled extraction was abandoned by every job that wanted it; start over
+        if task is None or task.cancelled():
+            task = asyncio.ensure_future(self._limited(factory))
+            # Failures are raised to every job awaiting the task; silence the unawaited case
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._tasks[key] = task
+            self._owners[key] = progress.current_job()
+        return key
+
+    async def _limited(
+        self, factory: Callable[[], Awaitable[Any]]
+    ) -> Tuple[Any, List[Tuple[str, Dict[str, Any]]]]:
+        with tracing.span("extraction_queue"):
+            await self._slots.acquire()
+        try:
+            with progress.capture() as events:
+                return await factory(), events
+        finally:
+            self._slots.release()
+
+    async def _join(self, key: Key, filename: str) -> Any:
+        """Await an extraction in the calling job's context and report it to that job"""
+        shared = self._owners.get(key) != progress.current_job()
+        with tracing.span("extraction", kind=key[0], filename=filename, shared=shared):
+            # Shielded: one job being cancelled must not cancel the others' extraction
+            result, events = await asyncio.shield(self._tasks[key])
+        for stage, data in events:
+            progress.emit(stage, **data)
+        return result
+
+    def prefetch(
+        self, partie_contents: List, wahrheit_content: bytes, wahrheit_filename: str
+    ) -> List[Key]:
+        """Schedule and claim all extractions of one job; pass the result to release()"""
+        self.files_requested += len(partie_contents) + 1
+        claims = [
+            self._schedule(
+                "wahrheit",
+                wahrheit_content,
+                lambda: file_processor.load_wahrheit(wahrheit_content, wahrheit_filename),
+            )
+        ]
+        for partie in partie_contents:
+            claims.append(
+                self._schedule(
+                    "partie",
+                    partie.content,
+                    lambda partie=partie: file_processor.process_partie(
+                        partie.content, partie.filename
+                    ),
+                )
+            )
+        for key in claims:
+            self._claims[key] = self._claims.get(key, 0) + 1
+        return claims
+
+    def release(self, claims: List[Key]):
+        """Drop the claims of a job that ended; cancel extractions no other job claims"""
+        for key in claims:
+            self._claims[key] -= 1
+            if self._claims[key] == 0:
+                self._tasks[key].cancel()
+
+    async def extract_partie(self, content: bytes, filename: str) -> Any:
+        key = self._schedule(
+            "partie", content, lambda: file_processor.process_partie(content, filename)
+        )
+        return await self._join(key, filename)
+
+    async def load_wahrheit(self, content: bytes, filename: str) -> Any:
+        key = self._schedule(
+            "wahrheit", content, lambda: file_processor.load_wahrheit(content, filename)
+        )
+        return await self._join(key, filename)
+
+    def get_stats(self) -> Dict[str, int]:
+        # Extractions cancelled because no job still needed them are not counted
+        extracted = sum(1 for task in self._tasks.values() if task.done() and not task.cancelled())
+        return {
+            "files_requested": self.files_requested,
+            "files_extracted": extracted,
+            "duplicates_skipped": max(0, self.files_requested - len(self._tasks)),
+        }
@@ -0,0 +1,349 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from app.core.logger import LoggerSingleton
+from .monitoring import system_monitor
+
+# Get logger from singleton
+logger = LoggerSingleton.get_logger()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS worker_snapshots (
+    owner TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    pid INTEGER NOT NULL,
+    started_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    payload TEXT NOT NULL,
+    PRIMARY KEY (owner, kind)
+);
+"""
+
+# Identifies this server process across restarts and hosts
+PROCESS_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+# How a gauge combines over the live processes; gauges not listed are
+# per-process quantities such as in-flight jobs and are summed
+GAUGE_AGGREGATION: Dict[str, Callable[[List[float]], float]] = {
+    # Every process reads the same shared job queue and mailbox
+    "job_queue_depth": max,
+    "job_queue_failed": max,
+    "job_queue_oldest_age_seconds": max,
+    "email_backlog": max,
+    "admission_queue_wait_seconds": max,
+    # The cluster is ready only if every process is
+    "readiness_ok": min,
+}
+
+
+class ClusterStore:
+    """SQLite state shared by all server processes: leases and metric snapshots"""
+
+    def __init__(self, path: str):
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        """Take or renew a named lease. Returns True if owner holds it afterwards"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT owner, expires_at FROM leases WHERE name = ?", (name,)
+                ).fetchone()
+                if row is not None and row[0] != owner and row[1] > now:
+                    conn.execute("COMMIT")
+                    return False
+                conn.execute(
+                    "INSERT OR REPLACE INTO leases (name, owner, expires_at) VALUES (?, ?, ?)",
+                    (name, owner, now + ttl),
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return True
+
+    def release_lease(self, name: str, owner: str):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
+
+    def lease_holder(self, name: str) -> Optional[str]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT owner FROM leases WHERE name = ? AND expires_at > ?",
+                (name, time.time()),
+            ).fetchone()
+        return row[0] if row else None
+
+    def publish_snapshot(self, owner: str, kind: str, started_at: float, payload: Dict):
+        """Store this process's latest cumulative snapshot of one kind of metrics"""
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO worker_snapshots "
+                "(owner, kind, pid, started_at, updated_at, payload) VALUES (?, ?, ?, ?, ?, ?)",
+                (owner, kind, os.getpid(), started_at, time.time(), json.dumps(payload)),
+            )
+
+    def load_snapshots(self, kind: str, since: float = 0.0) -> List[Dict[str, Any]]:
+        """Snapshots of every process updated after `since`"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT owner, pid, started_at, updated_at, payload FROM worker_snapshots "
+                "WHERE kind = ? AND updated_at >= ?",
+                (kind, since),
+            ).fetchall()
+        return [
+            {
+                "owner": owner,
+                "pid": pid,
+                "started_at": started_at,
+                "updated_at": updated_at,
+                "payload": json.loads(payload),
+            }
+            for owner, pid, started_at, updated_at, payload in rows
+        ]
+
+    def prune_snapshots(self, older_than: float):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM worker_snapshots WHERE updated_at < ?", (older_than,))
+
+
+class LeaderElector:
+    """Keeps at most one server process in charge of a singleton task
+
+    Every process runs an elector; the one holding the SQLite lease is the
+    leader and renews it every ttl/3 seconds. If the leader dies, its lease
+    expires and another process takes over within ttl seconds. A leader
+    that fails to renew in time steps down before anyone else can take over.
+    """
+
+    def __init__(
+        self,
+        store: ClusterStore,
+        name: str,
+        ttl: float,
+        on_elected: Callable[[], Any],
+        on_demoted: Callable[[], Any],
+    ):
+        self.store = store
+        self.name = name
+        self.ttl = ttl
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.is_leader = False
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name=f"leader-{self.name}", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Stop campaigning and hand the lease over right away"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+            self._thread = None
+        if self.is_leader:
+            self._set_leader(False)
+            self.store.release_lease(self.name, PROCESS_ID)
+
+    def _run(self):
+        last_renewal = 0.0
+        while not self._stop.is_set():
+            try:
+                leader = self.store.acquire_lease(self.name, PROCESS_ID, self.ttl)
+                last_renewal = time.time() if leader else last_renewal
+            except Exception as e:
+                logger.warning(f"Lease '{self.name}' renewal failed: {str(e)}")
+                # Keep leading only while the last successful renewal is still valid
+                leader = self.is_leader and time.time() - last_renewal < self.ttl * 2 / 3
+
+            if leader != self.is_leader:
+                self._set_leader(leader)
+            self._stop.wait(self.ttl / 3)
+
+    def _set_leader(self, leader: bool):
+        self.is_leader = leader
+        system_monitor.set_gauge(f"leader_{self.name.replace('-', '_')}", int(leader))
+        try:
+            if leader:
+                logger.info(f"Process {PROCESS_ID} elected as '{self.name}' leader")
+                self.on_elected()
+            else:
+                logger.info(f"Process {PROCESS_ID} stepped down as '{self.name}' leader")
+                self.on_demoted()
+        except Exception as e:
+            logger.error(f"Leader transition for '{self.name}' failed: {str(e)}")
+
+
+class MetricsPublisher:
+    """Periodically publishes this process's metrics so any process can report totals
+
+    Snapshots are cumulative per process, so summing the latest snapshot of
+    every process (including ones that have since exited) gives cluster-wide
+    totals. Gauges only count from processes that are still publishing and are
+    combined per kind (see GAUGE_AGGREGATION); ratios and averages are
+    recomputed from the counts behind them.
+    """
+
+    def __init__(
+        self,
+        store: ClusterStore,
+        interval: float,
+        retention: float,
+        cost_tracker_getter: Callable[[], Any],
+    ):
+        self.store = store
+        self.interval = interval
+        self.retention = retention
+        self.cost_tracker_getter = cost_tracker_getter
+        self.started_at = time.time()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="metrics-publisher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+            self._thread = None
+        self.publish()
+
+    def _run(self):
+        self.store.prune_snapshots(time.time() - self.retention)
+        while not self._stop.wait(self.interval):
+            self.publish()
+
+    def publish(self):
+        try:
+            self.store.publish_snapshot(
+                PROCESS_ID, "monitor", self.started_at, system_monitor.get_snapshot()
+            )
+            cost_tracker = self.cost_tracker_getter()
+            if cost_tracker is not None:
+                self.store.publish_snapshot(
+                    PROCESS_ID, "cost", self.started_at, cost_tracker.get_snapshot()
+                )
+        except Exception as e:
+            logger.warning(f"Failed to publish metrics snapshot: {str(e)}")
+
+    def cluster_summary(self) -> Dict[str, Any]:
+        """Aggregate the latest snapshots of all processes"""
+        self.publish()
+        live_since = time.time() - self.interval * 3
+        monitor = self.store.load_snapshots("monitor")
+        costs = self.store.load_snapshots("cost")
+
+        services: Dict[str, Dict[str, float]] = {}
+        totals = {"requests": 0, "successful": 0, "errors": 0, "retries": 0}
+        counters: Dict[str, float] = {}
+        live_gauges: Dict[str, List[float]] = {}
+        # Average admission wait of each live process with the admissions it covers
+        queue_waits: List[tuple] = []
+        for snapshot in monitor:
+            payload = snapshot["payload"]
+            for key in totals:
+                totals[key] += payload.get(key, 0)
+            for name, value in payload.get("counters", {}).items():
+                counters[name] = counters.get(name, 0) + value
+            for service, stats in payload.get("services", {}).items():
+                merged = services.setdefault(
+                    service,
+                    {"requests": 0, "successful": 0, "errors": 0, "retries": 0, "total_duration": 0.0},
+                )
+                for key in merged:
+                    merged[key] += stats.get(key, 0)
+            if snapshot["updated_at"] >= live_since:
+                for name, value in payload.get("gauges", {}).items():
+                    live_gauges.setdefault(name, []).append(value)
+                if "admission_queue_wait_avg_seconds" in payload.get("gauges", {}):
+                    queue_waits.append(
+                        (
+                            payload["gauges"]["admission_queue_wait_avg_seconds"],
+                            payload.get("counters", {}).get("admission_admitted", 0),
+                        )
+                    )
+
+        gauges = {
+            name: GAUGE_AGGREGATION.get(name, sum)(values) for name, values in live_gauges.items()
+        }
+        # Ratios and averages are recomputed from their parts instead of being added up
+        if "result_cache_hit_ratio" in gauges:
+            lookups = counters.get("result_cache_hits", 0) + counters.get("result_cache_misses", 0)
+            gauges["result_cache_hit_ratio"] = (
+                round(counters.get("result_cache_hits", 0) / lookups, 4) if lookups else 0.0
+            )
+        if queue_waits:
+            admitted = sum(count for _, count in queue_waits)
+            gauges["admission_queue_wait_avg_seconds"] = round(
+                sum(wait * count for wait, count in queue_waits) / admitted if admitted else 0.0, 3
+            )
+        for stats in services.values():
+            stats["avg_duration"] = (
+                stats["total_duration"] / stats["requests"] if stats["requests"] else 0.0
+            )
+            stats["error_rate"] = (
+                1 - stats["successful"] / stats["requests"] if stats["requests"] else 0.0
+            )
+
+        cost = {"total_cost": 0.0, "request_count": 0, "input_tokens": 0, "output_tokens": 0}
+        model_costs: Dict[str, float] = {}
+        for snapshot in costs:
+            payload = snapshot["payload"]
+            for key in cost:
+                cost[key] += payload.get(key, 0)
+            for model, model_cost in payload.get("model_costs", {}).items():
+                model_costs[model] = model_costs.get(model, 0.0) + model_cost
+        cost["model_costs"] = model_costs
+
+        return {
+            "process_id": PROCESS_ID,
+            "workers": [
+                {
+                    "process_id": s["owner"],
+                    "pid": s["pid"],
+                    "started_at": s["started_at"],
+                    "updated_at": s["updated_at"],
+                    "alive": s["updated_at"] >= live_since,
+                }
+                for s in monitor
+            ],
+            "totals": totals,
+            "services": services,
+            "gauges": gauges,
+            "counters": counters,
+            "cost": cost,
+        }
@@ -0,0 +1,106 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+from app.core.logger import LoggerSingleton
+
+# Get both logger and console from the singleton
+logger = LoggerSingleton.get_logger()
+console = LoggerSingleton.get_console()
+
+
+class ServiceContainer:
+    """Creates shared services on first use and records startup timings
+
+    Services are registered as factories that import their (often heavy)
+    modules themselves, so importing the app does not pull in litellm,
+    pandas or IMAP clients until a service is actually needed.
+    """
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._lock = threading.RLock()
+        self.process_started = time.time()
+        # Startup step -> seconds, in the order the steps ran
+        self.timings: Dict[str, float] = {}
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        self._factories[name] = factory
+
+    def get(self, name: str) -> Any:
+        """Return the service, creating it on first use"""
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        with self._lock:
+            if name not in self._instances:
+                if name not in self._factories:
+                    raise ValueError(f"Unknown service: {name}")
+                with self.timed(f"create {name}"):
+                    self._instances[name] = self._factories[name]()
+            return self._instances[name]
+
+    def peek(self, name: str) -> Optional[Any]:
+        """Return the service if it was already created, without creating it"""
+        return self._instances.get(name)
+
+    def override(self, name: str, instance: Any):
+        """Replace a service, e.g. with a fake for load tests"""
+        with self._lock:
+            self._instances[name] = instance
+
+    @contextmanager
+    def timed(self, step: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(step, time.perf_counter() - started)
+
+    def record(self, step: str, seconds: float):
+        self.timings[step] = round(seconds, 4)
+        logger.debug(f"Startup step '{step}' took {seconds:.3f}s")
+
+    def get_startup_report(self) -> Dict[str, Any]:
+        return {
+            "process_started": self.process_started,
+            "steps": dict(self.timings),
+            "services": {name: name in self._instances for name in self._factories},
+        }
+
+    def print_startup_report(self):
+        console.print("\n[bold green]Startup time breakdown:[/]")
+        for step, seconds in self.timings.items():
+            console.print(f"  {step}: {seconds:.3f}s")
+
+
+def _create_admission_controller():
+    from app.core.config import get_settings
+    from app.services.admission import AdmissionController
+
+    settings = get_settings()
+    return AdmissionController(
+        max_jobs=settings.ADMISSION_MAX_JOBS,
+        max_bytes=settings.ADMISSION_MAX_BYTES,
+        max_queue=settings.ADMISSION_MAX_QUEUE,
+    )
+
+
+def _create_ai_service():
+    from app.services.ai_service import AIService
+
+    return AIService()
+
+
+def _create_email_service():
+    from app.services.email_service import EmailService
+
+    return EmailService()
+
+
+# Global instance
+services = ServiceContainer()
+services.register("admission", _create_admission_controller)
+services.register("ai_service", _create_ai_service)
+services.register("email_service", _create_email_service)
@@ -1,19 +1,37 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, Optional
 from app.core.logger import LoggerSingleton
+from app.utils.sharded import ThreadSharded
+from .monitoring import system_monitor
 import time
 
 # Get both logger and console from the singleton
 logger = LoggerSingleton.get_logger()
 console = LoggerSingleton.get_console()
 
+ModelUsage = Dict[str, Dict[str, float]]
+
+
+def _new_usage() -> Dict[str, float]:
+    return {"requests": 0, "input_tokens": 0, "output_tokens": 0, "cost": 0.0}
+
+
+def _merge_usage(target: ModelUsage, source: ModelUsage):
+    for model, usage in list(source.items()):
+        totals = target.setdefault(model, _new_usage())
+        for key, value in list(usage.items()):
+            totals[key] += value
+
 
 class CostTracker:
-    """Tracks the cost of AI requests"""
+    """Tracks the cost of AI requests
+
+    Requests are recorded from several threads at once; each thread adds to
+    its own per-model totals, which are summed when they are read.
+    """
 
     def __init__(self):
-        self.requests = []
-        self.total_cost = 0.0
-        self.model_costs = {}
+        self._usage: ThreadSharded[ModelUsage] = ThreadSharded(dict, _merge_usage)
+        self.last_request: Optional[Dict[str, Any]] = None
         # Use console for user-facing information
         console.print("[bold green]Cost tracking enabled[/]")
         # Log for system records
@@ -28,20 +46,36 @@ class CostTracker:
         cost: float,
     ):
         """Add a request to the tracker"""
-        self.requests.append(
-            {
-                "model": model,
-                "input_tokens": input_tokens,
-                "output_tokens": output_tokens,
-                "cost": cost,
-                "duration": duration,
-                "timestamp": time.time(),
-            }
-        )
-        self.total_cost += cost
+        usage = self._usage.local()
+        totals = usage.get(model)
+        if totals is None:
+            totals = usage[model] = _new_usage()
+        totals["requests"] += 1
+        totals["input_tokens"] += input_tokens or 0
+        totals["output_tokens"] += output_tokens or 0
+        totals["cost"] += cost
+        system_monitor.record_cost(model, input_tokens, output_tokens, cost)
+        self.last_request = {
+            "model": model,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "cost": cost,
+            "duration": duration,
+            "timestamp": time.time(),
+        }
+
+    @property
+    def model_usage(self) -> ModelUsage:
+        """Running totals per model: requests, input_tokens, output_tokens, cost"""
+        return self._usage.collect()
 
-        # Track cost by model
-        self.model_costs[model] = self.model_costs.get(model, 0.0) + cost
+    @property
+    def model_costs(self) -> Dict[str, float]:
+        return {model: usage["cost"] for model, usage in self.model_usage.items()}
+
+    @property
+    def total_cost(self) -> float:
+        return sum(usage["cost"] for usage in self.model_usage.values())
 
     def get_total_cost(self) -> float:
         """Get the total cost of all requests"""
@@ -53,12 +87,12 @@ class CostTracker:
 
     def get_request_count(self) -> int:
         """Get the number of requests made"""
-        return len(self.requests)
+        return sum(usage["requests"] for usage in self.model_usage.values())
 
     def get_token_usage(self) -> Dict[str, int]:
         """Get the total token usage"""
-        input_tokens = sum(req["input_tokens"] for req in self.requests)
-        output_tokens = sum(req["output_tokens"] for req in self.requests)
+        input_tokens = sum(usage["input_tokens"] for usage in self.model_usage.values())
+        output_tokens = sum(usage["output_tokens"] for usage in self.model_usage.values())
         return {
             "input_tokens": input_tokens,
             "output_tokens": output_tokens,
@@ -71,14 +105,25 @@ class CostTracker:
         return {
             "total_cost": self.total_cost,
             "model_costs": self.model_costs,
-            "request_count": len(self.requests),
+            "request_count": self.get_request_count(),
             "token_usage": token_usage,
-            "last_request": self.requests[-1] if self.requests else None,
+            "last_request": self.last_request,
+        }
+
+    def get_snapshot(self) -> Dict[str, Any]:
+        """Cumulative totals, for aggregation across processes"""
+        token_usage = self.get_token_usage()
+        return {
+            "total_cost": self.total_cost,
+            "model_costs": dict(self.model_costs),
+            "request_count": self.get_request_count(),
+            "input_tokens": token_usage["input_tokens"],
+            "output_tokens": token_usage["output_tokens"],
         }
 
     def print_summary(self):
         """Print a summary of the cost tracking"""
-        if not self.requests:
+        if self.last_request is None:
             # Use console for user-facing message
             console.print("[bold yellow]No requests tracked yet[/]")
             # Log for system records
@@ -0,0 +1,301 @@
+import base64
+import quopri
+import re
+import threading
+from email import message_from_bytes
+from email.header import decode_header, make_header
+from email.policy import default as default_policy
+from email.utils import collapse_rfc2231_value, decode_rfc2231, parseaddr
+from typing import Any, Dict, List, Optional
+
+HEADER_FIELDS = "BODY.PEEK[HEADER.FIELDS (FROM SUBJECT MESSAGE-ID)]"
+LITERAL_PATTERN = re.compile(rb"\{(\d+)\}$")
+
+# Token markers for the IMAP response tokenizer
+_OPEN = object()
+_CLOSE = object()
+
+
+class AttachmentPart:
+    """An attachment described by BODYSTRUCTURE whose content is downloaded on demand"""
+
+    def __init__(
+        self,
+        fetcher: "LazyMessageFetcher",
+        uid: str,
+        part_id: str,
+        filename: str,
+        content_type: str,
+        encoding: str,
+        size: int,
+    ):
+        self.fetcher = fetcher
+        self.uid = uid
+        self.part_id = part_id
+        self.filename = filename
+        self.content_type = content_type
+        self.encoding = encoding
+        self.size = size
+        self._payload: Optional[bytes] = None
+
+    @property
+    def payload(self) -> bytes:
+        """Decoded attachment content, fetched from the server on first access"""
+        if self._payload is None:
+            self._payload = self.fetcher.fetch_part(self)
+        return self._payload
+
+    def __repr__(self):
+        return f"AttachmentPart({self.filename!r}, part={self.part_id}, size={self.size})"
+
+
+class MessageSummary:
+    """Envelope data of a message plus the attachment parts it contains"""
+
+    def __init__(
+        self,
+        uid: str,
+        from_: str,
+        subject: str,
+        message_id: str,
+        attachments: List[AttachmentPart],
+    ):
+        self.uid = uid
+        self.from_ = from_
+        self.subject = subject
+        self.message_id = message_id
+        self.attachments = attachments
+
+
+class LazyMessageFetcher:
+    """Fetches messages in two phases over an open imap_tools mailbox session
+
+    Phase one requests only selected headers and BODYSTRUCTURE for a batch of
+    UIDs. Phase two downloads single MIME parts once the caller decides they are
+    needed. All bytes received from the server are counted in bytes_downloaded.
+    """
+
+    def __init__(self, mailbox, lock: Optional[threading.RLock] = None):
+        self.mailbox = mailbox
+        self.bytes_downloaded = 0
+        # Shared with other users of the session, imaplib is not thread-safe
+        self._lock = lock or threading.RLock()
+
+    def fetch_summaries(self, uids: List[str]) -> List[MessageSummary]:
+        """Fetch headers and BODYSTRUCTURE for the given UIDs"""
+        if not uids:
+            return []
+        data = self._uid_fetch(",".join(uids), f"(UID BODYSTRUCTURE {HEADER_FIELDS})")
+
+        summaries = []
+        for item in _parse_fetch_response(data):
+            uid = str(item.get("UID"))
+            headers = message_from_bytes(
+                item.get("HEADER") or b"", policy=default_policy
+            )
+            summaries.append(
+                MessageSummary(
+                    uid=uid,
+                    from_=parseaddr(str(headers.get("From", "")))[1],
+                    subject=str(headers.get("Subject", "")),
+                    message_id=str(headers.get("Message-ID", "")).strip(),
+                    attachments=[
+                        AttachmentPart(self, uid, **part)
+                        for part in _collect_attachments(item.get("BODYSTRUCTURE"))
+                    ],
+                )
+            )
+        return summaries
+
+    def fetch_part(self, part: AttachmentPart) -> bytes:
+        """Download and decode a single MIME part without setting the SEEN flag"""
+        data = self._uid_fetch(part.uid, f"(BODY.PEEK[{part.part_id}])")
+        raw = b"".join(
+            item[1] for item in data if isinstance(item, tuple) and len(item) > 1
+        )
+        return _decode_transfer_encoding(raw, part.encoding)
+
+    def _uid_fetch(self, uid_set: str, items: str) -> List[Any]:
+        with self._lock:
+            typ, data = self.mailbox.client.uid("FETCH", uid_set, items)
+            if typ != "OK":
+                raise ValueError(f"FETCH {items} failed for UIDs {uid_set}: {data}")
+            for item in data:
+                if isinstance(item, tuple):
+                    self.bytes_downloaded += sum(len(chunk) for chunk in item)
+                elif isinstance(item, bytes):
+                    self.bytes_downloaded += len(item)
+        return data
+
+
+def _decode_transfer_encoding(raw: bytes, encoding: str) -> bytes:
+    encoding = (encoding or "").lower()
+    if encoding == "base64":
+        return base64.b64decode(raw)
+    if encoding == "quoted-printable":
+        return quopri.decodestring(raw)
+    return raw
+
+
+def _tokenize(data: List[Any]) -> List[Any]:
+    """Tokenize a raw imaplib FETCH response, inlining literal strings"""
+    tokens = []
+    for item in data:
+        if isinstance(item, tuple):
+            prefix, literal = item[0], item[1]
+            _tokenize_chunk(LITERAL_PATTERN.sub(b"", prefix), tokens)
+            tokens.append(literal)
+        elif isinstance(item, bytes):
+            _tokenize_chunk(item, tokens)
+    return tokens
+
+
+def _tokenize_chunk(chunk: bytes, tokens: List[Any]):
+    i, length = 0, len(chunk)
+    while i < length:
+        char = chunk[i : i + 1]
+        if char in b" \r\n":
+            i += 1
+        elif char == b"(":
+            tokens.append(_OPEN)
+            i += 1
+        elif char == b")":
+            tokens.append(_CLOSE)
+            i += 1
+        elif char == b'"':
+            value = bytearray()
+            i += 1
+            while i < length and chunk[i : i + 1] != b'"':
+                if chunk[i : i + 1] == b"\\":
+                    i += 1
+                value += chunk[i : i + 1]
+                i += 1
+            tokens.append(bytes(value))
+            i += 1
+        else:
+            start = i
+            depth = 0
+            while i < length:
+                char = chunk[i : i + 1]
+                if char == b"[":
+                    depth += 1
+                elif char == b"]":
+                    depth -= 1
+                elif depth == 0 and char in b" ()\r\n":
+                    break
+                i += 1
+            atom = chunk[start:i].decode("ascii", errors="replace")
+            tokens.append(None if atom.upper() == "NIL" else atom)
+
+
+def _build_tree(tokens: List[Any]) -> List[Any]:
+    stack: List[List[Any]] = [[]]
+    for token in tokens:
+        if token is _OPEN:
+            stack.append([])
+        elif token is _CLOSE:
+            closed = stack.pop()
+            stack[-1].append(closed)
+        else:
+            stack[-1].append(token)
+    return stack[0]
+
+
+def _parse_fetch_response(data: List[Any]) -> List[Dict[str, Any]]:
+    """Turn a FETCH response into one dict per message (UID, BODYSTRUCTURE, HEADER)"""
+    results = []
+    for node in _build_tree(_tokenize(data)):
+        if not isinstance(node, list):
+            continue  # message sequence number
+        item: Dict[str, Any] = {}
+        for key, value in zip(node[::2], node[1::2]):
+            key = key.upper() if isinstance(key, str) else key
+            if key == "UID":
+                item["UID"] = value
+            elif key == "BODYSTRUCTURE":
+                item["BODYSTRUCTURE"] = value
+            elif isinstance(key, str) and key.startswith("BODY[HEADER"):
+                item["HEADER"] = value
+        results.append(item)
+    return results
+
+
+def _text(value: Any) -> str:
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="replace")
+    return value or ""
+
+
+def _params(value: Any) -> Dict[str, str]:
+    """Convert a BODYSTRUCTURE parameter list into a dict with lowercase keys"""
+    if not isinstance(value, list):
+        return {}
+    params = {}
+    for key, val in zip(value[::2], value[1::2]):
+        key = _text(key).lower()
+        val = _text(val)
+        if key.endswith("*"):
+            # rfc2231 extended value, e.g. utf-8''Partie%2033876.csv
+            key = key.rstrip("*")
+            val = collapse_rfc2231_value(tuple(decode_rfc2231(val)))
+        params[key] = val
+    return params
+
+
+def _decode_filename(filename: str) -> str:
+    if "=?" in filename:
+        return str(make_header(decode_header(filename)))
+    return filename
+
+
+def _collect_attachments(structure: Any, prefix: str = "") -> List[Dict[str, Any]]:
+    """Walk a BODYSTRUCTURE tree and return the parts that carry a filename"""
+    if not isinstance(structure, list) or not structure:
+        return []
+
+    if isinstance(structure[0], list):
+        # multipart: child bodies followed by the subtype and extension data
+        parts = []
+        index = 1
+        for child in structure:
+            if not isinstance(child, list):
+                break
+            part_id = f"{prefix}.{index}" if prefix else str(index)
+            parts.extend(_collect_attachments(child, part_id))
+            index += 1
+        return parts
+
+    main_type = _text(structure[0]).lower()
+    sub_type = _text(structure[1]).lower()
+    body_params = _params(structure[2])
+    encoding = _text(structure[5])
+    size = int(structure[6] or 0)
+
+    # Extension data starts after the type-specific fields (rfc3501 7.4.2)
+    if main_type == "text":
+        disposition_index = 9
+    elif main_type == "message" and sub_type == "rfc822":
+        disposition_index = 11
+    else:
+        disposition_index = 8
+    disposition = (
+        structure[disposition_index] if len(structure) > disposition_index else None
+    )
+    disposition_params = (
+        _params(disposition[1])
+        if isinstance(disposition, list) and len(disposition) > 1
+        else {}
+    )
+
+    filename = disposition_params.get("filename") or body_params.get("name")
+    if not filename:
+        return []
+    return [
+        {
+            "part_id": prefix or "1",
+            "filename": _decode_filename(filename),
+            "content_type": f"{main_type}/{sub_type}",
+            "encoding": encoding,
+            "size": size,
+        }
+    ]
@@ -1,93 +1,151 @@
+import imaplib
 import json
+import select
 import threading
 import time
-import asyncio
-from functools import wraps
-from imap_tools import MailBox, AND
+from contextlib import contextmanager
+from imap_tools import MailBox, MailBoxUnencrypted, MailMessageFlags, AND
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.application import MIMEApplication
-import smtplib
 from fastapi import UploadFile
 import io
 from app.core.config import get_settings
 from app.core.logger import LoggerSingleton
+from app.utils.event_loop import background_loop
+from app.utils.archive_utils import is_archive, iter_archive_members
+from .container import services
 from .packing_list_service import PackingListService
-import ssl
-from typing import Optional, Dict, List, Callable, Any
+from .email_fetch import LazyMessageFetcher
+from .monitoring import system_monitor
+from . import progress, tracing
+from .smtp_outbox import SMTPOutbox
+from .job_queue import DONE, FAILED, JobFile, JobQueue, QueuedJob, classify_input_file
+from .email_sync import (
+    SyncWatermark,
+    WatermarkStore,
+    read_folder_status,
+    search_new_uids,
+    supports_condstore,
+    supports_gmail_labels,
+)
+from typing import Optional, Dict, Iterator, List, Callable, Any
 
 # Get logger from singleton
 logger = LoggerSingleton.get_logger()
 console = LoggerSingleton.get_console()
 
 
-def run_async(async_func):
-    """Decorator to run async functions in sync context"""
-
-    @wraps(async_func)
-    def wrapper(*args, **kwargs):
-        loop = asyncio.new_event_loop()
-        try:
-            result = loop.run_until_complete(async_func(*args, **kwargs))
-            return result
-        finally:
-            loop.close()
-
-    return wrapper
-
-
 class EmailService:
     def __init__(self):
         settings = get_settings()
         self.email = settings.EMAIL_ADDRESS
         self.password = settings.EMAIL_PASSWORD.get_secret_value()
         self.imap_server = settings.IMAP_SERVER
+        self.imap_port = settings.IMAP_PORT
+        self.imap_ssl = settings.IMAP_SSL
         self.smtp_server = settings.SMTP_SERVER
         self.smtp_port = settings.SMTP_PORT
         self.packing_list_service = PackingListService()
+        self.outbox = SMTPOutbox(
+            host=self.smtp_server,
+            port=self.smtp_port,
+            username=self.email,
+            password=self.password,
+            pool_size=settings.SMTP_POOL_SIZE,
+            keepalive_interval=settings.SMTP_KEEPALIVE_INTERVAL,
+            use_tls=settings.SMTP_USE_TLS,
+        )
 
         # Template configuration
         self.template_path = settings.TEMPLATE_PACKING_LIST_PATH
         self.template_file = None
+        self.template_content: Optional[bytes] = None
         self._load_template()  # Load template at initialization
 
         # Polling configuration
         self.polling_enabled = settings.EMAIL_POLLING_ENABLED
         self.poll_interval = settings.EMAIL_POLLING_INTERVAL
         self.label_filter = settings.EMAIL_LABEL_FILTER
+        self._label_warning_logged = False
         self.max_fetch = settings.EMAIL_MAX_FETCH
+        self.worker_concurrency = max(1, settings.EMAIL_WORKER_CONCURRENCY)
+        self.subject_filter = settings.EMAIL_SUBJECT_FILTER
+
+        # Archive attachment limits
+        self.archive_max_member_bytes = settings.ARCHIVE_MAX_MEMBER_BYTES
+        self.archive_max_total_bytes = settings.ARCHIVE_MAX_TOTAL_BYTES
+        self.archive_max_members = settings.ARCHIVE_MAX_MEMBERS
+
+        # Incremental sync state
+        self.watermark_store = WatermarkStore(settings.EMAIL_SYNC_STATE_PATH)
+
+        # IMAP IDLE configuration
+        self.idle_enabled = settings.EMAIL_IDLE_ENABLED
+        self.idle_timeout = settings.EMAIL_IDLE_TIMEOUT
+        self.reconnect_max_backoff = settings.EMAIL_RECONNECT_MAX_BACKOFF
+
+        # Durable job queue between ingestion and processing
+        self.job_queue = JobQueue(
+            settings.JOB_QUEUE_PATH,
+            lease_seconds=settings.JOB_LEASE_SECONDS,
+            max_attempts=settings.JOB_MAX_ATTEMPTS,
+        )
+        self.job_poll_interval = settings.JOB_POLL_INTERVAL
+        # Budget shared with packing lists uploaded over HTTP
+        self.admission = services.get("admission")
+
+        # Serializes IMAP commands issued from different threads
+        self._mailbox_lock = threading.RLock()
+        # Set by job workers when a sent reply still needs its message flagged SEEN
+        self._flag_event = threading.Event()
 
         # Polling control
         self.polling = False
         self.poll_thread: Optional[threading.Thread] = None
 
+        # Job worker control
+        self.workers_running = False
+        self.worker_threads: List[threading.Thread] = []
+        self._busy_workers = 0
+        self._busy_lock = threading.Lock()
+
     def _load_template(self):
         """Load the template file from local path"""
         try:
             with open(self.template_path, "r") as f:
                 content = f.read()
+                self.template_content = content.encode()
                 # Convert to UploadFile format for compatibility
-                self.template_file = UploadFile(
-                    filename="template_packing_list.csv",
-                    file=io.BytesIO(content.encode()),
-                )
+                self.template_file = self._new_template_file()
             logger.info(f"Template loaded from {self.template_path}")
         except Exception as e:
             logger.error(f"Failed to load template: {str(e)}")
             raise ValueError(f"Template loading failed: {str(e)}")
 
+    def _new_template_file(self) -> UploadFile:
+        """Create a private template UploadFile so concurrent jobs never share a file pointer"""
+        return UploadFile(
+            filename="template_packing_list.csv",
+            file=io.BytesIO(self.template_content),
+        )
+
     def start_polling(self):
         """Start the background polling for emails"""
         if self.polling or not self.polling_enabled:
             return False
 
         self.polling = True
-        self.poll_thread = threading.Thread(target=self._polling_worker, daemon=True)
+        worker = self._idle_worker if self.idle_enabled else self._polling_worker
+        self.poll_thread = threading.Thread(target=worker, daemon=True)
         self.poll_thread.start()
 
-        logger.info(
-            f"Email polling started with {self.poll_interval}s interval for label '{self.label_filter}'"
-        )
+        if self.idle_enabled:
+            logger.info(f"Email IDLE watcher started for label '{self.label_filter}'")
+        else:
+            logger.info(
+                f"Email polling started with {self.poll_interval}s interval for label '{self.label_filter}'"
+            )
         return True
 
     def stop_polling(self):
@@ -103,6 +161,36 @@ class EmailService:
         logger.info("Email polling stopped")
         return True
 
+    def start_workers(self):
+        """Start the job workers that process queued packing list jobs"""
+        if self.workers_running:
+            return False
+
+        self.workers_running = True
+        for index in range(self.worker_concurrency):
+            thread = threading.Thread(
+                target=self._job_worker, name=f"job-worker-{index}", daemon=True
+            )
+            thread.start()
+            self.worker_threads.append(thread)
+
+        logger.info(f"Started {self.worker_concurrency} job workers")
+        return True
+
+    def stop_workers(self):
+        """Stop the job workers; jobs in progress are resumed after their lease expires"""
+        if not self.workers_running:
+            return False
+
+        self.workers_running = False
+        for thread in self.worker_threads:
+            thread.join(timeout=10)
+        self.worker_threads = []
+        self.outbox.close()
+
+        logger.info("Job workers stopped")
+        return True
+
     def _polling_worker(self):
         """Worker function that runs in background thread"""
         logger.info(
@@ -124,78 +212,461 @@ class EmailService:
             # Sleep until next check
             time.sleep(self.poll_interval)
 
+    def _idle_worker(self):
+        """Worker function that holds one IMAP session and waits for new mail via IDLE
+
+        Falls back to the polling worker when the server does not advertise IDLE.
+        The session is re-established with exponential backoff after failures.
+        """
+        logger.info(
+            f"Email IDLE worker started - waiting for emails with label '{self.label_filter}'"
+        )
+        attempt = 0
+
+        while self.polling:
+            try:
+                with self._get_mailbox_connection() as mailbox:
+                    if not self._supports_idle(mailbox):
+                        logger.warning(
+                            "IMAP server does not support IDLE, falling back to polling"
+                        )
+                        break
+
+                    attempt = 0
+                    # Catch up on anything that arrived while disconnected
+                    self._process_mailbox(mailbox)
+
+                    while self.polling:
+                        if self._wait_for_new_mail(mailbox):
+                            result = self._process_mailbox(mailbox)
+                            logger.debug(
+                                f"IDLE wake-up: Processed {result['emails_processed']} emails"
+                            )
+                        else:
+                            # Keep the session alive between IDLE periods
+                            mailbox.client.noop()
+            except Exception as e:
+                if not self.polling:
+                    break
+                attempt += 1
+                delay = min(2**attempt, self.reconnect_max_backoff)
+                logger.error(
+                    f"IMAP IDLE session failed (attempt {attempt}): {str(e)}. "
+                    f"Reconnecting in {delay}s"
+                )
+                self._sleep_while_polling(delay)
+
+        # Only reached while still polling when the server lacks IDLE
+        if self.polling:
+            self._polling_worker()
+
+    def _supports_idle(self, mailbox) -> bool:
+        """Check whether the IMAP server advertises the IDLE capability"""
+        return "IDLE" in mailbox.client.capabilities
+
+    def _wait_for_new_mail(self, mailbox) -> bool:
+        """Block in IDLE until the server reports new mail or the IDLE period ends
+
+        The socket is polled in one-second slices so that stop_polling() is honoured
+        promptly. Returns True when an EXISTS/RECENT response was received or when
+        finished jobs are waiting for their message to be flagged SEEN. Raises
+        imaplib.IMAP4.abort when the server closed the connection, so the caller
+        reconnects at once instead of idling on a dead socket until the period ends.
+        """
+        deadline = time.time() + self.idle_timeout
+        with mailbox.idle as idle:
+            while self.polling and time.time() < deadline:
+                responses = idle.poll(timeout=1)
+                # imap_tools swallows EOF: the socket stays readable yet yields no response
+                if not responses and self._readable(mailbox):
+                    # Confirm with a second read, in case a response arrived just now
+                    responses = idle.poll(timeout=0)
+                    if not responses and self._readable(mailbox):
+                        raise imaplib.IMAP4.abort("IMAP server closed the connection during IDLE")
+                if any(b"EXISTS" in r or b"RECENT" in r for r in responses):
+                    return True
+                if self._flag_event.is_set():
+                    return True
+        return False
+
+    def _readable(self, mailbox) -> bool:
+        readable, _, _ = select.select([mailbox.client.sock], [], [], 0)
+        return bool(readable)
+
+    def _sleep_while_polling(self, seconds: float):
+        """Sleep in short slices so that stop_polling() is not delayed by backoff"""
+        deadline = time.time() + seconds
+        while self.polling and time.time() < deadline:
+            time.sleep(min(1, deadline - time.time()))
+
     def _get_mailbox_connection(self):
         """Returns a context manager for mailbox connection"""
         if not self.email or not self.password:
             raise ValueError("Email credentials not configured")
-        return MailBox(self.imap_server).login(self.email, self.password)
+        if not self.imap_ssl:
+            mailbox = MailBoxUnencrypted(self.imap_server, self.imap_port).login(
+                self.email, self.password
+            )
+        else:
+            mailbox = MailBox(self.imap_server, self.imap_port).login(self.email, self.password)
+        if self.label_filter and not self._label_warning_logged and not supports_gmail_labels(mailbox):
+            self._label_warning_logged = True
+            logger.warning(
+                f"IMAP server does not support Gmail labels; ignoring label filter "
+                f"'{self.label_filter}' and matching on the subject only"
+            )
+        return mailbox
 
     def _fetch_messages(self, mailbox, criteria=None, limit=None):
         """Fetch messages from mailbox with given criteria"""
         if criteria is None:
-            criteria = AND(seen=False, subject="ROHDEX")
+            criteria = AND(seen=False, subject=self.subject_filter)
         if limit is None:
             limit = self.max_fetch
         return list(mailbox.fetch(criteria, limit=limit))
 
+    def _fetch_new_messages(self, mailbox, fetcher: LazyMessageFetcher, limit=None):
+        """Fetch unread messages that arrived after the stored UID watermark
+
+        Only headers and BODYSTRUCTURE are fetched here; attachment contents are
+        downloaded on demand by process_attachments.
+        Returns the messages and the watermark to store once they are processed.
+        The per-cycle cost is one STATUS plus a search over the new UID window,
+        independent of the total mailbox size.
+        """
+        if limit is None:
+            limit = self.max_fetch
+
+        folder = mailbox.folder.get() or "INBOX"
+        status = read_folder_status(mailbox, folder)
+        uidvalidity = status["UIDVALIDITY"]
+        high_uid = status["UIDNEXT"] - 1
+        modseq = status.get("HIGHESTMODSEQ")
+
+        watermark = self.watermark_store.load(folder)
+        if watermark is None or watermark.uidvalidity != uidvalidity:
+            if watermark is not None:
+                logger.warning(
+                    f"UIDVALIDITY of '{folder}' changed, resyncing from the beginning"
+                )
+            watermark = SyncWatermark(folder=folder, uidvalidity=uidvalidity)
+
+        # Nothing changed since the last cycle
+        if high_uid <= watermark.last_uid or (
+            supports_condstore(mailbox)
+            and modseq is not None
+            and modseq == watermark.highestmodseq
+        ):
+            return [], watermark
+
+        uids = search_new_uids(
+            mailbox, watermark, high_uid, self.subject_filter, self.label_filter
+        )
+        batch = uids[:limit]
+        system_monitor.set_gauge("email_backlog", len(uids) - len(batch))
+        messages = fetcher.fetch_summaries(batch)
+
+        # Advance past the whole window unless the batch was truncated by the limit
+        if len(uids) > limit:
+            last_uid = int(batch[-1])
+            modseq = None  # window not fully consumed, force a re-check next cycle
+        else:
+            last_uid = high_uid
+        next_watermark = watermark.model_copy(
+            update={"last_uid": last_uid, "highestmodseq": modseq}
+        )
+        return messages, next_watermark
+
     def _mark_as_read(self, mailbox, msg):
         """Mark a message as read"""
-        mailbox.flag(msg.uid, "SEEN", True)
+        with self._mailbox_lock:
+            mailbox.flag(msg.uid, "SEEN", True)
 
     def process_labeled_emails(self) -> Dict[str, int]:
-        """Process all unread emails with the specified Gmail label"""
+        """Ingest all new unread emails with the specified Gmail label into the job queue"""
         stats = {"emails_processed": 0, "files_generated": 0}
 
         try:
             with self._get_mailbox_connection() as mailbox:
-                messages = self._fetch_messages(mailbox)
-                logger.info(
-                    f"Found {len(messages)} unread messages with subject 'ROHDEX'"
-                )
-
-                for msg in messages:
-                    try:
-                        result = self._process_single_message(mailbox, msg)
-                        if result:
-                            stats["emails_processed"] += 1
-                            stats["files_generated"] += 1
-                    except Exception as e:
-                        logger.error(f"Error processing email {msg.uid}: {str(e)}")
-                        self._mark_as_read(mailbox, msg)
+                stats = self._process_mailbox(mailbox)
         except Exception as e:
             raise ValueError(f"Email processing failed: {str(e)}")
 
         return stats
 
-    def _process_single_message(self, mailbox, msg):
-        """Process a single email message"""
-        logger.info(f"Processing email from: {msg.from_}, subject: {msg.subject}")
+    def _process_mailbox(self, mailbox) -> Dict[str, int]:
+        """Enqueue new messages and flag answered ones, using an open mailbox session
+
+        Messages are only flagged SEEN after a job worker sent the reply. If
+        ingestion fails the watermark is not advanced, and already queued
+        messages are skipped on the next cycle because enqueueing is idempotent.
+        """
+        stats = {"emails_processed": 0, "files_generated": 0}
+        start_time = time.time()
+        fetcher = LazyMessageFetcher(mailbox, lock=self._mailbox_lock)
+
+        messages, watermark = self._fetch_new_messages(mailbox, fetcher)
+        logger.info(
+            f"Found {len(messages)} new unread messages with subject '{self.subject_filter}'"
+        )
+
+        for msg in messages:
+            if self._ingest_message(mailbox, msg, watermark):
+                stats["emails_processed"] += 1
+
+        self.watermark_store.save(watermark)
+        self._flag_completed_jobs(mailbox, watermark)
+        self._update_queue_gauges()
+
+        system_monitor.record_request(
+            service="EmailService",
+            operation="fetch_cycle",
+            success=True,
+            duration=time.time() - start_time,
+            metadata={
+                "messages": len(messages),
+                "bytes_downloaded": fetcher.bytes_downloaded,
+            },
+        )
+        return stats
+
+    def _ingest_message(self, mailbox, msg, watermark: SyncWatermark) -> bool:
+        """Download the relevant attachments of a message and enqueue a job for it"""
+        logger.info(f"Ingesting email from: {msg.from_}, subject: {msg.subject}")
 
-        # Process attachments
-        files = self.process_attachments(msg)
+        fetch_start = time.time()
+        files = self._collect_job_files(msg)
+        fetch_end = time.time()
+        kinds = {f.kind for f in files}
 
         # Skip emails without required attachments (template no longer required)
-        if not files.get("partie_files") or not files.get("wahrheit_file"):
+        if "partie" not in kinds or "wahrheit" not in kinds:
             logger.warning(f"Skipping email with missing attachments, marking as read")
             self._mark_as_read(mailbox, msg)
             return False
 
-        # Generate packing list using local template
-        logger.info(f"Generating packing list for message {msg.uid}...")
-        result = self._generate_packing_list_sync(
-            partie_files=files["partie_files"],
-            wahrheit_file=files["wahrheit_file"],
-            template_file=self.template_file,  # Use local template
+        job_id = self.job_queue.enqueue(
+            files,
+            message_id=getattr(msg, "message_id", None),
+            folder=watermark.folder,
+            uidvalidity=watermark.uidvalidity,
+            uid=msg.uid,
+            sender=msg.from_,
+            subject=msg.subject,
+        )
+        if job_id is not None:
+            logger.info(f"Queued job {self.job_queue.job_key(job_id)} for message {msg.uid}")
+            tracing.tracer.record(
+                self.job_queue.job_key(job_id),
+                "imap_fetch",
+                fetch_start,
+                fetch_end,
+                uid=msg.uid,
+                files=len(files),
+                bytes=sum(len(f.content) for f in files),
+            )
+        return job_id is not None
+
+    def _flag_completed_jobs(self, mailbox, watermark: SyncWatermark):
+        """Flag SEEN the messages whose reply has been sent, FLAGGED those that failed
+
+        Failed messages stay unread but are starred: the watermark has already
+        passed them, so they would otherwise never be looked at again.
+        """
+        self._flag_event.clear()
+        for status, flag in ((DONE, MailMessageFlags.SEEN), (FAILED, MailMessageFlags.FLAGGED)):
+            rows = self.job_queue.jobs_to_flag(watermark.folder, watermark.uidvalidity, status)
+            if not rows:
+                continue
+            with self._mailbox_lock:
+                mailbox.flag([uid for _, uid in rows], flag, True)
+            self.job_queue.mark_flagged([job_id for job_id, _ in rows])
+            if status == FAILED:
+                logger.warning(f"Flagged {len(rows)} messages whose job failed for manual handling")
+            else:
+                logger.debug(f"Flagged {len(rows)} answered messages as read")
+
+    def _update_queue_gauges(self):
+        system_monitor.set_gauge("job_queue_depth", self.job_queue.depth())
+        system_monitor.set_gauge(
+            "job_queue_oldest_age_seconds", self.job_queue.oldest_pending_age()
         )
+        system_monitor.set_gauge("job_queue_failed", self.job_queue.get_stats().get(FAILED, 0))
+        system_monitor.set_gauge(
+            "email_messages_per_minute",
+            system_monitor.get_throughput(
+                "EmailService", "process_message", window=300.0
+            ),
+        )
+
+    def _job_worker(self):
+        """Worker function that claims and processes queued jobs until stopped"""
+        while self.workers_running:
+            try:
+                job = self.job_queue.claim()
+            except Exception as e:
+                logger.error(f"Failed to claim job: {str(e)}")
+                job = None
+
+            if job is None:
+                time.sleep(self.job_poll_interval)
+                continue
+
+            with self._busy_lock:
+                self._busy_workers += 1
+                system_monitor.set_gauge("email_in_flight", self._busy_workers)
+            try:
+                # Progress events and spans of the job are published under its job key
+                job_key = self.job_queue.job_key(job.id)
+                with progress.job_scope(job_key), tracing.trace(
+                    job_key, "email_job", uid=job.uid, attempt=job.attempts
+                ), self._keep_lease(job):
+                    self._run_job(job)
+            finally:
+                with self._busy_lock:
+                    self._busy_workers -= 1
+                    system_monitor.set_gauge("email_in_flight", self._busy_workers)
+                self._update_queue_gauges()
+
+    @contextmanager
+    def _keep_lease(self, job: QueuedJob) -> Iterator[None]:
+        """Renew the job's lease while it waits for admission, generates and replies"""
+        stop = threading.Event()
+
+        def renew():
+            while not stop.wait(self.job_queue.lease_seconds / 3):
+                try:
+                    if not self.job_queue.renew(job.id, job.lease_token):
+                        logger.warning(f"Lost the lease on job {job.id}; another worker took it over")
+                        return
+                except Exception as e:
+                    logger.warning(f"Failed to renew the lease on job {job.id}: {str(e)}")
+
+        thread = threading.Thread(target=renew, name=f"job-lease-{job.id}", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
 
-        # Send response
+    def _run_job(self, job: QueuedJob) -> bool:
+        """Generate and send the reply for one job, isolating its failures from other jobs"""
+        start_time = time.time()
+        progress.emit("job_started", uid=job.uid, attempt=job.attempts)
+        try:
+            self._process_job(job)
+            if not self.job_queue.complete(job.id, job.lease_token):
+                logger.warning(f"Job {job.id} was taken over by another worker after its reply was sent")
+            self._flag_event.set()
+            progress.emit(progress.JOB_COMPLETED, duration=time.time() - start_time)
+            system_monitor.record_request(
+                service="EmailService",
+                operation="process_message",
+                success=True,
+                duration=time.time() - start_time,
+                metadata={"job_id": job.id, "uid": job.uid, "attempt": job.attempts},
+            )
+            return True
+        except Exception as e:
+            logger.error(f"Error processing job {job.id} (uid {job.uid}): {str(e)}")
+            status = self.job_queue.fail(job.id, job.lease_token, str(e))
+            if status == FAILED:
+                logger.error(f"Job {job.id} failed after {job.attempts} attempts; flagging its message")
+                self._flag_event.set()
+            elif status is None:
+                logger.warning(f"Job {job.id} was taken over by another worker; not rescheduling it")
+            progress.emit(progress.JOB_FAILED, error=str(e), attempt=job.attempts)
+            system_monitor.record_request(
+                service="EmailService",
+                operation="process_message",
+                success=False,
+                duration=time.time() - start_time,
+                metadata={"job_id": job.id, "uid": job.uid, "attempt": job.attempts},
+            )
+            system_monitor.record_error(
+                service="EmailService",
+                operation="process_message",
+                error_message=str(e),
+                metadata={"job_id": job.id, "uid": job.uid, "attempt": job.attempts},
+            )
+            return False
+
+    def _process_job(self, job: QueuedJob):
+        """Generate the packing list for a job and reply to the sender"""
+        logger.info(f"Processing job {job.id} from: {job.sender}, subject: {job.subject}")
+
+        partie_files = [
+            UploadFile(filename=f.filename, file=io.BytesIO(f.content))
+            for f in job.files
+            if f.kind == "partie"
+        ]
+        wahrheit_file = [
+            UploadFile(filename=f.filename, file=io.BytesIO(f.content))
+            for f in job.files
+            if f.kind == "wahrheit"
+        ][-1]
+
+        # Generate packing list using local template
+        logger.info(f"Generating packing list for job {job.id}...")
+        generation_start = time.time()
+        with self.admission.admit_sync(sum(len(f.content) for f in job.files)):
+            result = self._generate_packing_list_sync(
+                partie_files=partie_files,
+                wahrheit_file=wahrheit_file,
+                template_file=self._new_template_file(),  # Use local template
+            )
+        generation_duration = time.time() - generation_start
+
+        # Only the claim still holding the lease may reply, or the sender gets two replies
+        if not self.job_queue.renew(job.id, job.lease_token):
+            raise ValueError(f"Lease on job {job.id} expired before its reply was sent")
+
+        # Send response (send latency is recorded by the outbox as SMTPOutbox/send_message)
         logger.info("Sending response...")
-        self._send_response_sync(msg.from_, msg.subject, result)
-        logger.info("Response sent")
+        send_start = time.time()
+        with tracing.span("smtp_send", bytes=len(result)):
+            self._send_response_sync(job.sender, job.subject, result)
+        progress.emit("reply_sent", to=job.sender, duration=time.time() - send_start)
+        logger.info(
+            f"Response sent (generation {generation_duration:.2f}s, "
+            f"send {time.time() - send_start:.2f}s)"
+        )
 
-        # Mark as processed
-        self._mark_as_read(mailbox, msg)
-        return True
+    def _collect_job_files(self, msg) -> List[JobFile]:
+        """Download the Partie and Wahrheit attachments of a message
+
+        Attachments are classified by filename first so unrelated ones are never downloaded.
+        ZIP and gzip attachments are expanded and each member is classified the same way.
+        """
+        files = []
+        for att in msg.attachments:
+            console.print(f"Processing attachment: {att}")
+            if is_archive(att.filename):
+                files.extend(self._collect_archive_files(att))
+                continue
+            kind = classify_input_file(att.filename)
+            if kind is None:
+                continue
+            files.append(JobFile(kind=kind, filename=att.filename, content=att.payload))
+            logger.debug(f"Added as {kind} file: {att.filename}")
+        return files
+
+    def _collect_archive_files(self, att) -> List[JobFile]:
+        """Stream the Partie and Wahrheit members out of an archive attachment"""
+        files = []
+        for name, content in iter_archive_members(
+            att.filename,
+            att.payload,
+            select=lambda member: classify_input_file(member) is not None,
+            max_member_bytes=self.archive_max_member_bytes,
+            max_total_bytes=self.archive_max_total_bytes,
+            max_members=self.archive_max_members,
+        ):
+            kind = classify_input_file(name)
+            files.append(JobFile(kind=kind, filename=name, content=content))
+            logger.debug(f"Added as {kind} file: {name} (from {att.filename})")
+        return files
 
     def process_attachments(self, msg) -> dict:
         """Process attachments from an email message"""
@@ -203,26 +674,14 @@ class EmailService:
 
         logger.debug(f"Processing {len(msg.attachments)} attachments")
 
-        for att in msg.attachments:
-            # Get original filename (preserve case for passing to processing functions)
-            console.print(f"Processing attachment: {att}")
-            original_filename = att.filename
-            # filename to lowercase for checking
-            lower_filename = original_filename.lower()
-            # Convert attachment to UploadFile
+        for job_file in self._collect_job_files(msg):
             file = UploadFile(
-                filename=original_filename,
-                file=io.BytesIO(att.payload),
+                filename=job_file.filename, file=io.BytesIO(job_file.content)
             )
-
-            # Check for partie files
-            if "partie" in lower_filename:
+            if job_file.kind == "partie":
                 files["partie_files"].append(file)
-                logger.debug(f"Added as Partie file: {original_filename}")
-            # Check for wahrheit files (including Excel files with V-LIEF in the name)
-            elif "wahrheit" in lower_filename:
+            else:
                 files["wahrheit_file"] = file
-                logger.debug(f"Added as Wahrheit file: {original_filename}")
 
         # Log summary of processed files
         logger.debug(
@@ -232,7 +691,6 @@ class EmailService:
 
         return files
 
-    @run_async
     async def _generate_packing_list_async(
         self, partie_files, wahrheit_file, template_file
     ):
@@ -244,12 +702,11 @@ class EmailService:
         )
 
     def _generate_packing_list_sync(self, partie_files, wahrheit_file, template_file):
-        """Synchronous wrapper for packing_list_service.generate"""
-        return self._generate_packing_list_async(
-            partie_files, wahrheit_file, template_file
+        """Synchronous wrapper for packing_list_service.generate on the shared event loop"""
+        return background_loop.run(
+            self._generate_packing_list_async(partie_files, wahrheit_file, template_file)
         )
 
-    @run_async
     async def _send_response_async(self, to_email, subject, csv_content):
         """Send email with generated CSV as attachment"""
         try:
@@ -274,22 +731,19 @@ class EmailService:
             )
             msg.attach(attachment)
 
-            # Create a secure SSL/TLS context
-            context = ssl.create_default_context()
-
-            logger.debug("Starting SMTP operations with SSL...")
-            with smtplib.SMTP_SSL(self.smtp_server, 465, context=context) as server:
-                server.login(self.email, self.password)
-                server.send_message(msg)
-                logger.debug("Message sent successfully")
+            logger.debug("Sending message through pooled SMTP outbox...")
+            await self.outbox.send(msg)
+            logger.debug("Message sent successfully")
 
         except Exception as e:
             logger.error(f"Failed to send email: {str(e)}")
             raise ValueError(f"Email sending failed: {str(e)}")
 
     def _send_response_sync(self, to_email, subject, csv_content):
-        """Synchronous wrapper for send_response"""
-        return self._send_response_async(to_email, subject, csv_content)
+        """Synchronous wrapper for send_response on the shared event loop"""
+        return background_loop.run(
+            self._send_response_async(to_email, subject, csv_content)
+        )
 
     async def process_rohdex_emails(self) -> dict:
         """Process emails with specific subject for Rohdex"""
@@ -328,7 +782,7 @@ class EmailService:
                         result = await self.packing_list_service.generate(
                             partie_files=files["partie_files"],
                             wahrheit_file=files["wahrheit_file"],
-                            template_file=self.template_file,  # Use local template
+                            template_file=self._new_template_file(),  # Use local template
                         )
                         logger.info("Packing list generated")
 
@@ -354,7 +808,6 @@ class EmailService:
 
         return stats
 
-    @run_async
     async def process_attachments_async(self, msg):
         """Async version of process_attachments"""
         return self.process_attachments(msg)
@@ -0,0 +1,120 @@
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+from imap_tools import AND, U
+from imap_tools.utils import encode_folder
+from pydantic import BaseModel
+from app.core.logger import LoggerSingleton
+
+# Get logger from singleton
+logger = LoggerSingleton.get_logger()
+
+STATUS_ITEM_PATTERN = re.compile(rb"(UIDNEXT|UIDVALIDITY|HIGHESTMODSEQ) (\d+)")
+
+
+class SyncWatermark(BaseModel):
+    """Last processed position in a mailbox folder"""
+
+    folder: str
+    uidvalidity: int
+    last_uid: int = 0
+    highestmodseq: Optional[int] = None
+
+
+class WatermarkStore:
+    """Persists per-folder sync watermarks as a small JSON file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+
+    def load(self, folder: str) -> Optional[SyncWatermark]:
+        """Load the watermark for a folder, or None if nothing was synced yet"""
+        data = self._read_all().get(folder)
+        return SyncWatermark(**data) if data else None
+
+    def save(self, watermark: SyncWatermark):
+        """Store the watermark for its folder, replacing the file atomically"""
+        with self._lock:
+            data = self._read_all()
+            data[watermark.folder] = watermark.model_dump()
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+
+    def _read_all(self) -> Dict[str, Dict]:
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError as e:
+            logger.warning(f"Ignoring corrupt sync state {self.path}: {str(e)}")
+            return {}
+
+
+def supports_condstore(mailbox) -> bool:
+    """Check whether the IMAP server advertises CONDSTORE (rfc7162)"""
+    return "CONDSTORE" in mailbox.client.capabilities
+
+
+def supports_gmail_labels(mailbox) -> bool:
+    """Check whether the IMAP server supports Gmail labels (X-GM-EXT-1)"""
+    return "X-GM-EXT-1" in mailbox.client.capabilities
+
+
+def read_folder_status(mailbox, folder: str) -> Dict[str, int]:
+    """Read UIDVALIDITY, UIDNEXT and, with CONDSTORE, HIGHESTMODSEQ for a folder
+
+    Uses a single STATUS command, whose cost does not depend on the mailbox size.
+    """
+    items = ["UIDNEXT", "UIDVALIDITY"]
+    if supports_condstore(mailbox):
+        items.append("HIGHESTMODSEQ")
+
+    typ, data = mailbox.client.status(encode_folder(folder), f"({' '.join(items)})")
+    if typ != "OK":
+        raise ValueError(f"STATUS failed for folder {folder}: {data}")
+
+    status = {}
+    for line in data:
+        if not isinstance(line, bytes):
+            continue
+        for key, value in STATUS_ITEM_PATTERN.findall(line):
+            status[key.decode()] = int(value)
+    return status
+
+
+def build_search_criteria(
+    mailbox, subject: str, label: Optional[str], start_uid: int, end_uid: int
+):
+    """Build the server-side search for unread messages inside a UID window
+
+    The label filter uses Gmail's X-GM-LABELS extension and is ignored on
+    servers without it, where only the subject filter applies.
+    """
+    criteria = {"uid": U(start_uid, end_uid), "seen": False, "subject": subject}
+    if label and supports_gmail_labels(mailbox):
+        criteria["gmail_label"] = label
+    return AND(**criteria)
+
+
+def search_new_uids(
+    mailbox,
+    watermark: SyncWatermark,
+    high_uid: int,
+    subject: str,
+    label: Optional[str],
+) -> List[str]:
+    """Return matching UIDs above the watermark, oldest first"""
+    criteria = build_search_criteria(
+        mailbox, subject, label, watermark.last_uid + 1, high_uid
+    )
+    # "n:m" also matches the highest UID when it is below n, so filter client-side
+    uids = [uid for uid in mailbox.uids(criteria) if int(uid) > watermark.last_uid]
+    return sorted(uids, key=int)
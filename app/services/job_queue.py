@@ -0,0 +1,376 @@
+import hashlib
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from pydantic import BaseModel
+from app.core.logger import LoggerSingleton
+
+# Get logger from singleton
+logger = LoggerSingleton.get_logger()
+
+# Job states
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    dedupe_key TEXT NOT NULL UNIQUE,
+    message_id TEXT,
+    folder TEXT,
+    uidvalidity INTEGER,
+    uid TEXT,
+    sender TEXT,
+    subject TEXT,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL,
+    lease_until REAL,
+    lease_token TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    finished_at REAL,
+    flagged INTEGER NOT NULL DEFAULT 0,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, available_at);
+CREATE TABLE IF NOT EXISTS job_files (
+    job_id INTEGER NOT NULL REFERENCES jobs (id),
+    kind TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    content BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_job_files_job ON job_files (job_id);
+CREATE TABLE IF NOT EXISTS queue_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+class JobFile(BaseModel):
+    """An input file stored with a job"""
+
+    kind: str  # "partie" or "wahrheit"
+    filename: str
+    content: bytes
+
+
+def classify_input_file(filename: str) -> Optional[str]:
+    """Return "partie" or "wahrheit" based on the filename, None for other files"""
+    lower_filename = filename.lower()
+    if "partie" in lower_filename:
+        return "partie"
+    # Wahrheit files (including Excel files with V-LIEF in the name)
+    if "wahrheit" in lower_filename:
+        return "wahrheit"
+    return None
+
+
+class QueuedJob(BaseModel):
+    """A packing list job claimed from the queue"""
+
+    id: int
+    message_id: Optional[str] = None
+    folder: Optional[str] = None
+    uidvalidity: Optional[int] = None
+    uid: Optional[str] = None
+    sender: Optional[str] = None
+    subject: Optional[str] = None
+    attempts: int = 0
+    # Identifies this claim; completing or failing the job requires it
+    lease_token: Optional[str] = None
+    files: List[JobFile] = []
+
+
+class JobQueue:
+    """Durable SQLite-backed job queue shared by email ingestion and processing workers
+
+    Producers enqueue idempotently (keyed by Message-ID and attachment hashes),
+    consumers claim jobs under a lease so that a job held by a crashed process
+    becomes available again once its lease expires. A running job renews its
+    lease; completing, failing or renewing only succeeds for the claim that
+    still holds the lease, so a worker whose lease ran out cannot overwrite the
+    outcome of the worker that took the job over. Every call opens its own
+    connection, so the queue can be used from any thread or process.
+    """
+
+    def __init__(self, path: str, lease_seconds: float = 900.0, max_attempts: int = 3):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            # Random per database, so a recreated queue does not reuse the job keys of the old one
+            conn.execute(
+                "INSERT OR IGNORE INTO queue_meta (key, value) VALUES ('queue_id', ?)",
+                (uuid.uuid4().hex[:8],),
+            )
+            self.queue_id = conn.execute(
+                "SELECT value FROM queue_meta WHERE key = 'queue_id'"
+            ).fetchone()[0]
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def job_key(self, job_id: int) -> str:
+        """Globally unique name of a job, used for its progress stream and trace"""
+        return f"email-{self.queue_id}-{job_id}"
+
+    def get_by_key(self, job_key: str) -> Optional[Dict[str, Any]]:
+        """Status of the job named by job_key(), None if it is not a job of this queue"""
+        prefix = f"email-{self.queue_id}-"
+        job_id = job_key[len(prefix):]
+        if not job_key.startswith(prefix) or not job_id.isdigit():
+            return None
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT status, attempts, error, created_at, finished_at FROM jobs WHERE id = ?",
+                (int(job_id),),
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "id": job_key,
+            "status": row[0],
+            "attempts": row[1],
+            "error": row[2],
+            "created_at": row[3],
+            "finished_at": row[4],
+        }
+
+    @staticmethod
+    def dedupe_key(message_id: Optional[str], files: List[JobFile]) -> str:
+        """Build the idempotency key from the Message-ID and the attachment contents"""
+        digest = hashlib.sha256((message_id or "").encode())
+        for file_hash in sorted(hashlib.sha256(f.content).hexdigest() for f in files):
+            digest.update(file_hash.encode())
+        return digest.hexdigest()
+
+    def enqueue(
+        self,
+        files: List[JobFile],
+        message_id: Optional[str] = None,
+        folder: Optional[str] = None,
+        uidvalidity: Optional[int] = None,
+        uid: Optional[str] = None,
+        sender: Optional[str] = None,
+        subject: Optional[str] = None,
+    ) -> Optional[int]:
+        """Add a job unless an identical one exists. Returns the new job id or None"""
+        now = time.time()
+        key = self.dedupe_key(message_id, files)
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO jobs (dedupe_key, message_id, folder, uidvalidity, "
+                    "uid, sender, subject, status, available_at, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        key,
+                        message_id,
+                        folder,
+                        uidvalidity,
+                        uid,
+                        sender,
+                        subject,
+                        PENDING,
+                        now,
+                        now,
+                        now,
+                    ),
+                )
+                if cursor.rowcount == 0:
+                    conn.execute("COMMIT")
+                    logger.debug(f"Job for message {message_id} already queued")
+                    return None
+                job_id = cursor.lastrowid
+                conn.executemany(
+                    "INSERT INTO job_files (job_id, kind, filename, content) VALUES (?, ?, ?, ?)",
+                    [(job_id, f.kind, f.filename, f.content) for f in files],
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return job_id
+
+    def claim(self) -> Optional[QueuedJob]:
+        """Lease the oldest available job, including jobs whose lease has expired"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Jobs that keep crashing their worker are parked instead of retried forever
+                conn.execute(
+                    "UPDATE jobs SET status = ?, lease_until = NULL, finished_at = ?, "
+                    "updated_at = ?, error = ? WHERE status = ? AND lease_until < ? "
+                    "AND attempts >= ?",
+                    (
+                        FAILED,
+                        now,
+                        now,
+                        "Lease expired after the last attempt",
+                        RUNNING,
+                        now,
+                        self.max_attempts,
+                    ),
+                )
+                row = conn.execute(
+                    "SELECT id, message_id, folder, uidvalidity, uid, sender, subject, attempts "
+                    "FROM jobs WHERE (status = ? AND available_at <= ?) "
+                    "OR (status = ? AND lease_until < ?) ORDER BY id LIMIT 1",
+                    (PENDING, now, RUNNING, now),
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                lease_token = uuid.uuid4().hex
+                conn.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts + 1, lease_until = ?, "
+                    "lease_token = ?, updated_at = ? WHERE id = ?",
+                    (RUNNING, now + self.lease_seconds, lease_token, now, row[0]),
+                )
+                files = conn.execute(
+                    "SELECT kind, filename, content FROM job_files WHERE job_id = ?",
+                    (row[0],),
+                ).fetchall()
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+        return QueuedJob(
+            id=row[0],
+            message_id=row[1],
+            folder=row[2],
+            uidvalidity=row[3],
+            uid=row[4],
+            sender=row[5],
+            subject=row[6],
+            attempts=row[7] + 1,
+            lease_token=lease_token,
+            files=[JobFile(kind=k, filename=f, content=c) for k, f, c in files],
+        )
+
+    def renew(self, job_id: int, lease_token: str) -> bool:
+        """Extend the lease of a running job; False if this claim no longer holds it"""
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_until = ?, updated_at = ? "
+                "WHERE id = ? AND status = ? AND lease_token = ? AND lease_until >= ?",
+                (now + self.lease_seconds, now, job_id, RUNNING, lease_token, now),
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, job_id: int, lease_token: str) -> bool:
+        """Mark a job as done and drop its stored input files; False if the lease was lost"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, lease_until = NULL, lease_token = NULL, "
+                "finished_at = ?, updated_at = ?, error = NULL "
+                "WHERE id = ? AND status = ? AND lease_token = ?",
+                (DONE, now, now, job_id, RUNNING, lease_token),
+            )
+            if cursor.rowcount == 1:
+                conn.execute("DELETE FROM job_files WHERE job_id = ?", (job_id,))
+            conn.execute("COMMIT")
+        return cursor.rowcount == 1
+
+    def fail(self, job_id: int, lease_token: str, error: str, backoff: float = 30.0) -> Optional[str]:
+        """Return a failed job to the queue with backoff, or park it after max_attempts
+
+        Returns the job's new status (PENDING or FAILED), or None if the lease was lost.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT attempts FROM jobs WHERE id = ? AND status = ? AND lease_token = ?",
+                (job_id, RUNNING, lease_token),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            (attempts,) = row
+            if attempts >= self.max_attempts:
+                status = FAILED
+                conn.execute(
+                    "UPDATE jobs SET status = ?, lease_until = NULL, lease_token = NULL, "
+                    "finished_at = ?, updated_at = ?, error = ? WHERE id = ?",
+                    (FAILED, now, now, error, job_id),
+                )
+            else:
+                status = PENDING
+                conn.execute(
+                    "UPDATE jobs SET status = ?, lease_until = NULL, lease_token = NULL, "
+                    "available_at = ?, updated_at = ?, error = ? WHERE id = ?",
+                    (PENDING, now + backoff * 2 ** (attempts - 1), now, error, job_id),
+                )
+            conn.execute("COMMIT")
+        return status
+
+    def jobs_to_flag(
+        self, folder: str, uidvalidity: int, status: str = DONE
+    ) -> List[Tuple[int, str]]:
+        """Return (job id, uid) of finished jobs in `status` whose message is not flagged yet
+
+        Completed jobs get their message flagged SEEN, failed ones FLAGGED so
+        that they stand out in the mailbox.
+        """
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT id, uid FROM jobs WHERE status = ? AND flagged = 0 "
+                "AND folder = ? AND uidvalidity = ?",
+                (status, folder, uidvalidity),
+            ).fetchall()
+
+    def mark_flagged(self, job_ids: List[int]):
+        """Record that the messages of these jobs were flagged SEEN on the server"""
+        if not job_ids:
+            return
+        with self._connect() as conn:
+            conn.executemany(
+                "UPDATE jobs SET flagged = 1 WHERE id = ?", [(i,) for i in job_ids]
+            )
+
+    def depth(self) -> int:
+        """Number of jobs waiting or being processed"""
+        with self._connect() as conn:
+            (count,) = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)", (PENDING, RUNNING)
+            ).fetchone()
+        return count
+
+    def oldest_pending_age(self) -> float:
+        """Age in seconds of the oldest job not yet finished, 0 if the queue is empty"""
+        with self._connect() as conn:
+            (created_at,) = conn.execute(
+                "SELECT MIN(created_at) FROM jobs WHERE status IN (?, ?)",
+                (PENDING, RUNNING),
+            ).fetchone()
+        return time.time() - created_at if created_at else 0.0
+
+    def get_stats(self) -> Dict[str, int]:
+        """Count jobs by status"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT status, COUNT(*) FROM jobs GROUP BY status"
+            ).fetchall()
+        return {status: count for status, count in rows}
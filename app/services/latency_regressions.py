@@ -0,0 +1,388 @@
+import atexit
+import json
+import math
+import os
+import threading
+import time
+from collections import Counter, deque
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+from app.utils.quantile_sketch import QuantileSketch
+
+# Quantiles compared against the baseline, by label
+QUANTILES = {"p50": 0.5, "p95": 0.95}
+# Closed windows needed before a baseline is used
+MIN_BASELINE_WINDOWS = 3
+# Baselines are written at most this often while recording (and always on close)
+SAVE_INTERVAL = 300
+# Seconds between passes of the thread that adds observed latencies to their windows
+PROCESS_INTERVAL = 1.0
+# Observed latencies held while that thread catches up; the oldest are dropped beyond this
+MAX_PENDING = 100_000
+
+# Operation key (service, operation) and attribution labels (model, prompt version)
+Key = Tuple[str, str]
+Labels = Tuple[str, str]
+
+
+def binomial_tail(n: int, k: int, p: float) -> float:
+    """P(X >= k) for X ~ Binomial(n, p)"""
+    if k <= 0:
+        return 1.0
+    if k > n:
+        return 0.0
+    log_p, log_q = math.log(p), math.log1p(-p)
+    log_n = math.lgamma(n + 1)
+    return min(
+        1.0,
+        sum(
+            math.exp(log_n - math.lgamma(i + 1) - math.lgamma(n - i + 1) + i * log_p + (n - i) * log_q)
+            for i in range(k, n + 1)
+        ),
+    )
+
+
+def _dominant(labels: Counter) -> Labels:
+    return labels.most_common(1)[0][0] if labels else ("", "")
+
+
+class Window:
+    """Latencies of one window of successful requests, with the labels they ran under"""
+
+    def __init__(self, thresholds: Optional[Dict[str, float]] = None):
+        self.latency = QuantileSketch()
+        self.labels: Counter = Counter()
+        # Baseline quantiles when the window opened and how many requests exceeded them
+        self.thresholds = thresholds or {}
+        self.exceeded = {name: 0 for name in self.thresholds}
+
+    def add(self, duration: float, labels: Labels):
+        self.latency.add(duration)
+        self.labels[labels] += 1
+        for name, threshold in self.thresholds.items():
+            if duration > threshold:
+                self.exceeded[name] += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        sketch = self.latency
+        return {
+            "buckets": {str(key): count for key, count in sketch.buckets.items()},
+            "zero_count": sketch.zero_count,
+            "sum": sketch.sum,
+            "min": sketch.min if sketch.count else 0.0,
+            "max": sketch.max,
+            "labels": [[model, version, count] for (model, version), count in self.labels.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Window":
+        window = cls()
+        window.latency.add_counts(
+            {int(key): count for key, count in data["buckets"].items()},
+            data["zero_count"],
+            data["sum"],
+            data["min"],
+            data["max"],
+        )
+        window.labels = Counter({(model, version): count for model, version, count in data["labels"]})
+        return window
+
+
+class OperationBaseline:
+    """Rolling latency baseline of one operation and its current window"""
+
+    def __init__(self, baseline_windows: int):
+        self.lock = threading.Lock()
+        self.windows: Deque[Window] = deque(maxlen=baseline_windows)
+        self.current = Window()
+        self.regression: Optional[Dict[str, Any]] = None
+        self.regressions = 0
+        # Whether this process closed a window since loading, i.e. has something to save
+        self.updated = False
+
+    def baseline(self) -> Optional[Window]:
+        """The closed windows merged into one, None until there are enough of them"""
+        if len(self.windows) < MIN_BASELINE_WINDOWS:
+            return None
+        merged = Window()
+        for window in self.windows:
+            merged.latency.merge(window.latency)
+            merged.labels.update(window.labels)
+        return merged
+
+    def open_window(self):
+        baseline = self.baseline()
+        thresholds = (
+            {name: baseline.latency.quantile(q) for name, q in QUANTILES.items()} if baseline else None
+        )
+        self.current = Window(thresholds)
+
+
+class LatencyRegressionDetector:
+    """Flags operations whose p50 or p95 latency rose significantly above their baseline
+
+    Successful requests of each (service, operation) are collected in windows
+    of `window_size`. The baseline is the last `baseline_windows` closed
+    windows. When a window closes, the number of its requests slower than the
+    baseline's p50 and p95 is compared with what the baseline predicts (half
+    and 5%) using a one-sided binomial test. A quantile has regressed when
+    that is less likely than `p_value` and the window's own quantile is at
+    least `min_ratio` times the baseline's. Closed windows join the baseline
+    whether they regressed or not, so a lasting change becomes the new normal
+    after `baseline_windows` windows and the regression clears.
+
+    Each request carries the model and prompt version it ran with. A
+    regression reports the ones that dominated the window and the baseline, so
+    a prompt change or model switch is named as the likely cause; when neither
+    changed the slowdown came from elsewhere, e.g. the provider. Baselines are
+    saved to `path` so they survive the restart that deploys a prompt change;
+    processes sharing the file only replace the operations they updated.
+
+    observe() only queues the latency. A background thread adds queued
+    latencies to their windows, closes full windows, passes regression events
+    to `on_event` and saves the baselines, so callers never wait on a lock or
+    on disk I/O.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        enabled: bool = True,
+        window_size: int = 30,
+        baseline_windows: int = 10,
+        p_value: float = 0.001,
+        min_ratio: float = 1.2,
+        on_event: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ):
+        self.path = Path(path) if path else None
+        self.enabled = enabled
+        self.window_size = window_size
+        self.baseline_windows = baseline_windows
+        self.p_value = p_value
+        self.min_ratio = min_ratio
+        self.on_event = on_event
+        self._operations: Dict[Key, OperationBaseline] = {}
+        self._pending: Deque[Tuple[Key, float, Labels]] = deque(maxlen=MAX_PENDING)
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._last_save = time.time()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+
+    def configure(
+        self,
+        path: Optional[str],
+        enabled: bool = True,
+        window_size: int = 30,
+        baseline_windows: int = 10,
+        p_value: float = 0.001,
+        min_ratio: float = 1.2,
+    ):
+        """Apply settings and load saved baselines; call before the first request"""
+        if window_size < 1 or baseline_windows < MIN_BASELINE_WINDOWS:
+            raise ValueError(
+                f"Latency regression windows need window_size >= 1 and baseline_windows >= {MIN_BASELINE_WINDOWS}"
+            )
+        self.path = Path(path) if path else None
+        self.enabled = enabled
+        self.window_size = window_size
+        self.baseline_windows = baseline_windows
+        self.p_value = p_value
+        self.min_ratio = min_ratio
+        self._operations.clear()
+        self.load()
+
+    def _baseline(self, key: Key) -> OperationBaseline:
+        baseline = self._operations.get(key)
+        if baseline is None:
+            with self._lock:
+                baseline = self._operations.setdefault(key, OperationBaseline(self.baseline_windows))
+        return baseline
+
+    def observe(
+        self, service: str, operation: str, duration: float, model: str = "", prompt_version: str = ""
+    ):
+        """Queue a successful request's latency for the background thread"""
+        if not self.enabled or self._closed:
+            return
+        # Appending to a bounded deque is atomic
+        self._pending.append(
+            ((service, operation.split(":", 1)[0]), duration, (model or "", prompt_version or ""))
+        )
+        if self._thread is None:
+            self._start()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="latency-regressions", daemon=True
+            )
+            self._thread.start()
+            atexit.register(self.close)
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(PROCESS_INTERVAL)
+            self._wakeup.clear()
+            self.process()
+            if time.time() - self._last_save > SAVE_INTERVAL:
+                self.save()
+
+    def process(self) -> List[Dict[str, Any]]:
+        """Add queued latencies to their windows; returns (and reports) events of closed windows"""
+        events = []
+        while self._pending:
+            key, duration, labels = self._pending.popleft()
+            baseline = self._baseline(key)
+            with baseline.lock:
+                baseline.current.add(duration, labels)
+                if baseline.current.latency.count >= self.window_size:
+                    events.extend(self._close_window(key, baseline))
+        if self.on_event is not None:
+            for event in events:
+                self.on_event(dict(event))
+        return events
+
+    def _close_window(self, key: Key, baseline: OperationBaseline) -> List[Dict[str, Any]]:
+        window = baseline.current
+        events = []
+        reference = baseline.baseline() if window.thresholds else None
+        if reference is not None:
+            n = window.latency.count
+            quantiles = {}
+            for name, q in QUANTILES.items():
+                threshold = window.thresholds[name]
+                current = window.latency.quantile(q)
+                p_value = binomial_tail(n, window.exceeded[name], 1 - q)
+                if p_value < self.p_value and threshold > 0 and current >= threshold * self.min_ratio:
+                    quantiles[name] = {
+                        "baseline": round(threshold, 6),
+                        "current": round(current, 6),
+                        "ratio": round(current / threshold, 3),
+                        "p_value": p_value,
+                    }
+            if quantiles:
+                model, version = _dominant(window.labels)
+                baseline_model, baseline_version = _dominant(reference.labels)
+                changed = [
+                    name
+                    for name, now, before in (
+                        ("model", model, baseline_model),
+                        ("prompt_version", version, baseline_version),
+                    )
+                    if now != before
+                ]
+                baseline.regression = {
+                    "service": key[0],
+                    "operation": key[1],
+                    "model": model,
+                    "prompt_version": version,
+                    "baseline_model": baseline_model,
+                    "baseline_prompt_version": baseline_version,
+                    "changed": changed,
+                    "quantiles": quantiles,
+                    "samples": n,
+                    "baseline_samples": reference.latency.count,
+                    "detected_at": time.time(),
+                }
+                baseline.regressions += 1
+                events.append({"type": "latency_regression", **baseline.regression})
+            elif baseline.regression is not None:
+                events.append(
+                    {
+                        "type": "latency_regression_cleared",
+                        "service": key[0],
+                        "operation": key[1],
+                        "since": baseline.regression["detected_at"],
+                    }
+                )
+                baseline.regression = None
+        baseline.windows.append(window)
+        baseline.updated = True
+        baseline.open_window()
+        return events
+
+    def status(self) -> List[Dict[str, Any]]:
+        """Baseline quantiles and the active regression (if any) of every operation"""
+        result = []
+        for key, baseline in sorted(list(self._operations.items())):
+            with baseline.lock:
+                reference = baseline.baseline()
+                result.append(
+                    {
+                        "service": key[0],
+                        "operation": key[1],
+                        "baseline": (
+                            {name: reference.latency.quantile(q) for name, q in QUANTILES.items()}
+                            if reference
+                            else None
+                        ),
+                        "regressions": baseline.regressions,
+                        "regression": baseline.regression,
+                    }
+                )
+        return result
+
+    def save(self):
+        """Write the closed windows of the operations this process updated to `path`
+
+        Operations in the file that this process did not update, e.g. those
+        recorded by another worker, are kept.
+        """
+        self._last_save = time.time()
+        if self.path is None:
+            return
+        updated = {}
+        for (service, operation), baseline in list(self._operations.items()):
+            with baseline.lock:
+                if baseline.updated:
+                    updated[f"{service}/{operation}"] = [
+                        window.to_dict() for window in baseline.windows
+                    ]
+        if not updated:
+            return
+        with self._save_lock:
+            try:
+                data = json.loads(self.path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                data = {}
+            if not isinstance(data, dict):
+                data = {}
+            data.update(updated)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            temporary = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+            temporary.write_text(json.dumps(data), encoding="utf-8")
+            os.replace(temporary, self.path)
+
+    def load(self):
+        """Restore baselines written by save(); a missing or unreadable file starts empty"""
+        if self.path is None or not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            for name, windows in data.items():
+                service, operation = name.split("/", 1)
+                baseline = self._baseline((service, operation))
+                for window in windows[-self.baseline_windows:]:
+                    baseline.windows.append(Window.from_dict(window))
+                baseline.open_window()
+        except (OSError, ValueError, KeyError, TypeError):
+            self._operations.clear()
+
+    def flush(self):
+        """Process queued latencies and save the baselines"""
+        self.process()
+        self.save()
+
+    def close(self):
+        """Stop the background thread, then process what is queued and save"""
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+        self.flush()
@@ -0,0 +1,189 @@
+import atexit
+import gzip
+import json
+import os
+import shutil
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Optional
+from app.core.logger import LoggerSingleton
+from app.utils.sharded import ShardedCounter
+
+try:
+    import orjson
+except ImportError:  # optional, json is used instead
+    orjson = None
+
+# Get logger from singleton
+logger = LoggerSingleton.get_logger()
+
+
+def _make_encoder() -> Callable[[Any], bytes]:
+    """Fastest available JSON-lines encoder: orjson if installed, else compact json"""
+    if orjson is not None:
+        options = orjson.OPT_APPEND_NEWLINE | orjson.OPT_NON_STR_KEYS
+        return lambda entry: orjson.dumps(entry, default=str, option=options)
+    encoder = json.JSONEncoder(separators=(",", ":"), default=str)
+    return lambda entry: (encoder.encode(entry) + "\n").encode("utf-8")
+
+
+class BufferedLogWriter:
+    """Writes JSON-lines log entries from a background thread in batches
+
+    write() only appends to an in-memory buffer; a writer thread encodes and
+    appends everything buffered every `flush_interval` seconds (or as soon as
+    `batch_size` entries are waiting) with a single write to a file it keeps
+    open. Segments are rotated once they exceed `max_bytes` or `max_age`
+    seconds and the closed segment is gzip-compressed. If the disk cannot
+    keep up, at most `max_buffer` entries are held and the oldest are dropped.
+    """
+
+    def __init__(
+        self,
+        log_dir: str,
+        prefix: str = "monitor",
+        flush_interval: float = 1.0,
+        batch_size: int = 1000,
+        max_buffer: int = 100_000,
+        max_bytes: int = 50 * 1024 * 1024,
+        max_age: float = 86400.0,
+        compress: bool = True,
+    ):
+        self.log_dir = Path(log_dir)
+        self.prefix = prefix
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.compress = compress
+        self.path = self._segment_path()
+        # Incremented by every writing thread, so counted without a shared lock
+        self._accepted = ShardedCounter()
+        self._dropped = ShardedCounter()
+        self.written = 0
+
+        self._encode = _make_encoder()
+        self._buffer: Deque[Dict] = deque(maxlen=max_buffer)
+        self._wakeup = threading.Event()
+        self._flushed = threading.Condition()
+        self._lock = threading.Lock()
+        self._file = None
+        self._segment_started = 0.0
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+
+    def _segment_path(self) -> Path:
+        # The pid keeps segments of several worker processes apart
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        path = self.log_dir / f"{self.prefix}_{stamp}_{os.getpid()}.json"
+        sequence = 1
+        while path.exists() or path.with_suffix(".json.gz").exists():
+            path = self.log_dir / f"{self.prefix}_{stamp}_{os.getpid()}_{sequence}.json"
+            sequence += 1
+        return path
+
+    @property
+    def accepted(self) -> int:
+        """Entries passed to write() so far"""
+        return int(self._accepted.value)
+
+    @property
+    def dropped(self) -> int:
+        """Entries lost to a full buffer or a failed write"""
+        return int(self._dropped.value)
+
+    def write(self, entry: Dict):
+        """Queue an entry; never blocks on disk I/O"""
+        if self._closed:
+            return
+        if len(self._buffer) == self._buffer.maxlen:
+            self._dropped.add()
+        self._accepted.add()
+        self._buffer.append(entry)
+        if self._thread is None:
+            self._start()
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self.log_dir.mkdir(parents=True, exist_ok=True)
+            self._thread = threading.Thread(
+                target=self._run, name=f"{self.prefix}-log-writer", daemon=True
+            )
+            self._thread.start()
+            atexit.register(self.close)
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self._drain()
+        self._drain()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _drain(self):
+        while self._buffer:
+            chunk = []
+            while self._buffer and len(chunk) < self.batch_size:
+                chunk.append(self._buffer.popleft())
+            data = b"".join(self._encode(entry) for entry in chunk)
+            try:
+                self._append(data)
+                self.written += len(chunk)
+            except OSError as e:
+                self._dropped.add(len(chunk))
+                logger.warning(f"Failed to write {len(chunk)} monitor log entries: {str(e)}")
+        with self._flushed:
+            self._flushed.notify_all()
+
+    def _append(self, data: bytes):
+        if self._file is not None and (
+            self._file.tell() + len(data) > self.max_bytes
+            or time.time() - self._segment_started > self.max_age
+        ):
+            self._rotate()
+        if self._file is None:
+            self._file = open(self.path, "ab")
+            self._segment_started = time.time()
+        self._file.write(data)
+        self._file.flush()
+
+    def _rotate(self):
+        self._file.close()
+        self._file = None
+        finished = self.path
+        self.path = self._segment_path()
+        if self.compress:
+            with open(finished, "rb") as src, gzip.open(
+                finished.with_suffix(".json.gz"), "wb"
+            ) as dst:
+                shutil.copyfileobj(src, dst)
+            finished.unlink()
+
+    def flush(self, timeout: float = 5.0):
+        """Wait until everything written so far is on disk"""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        target = self.accepted
+        with self._flushed:
+            self._wakeup.set()
+            self._flushed.wait_for(
+                lambda: self.written + self.dropped >= target, timeout=timeout
+            )
+
+    def close(self):
+        """Write what is buffered and stop the writer thread"""
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
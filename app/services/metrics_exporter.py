@@ -0,0 +1,156 @@
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+from .monitoring import SystemMonitor
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Writer:
+    def __init__(self):
+        self.lines: List[str] = []
+
+    def family(self, name: str, kind: str, help_text: str):
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} {kind}")
+
+    def sample(self, name: str, value: float, labels: Optional[Dict[str, str]] = None):
+        self.lines.append(f"{name}{_labels(labels or {})} {_number(value)}")
+
+    def text(self) -> str:
+        return "\n".join(self.lines) + "\n"
+
+
+def render_prometheus(
+    monitor: SystemMonitor,
+    cost_tracker=None,
+    extra_gauges: Iterable[Tuple[str, str, float]] = (),
+) -> str:
+    """Render the monitor's running aggregates in the Prometheus text format
+
+    Only counters, sketches and baselines that are maintained as events arrive are read,
+    so the cost of a scrape depends on the number of operations, not on traffic.
+    """
+    out = _Writer()
+    operations = sorted(list(monitor.operations.items()))
+
+    out.family("rohdex_uptime_seconds", "gauge", "Seconds since the process started")
+    out.sample("rohdex_uptime_seconds", round(time.time() - monitor.start_time, 3))
+
+    out.family("rohdex_requests_total", "counter", "Requests by service, operation and outcome")
+    for (service, operation), stats in operations:
+        labels = {"service": service, "operation": operation}
+        out.sample("rohdex_requests_total", stats.successful, {**labels, "outcome": "success"})
+        out.sample(
+            "rohdex_requests_total",
+            stats.requests - stats.successful,
+            {**labels, "outcome": "failure"},
+        )
+
+    out.family("rohdex_errors_total", "counter", "Errors by service and operation")
+    for (service, operation), stats in operations:
+        out.sample("rohdex_errors_total", stats.errors, {"service": service, "operation": operation})
+
+    out.family("rohdex_retries_total", "counter", "Retries by service and operation")
+    for (service, operation), stats in operations:
+        out.sample("rohdex_retries_total", stats.retries, {"service": service, "operation": operation})
+
+    out.family(
+        "rohdex_request_duration_seconds",
+        "histogram",
+        "Request latency by service and operation (buckets within 1% of the boundary)",
+    )
+    for (service, operation), stats in operations:
+        labels = {"service": service, "operation": operation}
+        sketch = stats.latency
+        for bound, count in zip(LATENCY_BUCKETS, sketch.cumulative_counts(LATENCY_BUCKETS)):
+            out.sample("rohdex_request_duration_seconds_bucket", count, {**labels, "le": _number(float(bound))})
+        out.sample("rohdex_request_duration_seconds_bucket", sketch.count, {**labels, "le": "+Inf"})
+        out.sample("rohdex_request_duration_seconds_sum", round(sketch.sum, 6), labels)
+        out.sample("rohdex_request_duration_seconds_count", sketch.count, labels)
+
+    if cost_tracker is not None:
+        usage = sorted(cost_tracker.model_usage.items())
+        out.family("rohdex_llm_requests_total", "counter", "LLM calls by model")
+        for model, totals in usage:
+            out.sample("rohdex_llm_requests_total", totals["requests"], {"model": model})
+        out.family("rohdex_llm_tokens_total", "counter", "LLM tokens by model and direction")
+        for model, totals in usage:
+            out.sample("rohdex_llm_tokens_total", totals["input_tokens"], {"model": model, "direction": "input"})
+            out.sample("rohdex_llm_tokens_total", totals["output_tokens"], {"model": model, "direction": "output"})
+        out.family("rohdex_llm_cost_usd_total", "counter", "LLM cost in USD by model")
+        for model, totals in usage:
+            out.sample("rohdex_llm_cost_usd_total", round(totals["cost"], 8), {"model": model})
+
+    regressions = monitor.regressions.status()
+    out.family(
+        "rohdex_latency_baseline_seconds",
+        "gauge",
+        "Baseline latency quantile by service and operation",
+    )
+    for status in regressions:
+        for quantile, value in (status["baseline"] or {}).items():
+            out.sample(
+                "rohdex_latency_baseline_seconds",
+                round(value, 6),
+                {"service": status["service"], "operation": status["operation"], "quantile": quantile},
+            )
+    out.family("rohdex_latency_regressions_total", "counter", "Latency regressions detected by service and operation")
+    for status in regressions:
+        out.sample(
+            "rohdex_latency_regressions_total",
+            status["regressions"],
+            {"service": status["service"], "operation": status["operation"]},
+        )
+    out.family(
+        "rohdex_latency_regression_ratio",
+        "gauge",
+        "Current over baseline latency of active regressions, with the model and prompt version they ran with",
+    )
+    for status in regressions:
+        regression = status["regression"]
+        if regression is None:
+            continue
+        for quantile, values in regression["quantiles"].items():
+            out.sample(
+                "rohdex_latency_regression_ratio",
+                values["ratio"],
+                {
+                    "service": status["service"],
+                    "operation": status["operation"],
+                    "quantile": quantile,
+                    "model": regression["model"],
+                    "prompt_version": regression["prompt_version"],
+                    "changed": ",".join(regression["changed"]) or "none",
+                },
+            )
+
+    for name, value in sorted(list(monitor.counters.items())):
+        name = f"rohdex_{name}_total"
+        out.family(name, "counter", name.replace("_", " "))
+        out.sample(name, value)
+
+    gauges = [(f"rohdex_{name}", "", value) for name, value in sorted(list(monitor.gauges.items()))]
+    for name, help_text, value in [*gauges, *extra_gauges]:
+        out.family(name, "gauge", help_text or name.replace("_", " "))
+        out.sample(name, value)
+
+    return out.text()
@@ -1,4 +1,4 @@
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Deque, List, Optional, Tuple
 from rich.console import Console
 from rich.table import Table
 from rich.panel import Panel
@@ -6,34 +6,218 @@ from rich.progress import Progress
 import time
 from datetime import datetime
 import threading
-import json
 import os
+from collections import deque
 from pathlib import Path
+from app.utils.quantile_sketch import QuantileSketch
+from app.utils.sharded import ThreadSharded
+from app.core.prompts import PROMPT_VERSION
+from .latency_regressions import LatencyRegressionDetector
+from .log_writer import BufferedLogWriter
+from .rollups import TimeRollups
 
 console = Console()
 
+# Seconds of per-second request counts kept for windowed rates
+RECENT_WINDOW = 900
+# Latency quantiles reported per service and operation
+QUANTILES = (0.5, 0.9, 0.95, 0.99)
+# Failures after the last success remembered per service and thread
+MAX_FAILURE_STREAK = 1000
+
+
+class OperationStats:
+    """Running totals, a latency sketch and per-second recent counts of one operation"""
+
+    def __init__(self):
+        self.requests = 0
+        self.successful = 0
+        self.errors = 0
+        self.retries = 0
+        self.total_duration = 0.0
+        self.latency = QuantileSketch()
+        # [second, requests, successful, successful duration], oldest first
+        self.recent: Deque[List[float]] = deque(maxlen=RECENT_WINDOW)
+
+    def record(self, timestamp: float, success: bool, duration: float):
+        self.requests += 1
+        self.total_duration += duration
+        self.latency.add(duration)
+        if success:
+            self.successful += 1
+
+        second = int(timestamp)
+        if not self.recent or self.recent[-1][0] != second:
+            self.recent.append([second, 0, 0, 0.0])
+        bucket = self.recent[-1]
+        bucket[1] += 1
+        if success:
+            bucket[2] += 1
+            bucket[3] += duration
+
+    def merge(self, other: "OperationStats"):
+        """Add another thread's statistics of the same operation"""
+        self.requests += other.requests
+        self.successful += other.successful
+        self.errors += other.errors
+        self.retries += other.retries
+        self.total_duration += other.total_duration
+        self.latency.merge(other.latency)
+        if not other.recent:
+            return
+        seconds = {bucket[0]: list(bucket) for bucket in self.recent}
+        for second, count, ok, ok_duration in list(other.recent):
+            bucket = seconds.setdefault(second, [second, 0, 0, 0.0])
+            bucket[1] += count
+            bucket[2] += ok
+            bucket[3] += ok_duration
+        self.recent = deque(
+            (seconds[second] for second in sorted(seconds)), maxlen=RECENT_WINDOW
+        )
+
+    def recent_counts(self, since: float) -> Tuple[int, int, float]:
+        """(requests, successful, successful duration) since a timestamp"""
+        requests = successful = 0
+        duration = 0.0
+        for second, count, ok, ok_duration in reversed(self.recent):
+            if second < int(since):
+                break
+            requests += count
+            successful += ok
+            duration += ok_duration
+        return requests, successful, duration
+
+
+class FailureStreak:
+    """Failures of a service since its last success"""
+
+    def __init__(self):
+        self.last_success = 0.0
+        self.failures: Deque[float] = deque(maxlen=MAX_FAILURE_STREAK)
+
+    def record(self, timestamp: float, success: bool):
+        if success:
+            self.last_success = timestamp
+            self.failures.clear()
+        else:
+            self.failures.append(timestamp)
+
+    def merge(self, other: "FailureStreak"):
+        self.last_success = max(self.last_success, other.last_success)
+        failures = sorted([*self.failures, *list(other.failures)])
+        self.failures = deque(
+            (timestamp for timestamp in failures if timestamp > self.last_success),
+            maxlen=MAX_FAILURE_STREAK,
+        )
+
+
+class MonitorShard:
+    """Statistics recorded by one thread"""
+
+    def __init__(self):
+        self.operations: Dict[Tuple[str, str], OperationStats] = {}
+        self.streaks: Dict[str, FailureStreak] = {}
+
+    def merge(self, other: "MonitorShard"):
+        for key, stats in list(other.operations.items()):
+            self.operations.setdefault(key, OperationStats()).merge(stats)
+        for service, streak in list(other.streaks.items()):
+            self.streaks.setdefault(service, FailureStreak()).merge(streak)
+
 
 class SystemMonitor:
-    """Monitors the system health, error rates, and AI usage metrics"""
+    """Monitors the system health, error rates, and AI usage metrics
 
-    def __init__(self, log_dir="logs"):
-        self.start_time = time.time()
-        self.requests = []
-        self.errors = []
-        self.retries = []
-        self.log_dir = log_dir
+    Statistics are aggregated as events arrive, per service and operation
+    (the part of the operation name before ":", so per-file operations share
+    one entry). Only the most recent errors and retries are kept in memory;
+    every event is still written to the log file.
 
-        # Create log directory if it doesn't exist
-        Path(log_dir).mkdir(parents=True, exist_ok=True)
+    Events arrive from request handlers, the email threads and job workers at
+    once. Each thread records into its own shard and the shards are merged
+    when statistics are read, so recording never waits on a lock.
+    """
 
-        # Initialize log files
-        self.log_file = os.path.join(
-            log_dir, f"monitor_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    def __init__(self, log_dir="logs", recent_events: int = 100):
+        self.start_time = time.time()
+        self._shards: ThreadSharded[MonitorShard] = ThreadSharded(
+            MonitorShard, MonitorShard.merge
         )
+        # Per-minute and per-hour series for the dashboard, merged only when it asks
+        self._rollups: ThreadSharded[TimeRollups] = ThreadSharded(TimeRollups, TimeRollups.merge)
+        # Appending to a bounded deque is atomic
+        self.errors: Deque[Dict] = deque(maxlen=recent_events)
+        self.retries: Deque[Dict] = deque(maxlen=recent_events)
+        self.gauges: Dict[str, float] = {}
+        # Running totals kept by other components, e.g. cache hits; exported as counters
+        self.counters: Dict[str, float] = {}
+        # p50/p95 baselines per operation; configured from settings at startup
+        self.regressions = LatencyRegressionDetector(on_event=self._regression_event)
+        self.log_dir = log_dir
 
-        console.print(
-            f"[bold green]System Monitor initialized - logs will be saved to:[/] [cyan]{self.log_file}[/]"
-        )
+        # Events are written in batches by a background thread started on the first event
+        self.log_writer = BufferedLogWriter(log_dir, prefix="monitor")
+        self._log_ready = False
+
+    @property
+    def log_file(self) -> str:
+        """Log segment currently being written"""
+        return str(self.log_writer.path)
+
+    @property
+    def operations(self) -> Dict[Tuple[str, str], OperationStats]:
+        """Statistics per (service, operation), merged over all threads"""
+        return self._shards.collect().operations
+
+    @property
+    def consecutive_failures(self) -> Dict[str, int]:
+        """Failed requests in a row per service, reset by a success"""
+        return {
+            service: len(streak.failures)
+            for service, streak in self._shards.collect().streaks.items()
+        }
+
+    def _totals(self, operations: Optional[Dict[Tuple[str, str], OperationStats]] = None) -> Dict[str, float]:
+        """Totals over all operations; pass `operations` to reuse an already merged read"""
+        if operations is None:
+            operations = self.operations
+        totals = {"requests": 0, "successful": 0, "errors": 0, "retries": 0, "duration": 0.0}
+        for stats in operations.values():
+            totals["requests"] += stats.requests
+            totals["successful"] += stats.successful
+            totals["errors"] += stats.errors
+            totals["retries"] += stats.retries
+            totals["duration"] += stats.total_duration
+        return totals
+
+    @property
+    def total_requests(self) -> int:
+        return self._totals()["requests"]
+
+    @property
+    def total_successful(self) -> int:
+        return self._totals()["successful"]
+
+    @property
+    def total_errors(self) -> int:
+        return self._totals()["errors"]
+
+    @property
+    def total_retries(self) -> int:
+        return self._totals()["retries"]
+
+    @property
+    def total_duration(self) -> float:
+        return self._totals()["duration"]
+
+    def _operation(self, service: str, operation: str) -> OperationStats:
+        """This thread's statistics of an operation"""
+        operations = self._shards.local().operations
+        key = (service, operation.split(":", 1)[0])
+        stats = operations.get(key)
+        if stats is None:
+            stats = operations[key] = OperationStats()
+        return stats
 
     def record_request(
         self,
@@ -52,9 +236,38 @@ class SystemMonitor:
             "duration": duration,
             "metadata": metadata or {},
         }
-        self.requests.append(request)
+        self._operation(service, operation).record(request["timestamp"], success, duration)
+        self._rollups.local().record_request(
+            request["timestamp"], (service, operation.split(":", 1)[0]), success, duration
+        )
+        streaks = self._shards.local().streaks
+        streak = streaks.get(service)
+        if streak is None:
+            streak = streaks[service] = FailureStreak()
+        streak.record(request["timestamp"], success)
         self._save_to_log("request", request)
 
+    def record_latency(self, service: str, operation: str, duration: float, model: str = None):
+        """Feed a successful LLM call's latency, with the model used, to the regression detector"""
+        self.regressions.observe(
+            service, operation, duration, model=model, prompt_version=PROMPT_VERSION
+        )
+
+    def _regression_event(self, event: Dict[str, Any]):
+        # Called from the detector's thread when a window closes
+        event_type = event.pop("type")
+        if event_type == "latency_regression":
+            quantiles = ", ".join(
+                f"{name} {values['baseline']:.2f}s -> {values['current']:.2f}s"
+                for name, values in event["quantiles"].items()
+            )
+            console.print(
+                f"[bold yellow]Latency regression in {event['service']}/{event['operation']}:[/] "
+                f"{quantiles} (model {event['model'] or '-'}, prompts {event['prompt_version']}, "
+                f"changed: {', '.join(event['changed']) or 'nothing'})"
+            )
+        self._save_to_log(event_type, event)
+
     def record_error(
         self, service: str, operation: str, error_message: str, metadata: Dict = None
     ):
@@ -67,6 +280,8 @@ class SystemMonitor:
             "metadata": metadata or {},
         }
         self.errors.append(error)
+        self._operation(service, operation).errors += 1
+        self._rollups.local().record_error(error["timestamp"], (service, operation.split(":", 1)[0]))
         self._save_to_log("error", error)
 
     def record_retry(
@@ -87,8 +302,57 @@ class SystemMonitor:
             "metadata": metadata or {},
         }
         self.retries.append(retry)
+        self._operation(service, operation).retries += 1
+        self._rollups.local().record_retry(retry["timestamp"], (service, operation.split(":", 1)[0]))
         self._save_to_log("retry", retry)
 
+    def record_cost(self, model: str, input_tokens: int, output_tokens: int, cost: float):
+        """Add an LLM call's tokens and cost to the dashboard series (totals stay in CostTracker)"""
+        self._rollups.local().record_cost(
+            time.time(), ("LLM", model), input_tokens or 0, output_tokens or 0, cost
+        )
+
+    def get_series(self, resolution: str = "minute", periods: int = 60) -> Dict[str, Any]:
+        """Per-period series of every operation and model, see TimeRollups.series"""
+        return self._rollups.collect().series(resolution, periods)
+
+    def set_gauge(self, name: str, value: float):
+        """Set the current value of a gauge such as a backlog or queue depth"""
+        self.gauges[name] = value
+
+    def set_counter(self, name: str, value: float):
+        """Set the running total of a count kept elsewhere, such as cache hits or rejections"""
+        self.counters[name] = value
+
+    def get_throughput(self, service: str, operation: str, window: float = 60.0) -> float:
+        """Calculate successful requests per minute for an operation over a time window"""
+        stats = self.operations.get((service, operation.split(":", 1)[0]))
+        if stats is None:
+            return 0.0
+        _, successful, _ = stats.recent_counts(time.time() - window)
+        return successful * 60.0 / window
+
+    def get_recent_stats(self, service: str, window: float = 300.0) -> Dict[str, float]:
+        """Outcomes of a service's requests over a time window, newest last"""
+        since = time.time() - window
+        merged = self._shards.collect()
+        requests = successful = 0
+        duration = 0.0
+        for (name, _), stats in merged.operations.items():
+            if name != service:
+                continue
+            count, ok, ok_duration = stats.recent_counts(since)
+            requests += count
+            successful += ok
+            duration += ok_duration
+        streak = merged.streaks.get(service)
+        return {
+            "requests": requests,
+            "failures": requests - successful,
+            "consecutive_failures": len(streak.failures) if streak else 0,
+            "avg_duration": duration / successful if successful else 0.0,
+        }
+
     def _save_to_log(self, event_type: str, data: Dict):
         """Save event to log file"""
         log_entry = {
@@ -97,34 +361,53 @@ class SystemMonitor:
             "system_uptime": time.time() - self.start_time,
         }
 
-        with open(self.log_file, "a") as f:
-            f.write(json.dumps(log_entry) + "\n")
+        if not self._log_ready:
+            self._log_ready = True
+            console.print(
+                f"[bold green]System Monitor logging to:[/] [cyan]{self.log_file}[/]"
+            )
+
+        self.log_writer.write(log_entry)
+
+    def flush(self):
+        """Write buffered log events and latency baselines to disk"""
+        self.regressions.flush()
+        self.log_writer.flush()
 
-    def get_error_rate(self) -> float:
+    def close(self):
+        """Save latency baselines, write buffered log events and stop the log writer"""
+        self.regressions.close()
+        self.log_writer.close()
+
+    def get_error_rate(self, totals: Optional[Dict[str, float]] = None) -> float:
         """Calculate the error rate"""
-        if not self.requests:
+        totals = totals or self._totals()
+        if not totals["requests"]:
             return 0.0
-        successful_requests = sum(1 for req in self.requests if req["success"])
-        return 1 - (successful_requests / len(self.requests))
+        return 1 - (totals["successful"] / totals["requests"])
 
-    def get_retry_rate(self) -> float:
+    def get_retry_rate(self, totals: Optional[Dict[str, float]] = None) -> float:
         """Calculate the retry rate"""
-        if not self.requests:
+        totals = totals or self._totals()
+        if not totals["requests"]:
             return 0.0
-        return len(self.retries) / len(self.requests)
+        return totals["retries"] / totals["requests"]
 
-    def get_avg_response_time(self) -> float:
+    def get_avg_response_time(self, totals: Optional[Dict[str, float]] = None) -> float:
         """Calculate the average response time"""
-        if not self.requests:
+        totals = totals or self._totals()
+        if not totals["requests"]:
             return 0.0
-        return sum(req["duration"] for req in self.requests) / len(self.requests)
+        return totals["duration"] / totals["requests"]
 
-    def get_service_stats(self) -> Dict[str, Dict[str, Any]]:
+    def get_service_stats(self, operations: Optional[Dict[Tuple[str, str], OperationStats]] = None) -> Dict[str, Dict[str, Any]]:
         """Get statistics by service"""
+        if operations is None:
+            operations = self.operations
         services = {}
+        latencies: Dict[str, QuantileSketch] = {}
 
-        for req in self.requests:
-            service = req["service"]
+        for (service, _), operation in operations.items():
             if service not in services:
                 services[service] = {
                     "requests": 0,
@@ -133,24 +416,19 @@ class SystemMonitor:
                     "retries": 0,
                     "total_duration": 0.0,
                 }
+                latencies[service] = QuantileSketch()
 
-            services[service]["requests"] += 1
-            if req["success"]:
-                services[service]["successful"] += 1
-            services[service]["total_duration"] += req["duration"]
-
-        for error in self.errors:
-            service = error["service"]
-            if service in services:
-                services[service]["errors"] += 1
-
-        for retry in self.retries:
-            service = retry["service"]
-            if service in services:
-                services[service]["retries"] += 1
+            services[service]["requests"] += operation.requests
+            services[service]["successful"] += operation.successful
+            services[service]["errors"] += operation.errors
+            services[service]["retries"] += operation.retries
+            services[service]["total_duration"] += operation.total_duration
+            latencies[service].merge(operation.latency)
 
         # Calculate averages
         for service, stats in services.items():
+            stats["p50_duration"] = latencies[service].quantile(0.5)
+            stats["p95_duration"] = latencies[service].quantile(0.95)
             if stats["requests"] > 0:
                 stats["avg_duration"] = stats["total_duration"] / stats["requests"]
                 stats["error_rate"] = 1 - (stats["successful"] / stats["requests"])
@@ -162,21 +440,55 @@ class SystemMonitor:
 
         return services
 
+    def get_operation_stats(self) -> List[Dict[str, Any]]:
+        """Totals and latency quantiles per service and operation"""
+        return [
+            {
+                "service": service,
+                "operation": operation,
+                "requests": stats.requests,
+                "successful": stats.successful,
+                "errors": stats.errors,
+                "retries": stats.retries,
+                "total_duration": stats.total_duration,
+                "quantiles": stats.latency.quantiles(QUANTILES),
+            }
+            for (service, operation), stats in sorted(self.operations.items())
+        ]
+
+    def get_snapshot(self) -> Dict[str, Any]:
+        """Cumulative counters and current gauges, for aggregation across processes"""
+        # Merge the thread shards once for the whole snapshot
+        operations = self.operations
+        totals = self._totals(operations)
+        return {
+            "requests": totals["requests"],
+            "successful": totals["successful"],
+            "errors": totals["errors"],
+            "retries": totals["retries"],
+            "services": self.get_service_stats(operations),
+            "gauges": dict(self.gauges),
+            "counters": dict(self.counters),
+        }
+
     def print_summary(self):
         """Print a summary of system monitoring"""
         console.print("\n[bold green]System Monitoring Summary:[/]")
         console.print(
             f"System uptime: {self._format_duration(time.time() - self.start_time)}"
         )
-        console.print(f"Total requests: {len(self.requests)}")
-        console.print(f"Error rate: {self.get_error_rate():.2%}")
-        console.print(f"Retry rate: {self.get_retry_rate():.2%}")
+        # Merge the thread shards once for the whole summary
+        operations = self.operations
+        totals = self._totals(operations)
+        console.print(f"Total requests: {totals['requests']}")
+        console.print(f"Error rate: {self.get_error_rate(totals):.2%}")
+        console.print(f"Retry rate: {self.get_retry_rate(totals):.2%}")
         console.print(
-            f"Average response time: {self.get_avg_response_time():.2f} seconds"
+            f"Average response time: {self.get_avg_response_time(totals):.2f} seconds"
         )
 
         # Print service stats
-        service_stats = self.get_service_stats()
+        service_stats = self.get_service_stats(operations)
         if service_stats:
             table = Table(title="Service Statistics")
             table.add_column("Service", style="cyan")
@@ -186,6 +498,7 @@ class SystemMonitor:
             table.add_column("Retries", justify="right")
             table.add_column("Error Rate", justify="right")
             table.add_column("Avg Time (s)", justify="right")
+            table.add_column("p95 (s)", justify="right")
 
             for service, stats in service_stats.items():
                 table.add_row(
@@ -196,14 +509,25 @@ class SystemMonitor:
                     str(stats["retries"]),
                     f"{stats['error_rate']:.2%}",
                     f"{stats['avg_duration']:.2f}",
+                    f"{stats['p95_duration']:.2f}",
                 )
 
             console.print(table)
 
+        # Current gauges
+        if self.gauges:
+            console.print("\n[bold cyan]Gauges:[/]")
+            for name, value in sorted(self.gauges.items()):
+                console.print(f"  {name}: {value:g}")
+        if self.counters:
+            console.print("\n[bold cyan]Counters:[/]")
+            for name, value in sorted(self.counters.items()):
+                console.print(f"  {name}: {value:g}")
+
         # Recent errors
         if self.errors:
             console.print("\n[bold red]Recent Errors:[/]")
-            for i, error in enumerate(reversed(self.errors[-5:])):
+            for i, error in enumerate(reversed(list(self.errors)[-5:])):
                 console.print(
                     f"[red]{i+1}. {error['service']} - {error['operation']}: {error['error_message']}[/]"
                 )
@@ -211,7 +535,7 @@ class SystemMonitor:
         # Recent retries
         if self.retries:
             console.print("\n[bold yellow]Recent Retries:[/]")
-            for i, retry in enumerate(reversed(self.retries[-5:])):
+            for i, retry in enumerate(reversed(list(self.retries)[-5:])):
                 console.print(
                     f"[yellow]{i+1}. {retry['service']} - {retry['operation']} (Attempt {retry['attempt']}): {retry['error_message']}[/]"
                 )
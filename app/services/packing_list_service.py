@@ -4,10 +4,15 @@ from app.utils.file_processor import (
     load_wahrheit,
     generate_packing_list,
 )
+from app.services import tracing
 from rich.console import Console
-import pandas as pd
+from typing import Optional, TYPE_CHECKING
+import asyncio
 from io import BytesIO
 
+if TYPE_CHECKING:
+    from app.services.batch_service import ExtractionScheduler
+
 console = Console()
 
 
@@ -23,6 +28,9 @@ class PackingListService:
             bytes: The CSV content as bytes
         """
         console.print(f"[green]Processing Excel Partie file:[/] [cyan]{filename}[/]")
+        # Imported here: pandas is only needed for Excel uploads
+        import pandas as pd
+
         # Convert Excel to CSV format
         df = pd.read_excel(BytesIO(content))
         # Convert to CSV bytes
@@ -39,6 +47,8 @@ class PackingListService:
             bytes: The CSV content as bytes from the V-LIEF sheet
         """
         console.print(f"[green]Processing Excel Wahrheit file:[/] [cyan]{filename}[/]")
+        import pandas as pd
+
         # Read all sheet names
         excel_file = BytesIO(content)
         xls = pd.ExcelFile(excel_file)
@@ -79,11 +89,13 @@ class PackingListService:
         """
         return filename.lower().endswith((".xlsx", ".xls"))
 
+    @tracing.traced("generate")
     async def generate(
         self,
         partie_files: list[UploadFile],
         wahrheit_file: UploadFile,
         template_file: UploadFile,
+        scheduler: Optional["ExtractionScheduler"] = None,
     ) -> str:
         """Generates a packing list from uploaded files using in-memory processing.
 
@@ -99,6 +111,9 @@ class PackingListService:
                 descriptions, container numbers, and other reference information.
             template_file (UploadFile): CSV template file defining the structure of the
                 output packing list, including placeholders for data insertion.
+            scheduler (ExtractionScheduler, optional): Shared scheduler that runs the
+                extractions of several jobs under one concurrency budget and reuses
+                the results of identical files.
 
         Returns:
             str: The generated packing list content as a CSV-formatted string, with all
@@ -113,7 +128,10 @@ class PackingListService:
 
             # Process Excel files if needed
             if self._is_excel_file(pfile.filename):
-                processed_content = self._process_excel_partie(content, pfile.filename)
+                with tracing.span("excel_convert", filename=pfile.filename):
+                    processed_content = await asyncio.to_thread(
+                        self._process_excel_partie, content, pfile.filename
+                    )
             else:
                 processed_content = content
 
@@ -133,9 +151,10 @@ class PackingListService:
 
         # Process Excel wahrheit file if needed
         if self._is_excel_file(wahrheit_file.filename):
-            wahrheit_content = self._process_excel_wahrheit(
-                wahrheit_content, wahrheit_file.filename
-            )
+            with tracing.span("excel_convert", filename=wahrheit_file.filename):
+                wahrheit_content = await asyncio.to_thread(
+                    self._process_excel_wahrheit, wahrheit_content, wahrheit_file.filename
+                )
 
         await wahrheit_file.seek(0)  # Reset file pointer for potential reuse
         console.print(
@@ -149,14 +168,30 @@ class PackingListService:
             f"[green]Loaded template file:[/] [cyan]{template_file.filename}[/]"
         )
 
+        extractors = {}
+        claims = []
+        if scheduler is not None:
+            # Start every extraction now; the scheduler decides when each one runs
+            claims = scheduler.prefetch(partie_contents, wahrheit_content, wahrheit_file.filename)
+            extractors = {
+                "extract_partie": scheduler.extract_partie,
+                "extract_wahrheit": scheduler.load_wahrheit,
+            }
+
         # Generate packing list in memory
         console.print("[bold blue]Processing files with AI...[/]")
-        result_content = await generate_packing_list(
-            partie_contents=partie_contents,
-            wahrheit_content=wahrheit_content,
-            template_content=template_content,
-            wahrheit_filename=wahrheit_file.filename,
-        )
+        try:
+            result_content = await generate_packing_list(
+                partie_contents=partie_contents,
+                wahrheit_content=wahrheit_content,
+                template_content=template_content,
+                wahrheit_filename=wahrheit_file.filename,
+                **extractors,
+            )
+        finally:
+            if scheduler is not None:
+                # Extractions only this job still needed are cancelled
+                scheduler.release(claims)
 
         console.print("[bold green]Packing list generation completed successfully![/]")
         return result_content  # Return the generated content directly
@@ -0,0 +1,202 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, List, Optional, Set, Tuple
+from pydantic import BaseModel
+from app.core.logger import LoggerSingleton
+
+# Get logger from singleton
+logger = LoggerSingleton.get_logger()
+
+# Stages that end a job's event stream
+JOB_COMPLETED = "job_completed"
+JOB_FAILED = "job_failed"
+TERMINAL_STAGES = (JOB_COMPLETED, JOB_FAILED)
+
+# Job whose progress the current task or thread reports
+_current_job: ContextVar[Optional[str]] = ContextVar("progress_job", default=None)
+# Token usage collected by the LLM calls of the current extraction
+_current_usage: ContextVar[Optional[Dict[str, int]]] = ContextVar(
+    "progress_usage", default=None
+)
+# Events held back from the current job, to be replayed to every job that shares them
+_captured: ContextVar[Optional[List[Tuple[str, Dict[str, Any]]]]] = ContextVar(
+    "progress_captured", default=None
+)
+
+
+class ProgressEvent(BaseModel):
+    """A stage reached by a packing list job"""
+
+    seq: int
+    job_id: str
+    stage: str
+    timestamp: float
+    data: Dict[str, Any] = {}
+
+
+class _JobChannel:
+    def __init__(self, max_events: int):
+        self.events: Deque[ProgressEvent] = deque(maxlen=max_events)
+        self.seq = 0
+        self.finished_at: Optional[float] = None
+        self.subscribers: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]] = set()
+
+
+class ProgressBus:
+    """In-process publish/subscribe hub for per-job progress events
+
+    Jobs publish from any thread (job workers, LLM threads, the background
+    loop); subscribers are async consumers such as the SSE endpoint. Each job
+    keeps a short history so late subscribers and reconnecting clients can
+    replay what they missed.
+    """
+
+    def __init__(self, max_events_per_job: int = 500, retention: float = 600.0):
+        self.max_events_per_job = max_events_per_job
+        self.retention = retention
+        self._channels: Dict[str, _JobChannel] = {}
+        self._lock = threading.Lock()
+
+    def publish(self, job_id: str, stage: str, **data) -> ProgressEvent:
+        with self._lock:
+            channel = self._channels.get(job_id)
+            if channel is None:
+                self._prune()
+                channel = self._channels[job_id] = _JobChannel(self.max_events_per_job)
+            channel.seq += 1
+            event = ProgressEvent(
+                seq=channel.seq, job_id=job_id, stage=stage, timestamp=time.time(), data=data
+            )
+            channel.events.append(event)
+            if stage in TERMINAL_STAGES:
+                channel.finished_at = event.timestamp
+            subscribers = list(channel.subscribers)
+
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+            except RuntimeError:
+                # The subscriber's loop is closed
+                pass
+        return event
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        for job_id in [
+            job_id
+            for job_id, channel in self._channels.items()
+            if not channel.subscribers
+            and (not channel.events or (channel.finished_at or cutoff) < cutoff)
+        ]:
+            del self._channels[job_id]
+
+    def has_job(self, job_id: str) -> bool:
+        with self._lock:
+            return job_id in self._channels
+
+    async def stream(
+        self, job_id: str, after: int = 0, keepalive: float = 15.0
+    ) -> AsyncIterator[Optional[ProgressEvent]]:
+        """Yield a job's events after seq `after` until it finishes
+
+        Yields None every `keepalive` seconds without events so callers can
+        keep the connection alive and check on jobs run by other processes.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        subscriber = (loop, queue)
+        with self._lock:
+            channel = self._channels.get(job_id)
+            if channel is None:
+                channel = self._channels[job_id] = _JobChannel(self.max_events_per_job)
+            backlog = [event for event in channel.events if event.seq > after]
+            channel.subscribers.add(subscriber)
+
+        try:
+            for event in backlog:
+                yield event
+                if event.stage in TERMINAL_STAGES:
+                    return
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if event.seq <= after:
+                    continue
+                yield event
+                if event.stage in TERMINAL_STAGES:
+                    return
+        finally:
+            with self._lock:
+                channel.subscribers.discard(subscriber)
+
+
+# Global instance
+progress_bus = ProgressBus()
+
+
+@contextmanager
+def job_scope(job_id: str) -> Iterator[None]:
+    """Report progress events emitted in this context (and threads it starts) for job_id"""
+    token = _current_job.set(job_id)
+    try:
+        yield
+    finally:
+        _current_job.reset(token)
+
+
+def current_job() -> Optional[str]:
+    """The job whose progress the current context reports, if any"""
+    return _current_job.get()
+
+
+@contextmanager
+def capture() -> Iterator[List[Tuple[str, Dict[str, Any]]]]:
+    """Collect the (stage, data) of events emitted in this context instead of publishing them"""
+    events: List[Tuple[str, Dict[str, Any]]] = []
+    token = _captured.set(events)
+    try:
+        yield events
+    finally:
+        _captured.reset(token)
+
+
+def emit(stage: str, **data):
+    """Publish an event for the current job, a no-op outside of a job scope"""
+    captured = _captured.get()
+    if captured is not None:
+        captured.append((stage, data))
+        return
+    job_id = _current_job.get()
+    if job_id is None:
+        return
+    try:
+        progress_bus.publish(job_id, stage, **data)
+    except Exception as e:
+        # Progress reporting must never break the job itself
+        logger.debug(f"Failed to publish progress event {stage} for {job_id}: {str(e)}")
+
+
+@contextmanager
+def usage_scope() -> Iterator[Dict[str, int]]:
+    """Collect the tokens of LLM calls made in this context, including retries"""
+    usage = {"input_tokens": 0, "output_tokens": 0}
+    token = _current_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _current_usage.reset(token)
+
+
+def record_usage(input_tokens: int, output_tokens: int):
+    """Add an LLM call's tokens to the enclosing usage_scope, if any"""
+    usage = _current_usage.get()
+    if usage is not None:
+        usage["input_tokens"] += input_tokens or 0
+        usage["output_tokens"] += output_tokens or 0
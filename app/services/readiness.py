@@ -0,0 +1,193 @@
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+from pydantic import BaseModel
+from app.core.logger import LoggerSingleton
+from .container import services
+from .monitoring import system_monitor
+
+# Get logger from singleton
+logger = LoggerSingleton.get_logger()
+
+OK = "ok"
+DEGRADED = "degraded"
+DOWN = "down"
+
+
+class ProbeDegraded(Exception):
+    """Raised by a probe when a component works but not as it should"""
+
+
+class ProbeResult(BaseModel):
+    """Last observed state of one dependency"""
+
+    name: str
+    status: str
+    latency: float
+    checked_at: float
+    detail: Optional[str] = None
+
+
+class _Probe:
+    def __init__(self, name: str, check: Callable[[], Optional[str]]):
+        self.name = name
+        self.check = check
+        self.result: Optional[ProbeResult] = None
+        self.running: Optional[Future] = None
+
+
+class ReadinessChecker:
+    """Runs dependency probes with cached results
+
+    A probe is a callable that returns an optional detail string when the
+    component is healthy, raises ProbeDegraded when it works poorly and any
+    other exception when it is down. Results are reused for `ttl` seconds and
+    at most one run of each probe is in flight, so frequent health checks do
+    not add load to IMAP, SMTP or the database.
+    """
+
+    def __init__(self, ttl: float = 15.0, timeout: float = 5.0):
+        self.ttl = ttl
+        self.timeout = timeout
+        self._probes: Dict[str, _Probe] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="readiness")
+
+    def register(self, name: str, check: Callable[[], Optional[str]]):
+        self._probes[name] = _Probe(name, check)
+
+    def _run(self, probe: _Probe) -> ProbeResult:
+        started = time.time()
+        try:
+            detail = probe.check()
+            status = OK
+        except ProbeDegraded as e:
+            status, detail = DEGRADED, str(e)
+        except Exception as e:
+            status, detail = DOWN, str(e) or type(e).__name__
+        result = ProbeResult(
+            name=probe.name,
+            status=status,
+            latency=round(time.time() - started, 4),
+            checked_at=time.time(),
+            detail=detail,
+        )
+        if status != OK:
+            logger.warning(f"Readiness probe {probe.name} is {status}: {detail}")
+        probe.result = result
+        return result
+
+    def check(self) -> List[ProbeResult]:
+        """Return the state of every dependency, probing those whose result expired"""
+        now = time.time()
+        waiting = []
+        with self._lock:
+            for probe in self._probes.values():
+                if probe.result is not None and now - probe.result.checked_at < self.ttl:
+                    continue
+                if probe.running is None or probe.running.done():
+                    probe.running = self._executor.submit(self._run, probe)
+                waiting.append(probe)
+
+        deadline = now + self.timeout
+        for probe in waiting:
+            try:
+                probe.running.result(timeout=max(0.0, deadline - time.time()))
+            except Exception:
+                # Still running: report it as down until it answers
+                probe.result = ProbeResult(
+                    name=probe.name,
+                    status=DOWN,
+                    latency=round(time.time() - now, 4),
+                    checked_at=(probe.result.checked_at if probe.result else now),
+                    detail=f"No answer within {self.timeout:g}s",
+                )
+        return [probe.result for probe in self._probes.values()]
+
+    def get_report(self) -> Dict[str, Any]:
+        results = self.check()
+        if any(result.status == DOWN for result in results):
+            status = DOWN
+        elif any(result.status == DEGRADED for result in results):
+            status = DEGRADED
+        else:
+            status = OK
+        system_monitor.set_gauge("readiness_ok", int(status == OK))
+        return {
+            "status": status,
+            "degraded": {
+                result.name: {
+                    "status": result.status,
+                    "latency": result.latency,
+                    "detail": result.detail,
+                }
+                for result in results
+                if result.status != OK
+            },
+            "components": [result.model_dump() for result in results],
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _email_service():
+    email_service = services.peek("email_service")
+    if email_service is None:
+        raise ValueError("Email service not started yet")
+    return email_service
+
+
+def probe_template(template_path: str) -> Optional[str]:
+    """The default template exists and the email service has it loaded"""
+    size = os.path.getsize(template_path)
+    email_service = services.peek("email_service")
+    if email_service is not None and not email_service.template_content:
+        raise ProbeDegraded("Email service has no template loaded")
+    return f"{size} bytes"
+
+
+def probe_imap() -> Optional[str]:
+    """A login to the mailbox succeeds"""
+    with _email_service()._get_mailbox_connection():
+        pass
+    return None
+
+
+def probe_smtp() -> Optional[str]:
+    """The SMTP pool has a usable connection"""
+    _email_service().outbox.probe()
+    return None
+
+
+def probe_llm(window: float, failure_threshold: int) -> Optional[str]:
+    """Recent LLM calls succeed; judged from their outcomes, without calling the provider"""
+    stats = system_monitor.get_recent_stats("AIService", window)
+    if stats["requests"] == 0:
+        return "No calls in the last {:g}s".format(window)
+    if stats["consecutive_failures"] >= failure_threshold:
+        raise ValueError(f"Last {stats['consecutive_failures']} calls failed")
+    summary = (
+        f"{stats['failures']}/{stats['requests']} calls failed, "
+        f"avg latency {stats['avg_duration']:.2f}s"
+    )
+    if stats["failures"]:
+        raise ProbeDegraded(summary)
+    return summary
+
+
+def probe_job_queue(max_depth: int, max_age: float) -> Optional[str]:
+    """The job queues are reachable and not backed up"""
+    email_service = services.peek("email_service")
+    depth = email_service.job_queue.depth() if email_service is not None else 0
+    oldest = email_service.job_queue.oldest_pending_age() if email_service is not None else 0.0
+    waiting = services.get("admission").get_stats()["queue_depth"]
+    summary = (
+        f"{depth} email jobs open (oldest {oldest:.0f}s), "
+        f"{waiting} generations waiting for admission"
+    )
+    if depth > max_depth or oldest > max_age:
+        raise ProbeDegraded(summary)
+    return summary
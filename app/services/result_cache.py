@@ -0,0 +1,117 @@
+import hashlib
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+from app.core import prompts
+from app.core.logger import LoggerSingleton
+from .job_queue import JobFile
+from .monitoring import system_monitor
+
+# Get logger from singleton
+logger = LoggerSingleton.get_logger()
+
+
+def _pipeline_version(model: str) -> str:
+    """Changes whenever the prompts or the model change, invalidating cached results"""
+    digest = hashlib.sha256(model.encode())
+    for prompt in (
+        prompts.WAHRHEIT_SYSTEM_PROMPT,
+        prompts.WAHRHEIT_USER_PROMPT_TEMPLATE,
+        prompts.PARTIE_SYSTEM_PROMPT,
+        prompts.PARTIE_USER_PROMPT_TEMPLATE,
+    ):
+        digest.update(prompt.encode())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Bounded on-disk cache of generated packing lists keyed by an input fingerprint
+
+    The fingerprint covers the content of every Partie file, the Wahrheitsdatei,
+    the template and the pipeline version (model and prompts). Partie files are
+    hashed in upload order since that is the order of the product sections.
+    Entries are evicted least recently used first once max_entries or max_bytes
+    is exceeded.
+    """
+
+    def __init__(self, path: str, max_bytes: int, max_entries: int, model: str):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.version = _pipeline_version(model)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def fingerprint(
+        self, partie_files: List[JobFile], wahrheit_file: JobFile, template_file: JobFile
+    ) -> str:
+        """Combined content fingerprint of a packing list's inputs"""
+        digest = hashlib.sha256(self.version.encode())
+        for partie_file in partie_files:
+            digest.update(b"partie:" + hashlib.sha256(partie_file.content).hexdigest().encode())
+        digest.update(b"wahrheit:" + hashlib.sha256(wahrheit_file.content).hexdigest().encode())
+        digest.update(b"template:" + hashlib.sha256(template_file.content).hexdigest().encode())
+        return digest.hexdigest()
+
+    def _entry(self, fingerprint: str) -> Path:
+        return self.path / f"{fingerprint}.csv"
+
+    def get(self, fingerprint: str) -> Optional[str]:
+        """Return the cached packing list and mark it as recently used"""
+        entry = self._entry(fingerprint)
+        with self._lock:
+            try:
+                content = entry.read_text(encoding="utf-8")
+                os.utime(entry)
+                self.hits += 1
+            except FileNotFoundError:
+                content = None
+                self.misses += 1
+        self._update_gauges()
+        return content
+
+    def put(self, fingerprint: str, content: str):
+        """Store a packing list, evicting least recently used entries if needed"""
+        data = content.encode("utf-8")
+        if len(data) > self.max_bytes:
+            return
+        entry = self._entry(fingerprint)
+        tmp = entry.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with self._lock:
+            tmp.write_bytes(data)
+            os.replace(tmp, entry)
+            self._evict()
+        self._update_gauges()
+
+    def _evict(self):
+        entries = []
+        for entry in self.path.glob("*.csv"):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry))
+        entries.sort()
+        total_bytes = sum(size for _, size, _ in entries)
+        while entries and (len(entries) > self.max_entries or total_bytes > self.max_bytes):
+            _, size, entry = entries.pop(0)
+            entry.unlink(missing_ok=True)
+            total_bytes -= size
+            logger.debug(f"Evicted cached packing list {entry.name}")
+
+    def _update_gauges(self):
+        stats = self.get_stats()
+        system_monitor.set_counter("result_cache_hits", stats["hits"])
+        system_monitor.set_counter("result_cache_misses", stats["misses"])
+        system_monitor.set_gauge("result_cache_hit_ratio", stats["hit_ratio"])
+
+    def get_stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,145 @@
+import time
+from typing import Any, Dict, List, Tuple
+from app.utils.quantile_sketch import QuantileSketch
+
+# Latency accuracy of the rollups; coarser than the monitor's totals to keep them small
+ROLLUP_ACCURACY = 0.05
+# Period length in seconds and number of periods kept, by resolution
+RESOLUTIONS = {"minute": (60, 120), "hour": (3600, 168)}
+
+RollupKey = Tuple[str, str]
+
+
+class RollupStats:
+    """Totals of one operation (or one model's LLM usage) in one period"""
+
+    def __init__(self):
+        self.requests = 0
+        self.successful = 0
+        self.errors = 0
+        self.retries = 0
+        self.duration = 0.0
+        self.cost = 0.0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.latency = QuantileSketch(relative_accuracy=ROLLUP_ACCURACY)
+
+    def merge(self, other: "RollupStats"):
+        self.requests += other.requests
+        self.successful += other.successful
+        self.errors += other.errors
+        self.retries += other.retries
+        self.duration += other.duration
+        self.cost += other.cost
+        self.input_tokens += other.input_tokens
+        self.output_tokens += other.output_tokens
+        self.latency.merge(other.latency)
+
+
+class WindowRollups:
+    """RollupStats per key for each of the last `keep` periods of `period` seconds"""
+
+    def __init__(self, period: int, keep: int):
+        self.period = period
+        self.keep = keep
+        # Period start -> key -> stats
+        self.windows: Dict[int, Dict[RollupKey, RollupStats]] = {}
+
+    def get(self, timestamp: float, key: RollupKey) -> RollupStats:
+        start = int(timestamp // self.period) * self.period
+        window = self.windows.get(start)
+        if window is None:
+            window = self.windows[start] = {}
+            cutoff = start - self.period * self.keep
+            for old in [old for old in self.windows if old <= cutoff]:
+                del self.windows[old]
+        stats = window.get(key)
+        if stats is None:
+            stats = window[key] = RollupStats()
+        return stats
+
+    def merge(self, other: "WindowRollups"):
+        cutoff = time.time() - self.period * self.keep
+        # Also keeps the retired shard of exited threads from growing
+        for old in [old for old in self.windows if old <= cutoff]:
+            del self.windows[old]
+        for start, window in list(other.windows.items()):
+            if start <= cutoff:
+                continue
+            target = self.windows.setdefault(start, {})
+            for key, stats in list(window.items()):
+                target.setdefault(key, RollupStats()).merge(stats)
+
+
+class TimeRollups:
+    """Per-minute and per-hour rollups, the precomputed series behind the dashboard
+
+    Each event updates one entry per resolution, so building a chart costs the
+    same whatever the history length: at most 120 minutes or 168 hours are kept.
+    """
+
+    def __init__(self):
+        self.resolutions = {
+            name: WindowRollups(period, keep) for name, (period, keep) in RESOLUTIONS.items()
+        }
+
+    def record_request(self, timestamp: float, key: RollupKey, success: bool, duration: float):
+        for rollups in self.resolutions.values():
+            stats = rollups.get(timestamp, key)
+            stats.requests += 1
+            stats.duration += duration
+            stats.latency.add(duration)
+            if success:
+                stats.successful += 1
+
+    def record_error(self, timestamp: float, key: RollupKey):
+        for rollups in self.resolutions.values():
+            rollups.get(timestamp, key).errors += 1
+
+    def record_retry(self, timestamp: float, key: RollupKey):
+        for rollups in self.resolutions.values():
+            rollups.get(timestamp, key).retries += 1
+
+    def record_cost(
+        self, timestamp: float, key: RollupKey, input_tokens: int, output_tokens: int, cost: float
+    ):
+        for rollups in self.resolutions.values():
+            stats = rollups.get(timestamp, key)
+            stats.cost += cost
+            stats.input_tokens += input_tokens
+            stats.output_tokens += output_tokens
+
+    def merge(self, other: "TimeRollups"):
+        for name, rollups in self.resolutions.items():
+            rollups.merge(other.resolutions[name])
+
+    def series(self, resolution: str, periods: int) -> Dict[str, Any]:
+        """Points of the last `periods` periods per key, oldest first, for charts"""
+        rollups = self.resolutions[resolution]
+        newest = int(time.time() // rollups.period) * rollups.period
+        starts = [newest - rollups.period * i for i in range(min(periods, rollups.keep))][::-1]
+        keys = sorted({key for window in rollups.windows.values() for key in window})
+        series: Dict[str, List[Dict[str, float]]] = {}
+        for service, operation in keys:
+            points = []
+            for start in starts:
+                stats = rollups.windows.get(start, {}).get((service, operation))
+                if stats is None:
+                    stats = RollupStats()
+                points.append(
+                    {
+                        "t": start,
+                        "requests": stats.requests,
+                        "errors": stats.errors,
+                        "retries": stats.retries,
+                        "throughput": stats.successful * 60.0 / rollups.period,
+                        "avg": stats.duration / stats.requests if stats.requests else None,
+                        "p50": stats.latency.quantile(0.5) if stats.requests else None,
+                        "p95": stats.latency.quantile(0.95) if stats.requests else None,
+                        "cost": stats.cost,
+                        "input_tokens": stats.input_tokens,
+                        "output_tokens": stats.output_tokens,
+                    }
+                )
+            series[f"{service}/{operation}"] = points
+        return {"period": rollups.period, "starts": starts, "series": series}
@@ -0,0 +1,169 @@
+import asyncio
+import queue
+import smtplib
+import ssl
+import threading
+import time
+from email.message import Message
+from typing import Optional
+from app.core.logger import LoggerSingleton
+from .monitoring import system_monitor
+
+# Get logger from singleton
+logger = LoggerSingleton.get_logger()
+
+
+class _PooledConnection:
+    """An authenticated SMTP connection and the time it was last used"""
+
+    def __init__(self, server: smtplib.SMTP):
+        self.server = server
+        self.last_used = time.time()
+
+
+class SMTPOutbox:
+    """Async outbox that sends messages over a small pool of authenticated SMTP connections
+
+    Connections are reused between messages. A connection that was idle for
+    longer than keepalive_interval is checked with NOOP before use and replaced
+    if the server dropped it. The blocking smtplib calls run in worker threads,
+    so the pool is not bound to any particular event loop.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        username: str,
+        password: str,
+        pool_size: int = 2,
+        keepalive_interval: float = 30.0,
+        timeout: float = 30.0,
+        use_tls: bool = True,
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.pool_size = max(1, pool_size)
+        self.keepalive_interval = keepalive_interval
+        self.timeout = timeout
+        self.use_tls = use_tls
+
+        self._idle: "queue.LifoQueue[_PooledConnection]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.pool_size)
+        self._closed = False
+
+    async def send(self, msg: Message):
+        """Send a message, waiting for a free pooled connection if necessary"""
+        await asyncio.to_thread(self.send_blocking, msg)
+
+    def send_blocking(self, msg: Message):
+        """Send a message from synchronous code"""
+        if self._closed:
+            raise ValueError("SMTP outbox is closed")
+
+        start_time = time.time()
+        with self._slots:
+            conn = None
+            try:
+                conn = self._checkout()
+                try:
+                    conn.server.send_message(msg)
+                except smtplib.SMTPServerDisconnected:
+                    # The server closed an idle connection between health check and send
+                    logger.debug("SMTP connection dropped, retrying on a new connection")
+                    self._discard(conn)
+                    conn = None
+                    conn = self._connect()
+                    conn.server.send_message(msg)
+            except Exception:
+                self._discard(conn)
+                system_monitor.record_request(
+                    service="SMTPOutbox",
+                    operation="send_message",
+                    success=False,
+                    duration=time.time() - start_time,
+                    metadata={"to": msg.get("To")},
+                )
+                raise
+            self._checkin(conn)
+
+        system_monitor.record_request(
+            service="SMTPOutbox",
+            operation="send_message",
+            success=True,
+            duration=time.time() - start_time,
+            metadata={"to": msg.get("To")},
+        )
+
+    def probe(self):
+        """Check that a pooled connection is usable, opening one if the pool is empty"""
+        if self._closed:
+            raise ValueError("SMTP outbox is closed")
+        with self._slots:
+            conn = self._checkout()
+            if not self._is_alive(conn):
+                self._discard(conn)
+                conn = self._connect()
+            self._checkin(conn)
+
+    def close(self):
+        """Close all idle connections and refuse further sends"""
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+    def _checkout(self) -> _PooledConnection:
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            if time.time() - conn.last_used < self.keepalive_interval:
+                return conn
+            if self._is_alive(conn):
+                return conn
+            self._discard(conn)
+
+    def _checkin(self, conn: _PooledConnection):
+        conn.last_used = time.time()
+        if self._closed:
+            self._discard(conn)
+        else:
+            self._idle.put(conn)
+
+    def _connect(self) -> _PooledConnection:
+        """Open and authenticate a new connection (implicit TLS on 465, STARTTLS otherwise)"""
+        context = ssl.create_default_context()
+        logger.debug(f"Opening SMTP connection to {self.host}:{self.port}")
+        if not self.use_tls:
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        elif self.port == 465:
+            server = smtplib.SMTP_SSL(
+                self.host, self.port, context=context, timeout=self.timeout
+            )
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            server.starttls(context=context)
+        server.login(self.username, self.password)
+        return _PooledConnection(server)
+
+    def _is_alive(self, conn: _PooledConnection) -> bool:
+        try:
+            status, _ = conn.server.noop()
+            return status == 250
+        except Exception:
+            return False
+
+    def _discard(self, conn: Optional[_PooledConnection]):
+        if conn is None:
+            return
+        try:
+            conn.server.quit()
+        except Exception:
+            conn.server.close()
@@ -0,0 +1,192 @@
+import functools
+import hashlib
+import inspect
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, Optional, TypeVar
+from .log_writer import BufferedLogWriter
+
+OK = "ok"
+ERROR = "error"
+
+SPAN_PREFIX = "spans"
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+class Span:
+    """A timed stage of a job; spans started while it is open become its children"""
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        job_id: str,
+        parent_id: Optional[str] = None,
+        attributes: Optional[Dict[str, Any]] = None,
+        start_time: Optional[float] = None,
+    ):
+        self.name = name
+        self.trace_id = trace_id
+        self.job_id = job_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes = attributes or {}
+        self.start_time = start_time if start_time is not None else time.time()
+        self.end_time: Optional[float] = None
+        self.status = OK
+        self.error: Optional[str] = None
+
+    def set(self, **attributes):
+        """Add attributes, e.g. token counts known only at the end of the stage"""
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "job_id": self.job_id,
+            "name": self.name,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "duration": round(self.end_time - self.start_time, 6),
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    """Returned outside of a traced job so callers can set attributes unconditionally"""
+
+    def set(self, **attributes):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+# Innermost open span of the current task or thread
+_current_span: ContextVar[Optional[Span]] = ContextVar("trace_span", default=None)
+
+
+def trace_id_for(job_id: str) -> str:
+    """Trace id of a job, derived from its id so every process agrees on it"""
+    return hashlib.md5(job_id.encode("utf-8")).hexdigest()
+
+
+class Tracer:
+    """Records the stages of packing list jobs as spans in JSON-lines files
+
+    A job's root span is opened with trace(); span() then nests under whatever
+    span is open in the current context. The context follows asyncio tasks,
+    asyncio.to_thread and the background event loop, so the stages of one job
+    share its trace across threads. Outside of a job span() does nothing.
+    Finished spans go through a BufferedLogWriter, one line per span.
+    """
+
+    def __init__(self, log_dir: str = "logs/traces", enabled: bool = True):
+        self.enabled = enabled
+        self.writer = BufferedLogWriter(log_dir, prefix=SPAN_PREFIX)
+
+    def configure(self, log_dir: str, enabled: bool = True):
+        """Change the span directory and switch tracing on or off; call before the first span"""
+        self.enabled = enabled
+        if str(self.writer.log_dir) != log_dir:
+            self.writer.close()
+            self.writer = BufferedLogWriter(log_dir, prefix=SPAN_PREFIX)
+
+    def _export(self, span: Span):
+        self.writer.write(span.to_dict())
+
+    @contextmanager
+    def _open(self, span: Span) -> Iterator[Span]:
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = ERROR
+            span.error = str(e) or type(e).__name__
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end_time = time.time()
+            self._export(span)
+
+    @contextmanager
+    def trace(self, job_id: str, name: str, **attributes) -> Iterator[Span]:
+        """Open the root span of a job; a job run several times gets one root span per run"""
+        if not self.enabled:
+            yield _NOOP
+            return
+        with self._open(Span(name, trace_id_for(job_id), job_id, attributes=attributes)) as span:
+            yield span
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Span]:
+        """Open a child of the current span; a no-op outside of a traced job"""
+        parent = _current_span.get()
+        if parent is None or not self.enabled:
+            yield _NOOP
+            return
+        child = Span(name, parent.trace_id, parent.job_id, parent.span_id, attributes)
+        with self._open(child) as span:
+            yield span
+
+    def record(self, job_id: str, name: str, start_time: float, end_time: float, **attributes):
+        """Add a finished stage that ran before the job had an id, e.g. the IMAP download"""
+        if not self.enabled:
+            return
+        span = Span(name, trace_id_for(job_id), job_id, attributes=attributes, start_time=start_time)
+        span.end_time = end_time
+        self._export(span)
+
+    def flush(self):
+        self.writer.flush()
+
+    def close(self):
+        self.writer.close()
+
+
+# Global instance
+tracer = Tracer()
+
+
+def trace(job_id: str, name: str, **attributes):
+    return tracer.trace(job_id, name, **attributes)
+
+
+def span(name: str, **attributes):
+    return tracer.span(name, **attributes)
+
+
+def annotate(**attributes):
+    """Add attributes to the current span, if any"""
+    current = _current_span.get()
+    if current is not None:
+        current.set(**attributes)
+
+
+def traced(name: str) -> Callable[[F], F]:
+    """Run every call of a function, sync or async, in a span named `name`"""
+
+    def decorator(func: F) -> F:
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with tracer.span(name):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracer.span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
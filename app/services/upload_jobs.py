@@ -0,0 +1,522 @@
+import asyncio
+import io
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Set, Tuple
+from fastapi import UploadFile
+from pydantic import BaseModel
+from app.core.logger import LoggerSingleton
+from .admission import Admission, AdmissionController
+from .batch_service import ExtractionScheduler, Shipment
+from .cluster import PROCESS_ID
+from .job_queue import DONE, FAILED, PENDING, RUNNING, JobFile
+from .monitoring import system_monitor
+from . import progress, tracing
+from .packing_list_service import PackingListService
+from .result_cache import ResultCache
+
+# Get logger from singleton
+logger = LoggerSingleton.get_logger()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS upload_jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    files TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    error TEXT,
+    result BLOB,
+    fingerprint TEXT,
+    owner TEXT,
+    heartbeat_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_upload_jobs_created ON upload_jobs (created_at);
+CREATE INDEX IF NOT EXISTS idx_upload_jobs_fingerprint ON upload_jobs (fingerprint);
+"""
+
+COLUMNS = "id, status, files, created_at, started_at, finished_at, error, fingerprint"
+
+# Seconds between heartbeats of a process's open jobs
+HEARTBEAT_INTERVAL = 30.0
+# Open jobs without a heartbeat for this long belonged to a process that stopped
+STALE_AFTER = HEARTBEAT_INTERVAL * 3
+
+
+class UploadJob(BaseModel):
+    """Status of a packing list job submitted over HTTP"""
+
+    id: str
+    status: str
+    files: List[str] = []
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+    fingerprint: Optional[str] = None  # Content fingerprint of the inputs, used as ETag
+
+
+class UploadJobStore:
+    """SQLite table holding the status and result of uploaded jobs
+
+    Results live next to the email job queue, so any server process can answer
+    status and download requests for a job, whichever process ran it. The
+    process that owns open jobs refreshes their heartbeat; an open job whose
+    heartbeat stopped is marked failed when it is next read. Jobs that merely
+    wait for a slot or for admission keep their heartbeat and are not failed.
+    """
+
+    def __init__(self, path: str, timeout: float = 900.0, retention: float = 86400.0):
+        self.path = path
+        self.timeout = timeout
+        self.retention = retention
+        self.owner = PROCESS_ID
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def create(self, filenames: List[str], fingerprint: Optional[str] = None) -> UploadJob:
+        """Register a new pending job and drop expired ones"""
+        now = time.time()
+        job = UploadJob(
+            id=uuid.uuid4().hex,
+            status=PENDING,
+            files=filenames,
+            created_at=now,
+            fingerprint=fingerprint,
+        )
+        with self._connect() as conn:
+            conn.execute(
+                "DELETE FROM upload_jobs WHERE created_at < ?", (now - self.retention,)
+            )
+            conn.execute(
+                "INSERT INTO upload_jobs (id, status, files, created_at, fingerprint, owner, "
+                "heartbeat_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job.id, job.status, "\n".join(filenames), now, fingerprint, self.owner, now),
+            )
+        return job
+
+    def heartbeat(self):
+        """Mark every open job of this process as still alive"""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE upload_jobs SET heartbeat_at = ? WHERE owner = ? AND status IN (?, ?)",
+                (time.time(), self.owner, PENDING, RUNNING),
+            )
+
+    def mark_running(self, job_id: str):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE upload_jobs SET status = ?, started_at = ? WHERE id = ?",
+                (RUNNING, time.time(), job_id),
+            )
+
+    def complete(self, job_id: str, result: str):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE upload_jobs SET status = ?, finished_at = ?, result = ? WHERE id = ?",
+                (DONE, time.time(), result.encode("utf-8"), job_id),
+            )
+
+    def fail(self, job_id: str, error: str):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE upload_jobs SET status = ?, finished_at = ?, error = ? WHERE id = ?",
+                (FAILED, time.time(), error, job_id),
+            )
+
+    def get(self, job_id: str) -> Optional[UploadJob]:
+        """Return a job's status, or None if it is unknown or expired"""
+        now = time.time()
+        with self._connect() as conn:
+            # An open job whose process stopped beating will never finish; record that
+            conn.execute(
+                "UPDATE upload_jobs SET status = ?, finished_at = ?, error = ? "
+                "WHERE id = ? AND status IN (?, ?) AND COALESCE(heartbeat_at, created_at) < ?",
+                (
+                    FAILED,
+                    now,
+                    "The server process running the job stopped",
+                    job_id,
+                    PENDING,
+                    RUNNING,
+                    now - STALE_AFTER,
+                ),
+            )
+            row = conn.execute(
+                f"SELECT {COLUMNS} FROM upload_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return _to_job(row) if row else None
+
+    def find_open(self, fingerprint: str) -> Optional[UploadJob]:
+        """Return the newest live pending or running job with these inputs, if any"""
+        with self._connect() as conn:
+            row = conn.execute(
+                f"SELECT {COLUMNS} FROM upload_jobs WHERE fingerprint = ? AND status IN (?, ?) "
+                "AND COALESCE(heartbeat_at, created_at) >= ? ORDER BY created_at DESC LIMIT 1",
+                (fingerprint, PENDING, RUNNING, time.time() - STALE_AFTER),
+            ).fetchone()
+        return _to_job(row) if row else None
+
+    def get_result(self, job_id: str) -> Optional[bytes]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT result FROM upload_jobs WHERE id = ? AND status = ?",
+                (job_id, DONE),
+            ).fetchone()
+        return row[0] if row else None
+
+
+def _to_job(row: tuple) -> UploadJob:
+    return UploadJob(
+        id=row[0],
+        status=row[1],
+        files=row[2].split("\n") if row[2] else [],
+        created_at=row[3],
+        started_at=row[4],
+        finished_at=row[5],
+        error=row[6],
+        fingerprint=row[7],
+    )
+
+
+class BatchRun:
+    """The jobs of one submitted batch, one per shipment"""
+
+    def __init__(self, store: UploadJobStore, scheduler: ExtractionScheduler):
+        self.store = store
+        self.scheduler = scheduler
+        self.jobs: Dict[str, UploadJob] = {}
+        self._tasks: Dict[asyncio.Future, str] = {}
+
+    def add(self, shipment_id: str, job: UploadJob, task: asyncio.Future):
+        self.jobs[shipment_id] = job
+        self._tasks[task] = shipment_id
+
+    async def as_completed(self) -> AsyncIterator[Tuple[str, UploadJob]]:
+        """Yield (shipment id, final job status) as each shipment finishes"""
+        pending = set(self._tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                shipment_id = self._tasks[task]
+                job_id = self.jobs[shipment_id].id
+                yield shipment_id, await asyncio.to_thread(self.store.get, job_id)
+
+
+class UploadJobManager:
+    """Runs uploaded packing list jobs in the background of the API process
+
+    submit() stores the job and returns at once; the job then runs as a task on
+    the server's event loop, at most `concurrency` at a time and only once the
+    admission controller lets it in (submit() raises AdmissionRejected when its
+    queue is full). The LLM calls and
+    Excel conversions inside PackingListService.generate already run in threads,
+    so running jobs do not block request handling.
+    """
+
+    def __init__(
+        self,
+        store: UploadJobStore,
+        template_path: str,
+        concurrency: int = 2,
+        packing_list_service: Optional[PackingListService] = None,
+        result_cache: Optional[ResultCache] = None,
+        admission: Optional[AdmissionController] = None,
+    ):
+        self.store = store
+        self.template_path = template_path
+        self.result_cache = result_cache
+        self.admission = admission
+        self.packing_list_service = packing_list_service or PackingListService()
+        self._slots = asyncio.Semaphore(max(1, concurrency))
+        self._tasks: Set[asyncio.Task] = set()
+        self._heartbeat: Optional[asyncio.Task] = None
+        # Serializes the in-flight lookup and creation of single jobs
+        self._submitting = asyncio.Lock()
+
+    def _load_template(self) -> bytes:
+        with open(self.template_path, "rb") as f:
+            return f.read()
+
+    async def resolve_template(self, template_file: Optional[JobFile] = None) -> JobFile:
+        """Return the uploaded template, or the default template if none was uploaded"""
+        if template_file is not None:
+            return template_file
+        return JobFile(
+            kind="template",
+            filename=Path(self.template_path).name,
+            content=await asyncio.to_thread(self._load_template),
+        )
+
+    def fingerprint(
+        self, partie_files: List[JobFile], wahrheit_file: JobFile, template_file: JobFile
+    ) -> Optional[str]:
+        """Content fingerprint of a job's inputs, None when result caching is disabled"""
+        if self.result_cache is None:
+            return None
+        return self.result_cache.fingerprint(partie_files, wahrheit_file, template_file)
+
+    def check_admission(self):
+        """Raise AdmissionRejected if no more jobs can be queued right now"""
+        if self.admission is not None:
+            self.admission.check()
+
+    def _reserve(self, jobs: List[List[JobFile]]) -> List[Optional[Admission]]:
+        if self.admission is None:
+            return [None] * len(jobs)
+        return self.admission.reserve_many(
+            [sum(len(f.content) for f in files) for files in jobs]
+        )
+
+    def _release(self, admission: Optional[Admission]):
+        if admission is not None:
+            self.admission.release(admission)
+
+    async def _create_job(
+        self,
+        partie_files: List[JobFile],
+        wahrheit_file: JobFile,
+        template_file: JobFile,
+        fingerprint: Optional[str] = None,
+    ) -> Tuple[UploadJob, bool]:
+        """Store a job, completing it at once if the result is cached. Returns (job, cached)"""
+        if fingerprint is None:
+            fingerprint = self.fingerprint(partie_files, wahrheit_file, template_file)
+        job = await asyncio.to_thread(
+            self.store.create,
+            [f.filename for f in [*partie_files, wahrheit_file]],
+            fingerprint,
+        )
+        if fingerprint is None:
+            return job, False
+
+        cached = await asyncio.to_thread(self.result_cache.get, fingerprint)
+        if cached is None:
+            return job, False
+        await asyncio.to_thread(self.store.complete, job.id, cached)
+        progress.progress_bus.publish(job.id, progress.JOB_COMPLETED, duration=0.0, cached=True)
+        job.status = DONE
+        job.finished_at = time.time()
+        logger.info(f"Upload job {job.id} served from the result cache")
+        return job, True
+
+    async def submit(
+        self,
+        partie_files: List[JobFile],
+        wahrheit_file: JobFile,
+        template_file: Optional[JobFile] = None,
+    ) -> Tuple[UploadJob, bool]:
+        """Store a job and schedule it unless its result is cached. Returns (job, cached)
+
+        A submission identical to a job that is still pending or running returns
+        that job instead of running the pipeline twice. Files must already be
+        read into memory.
+        """
+        if not partie_files:
+            raise ValueError("At least one Partie file is required")
+        template_file = await self.resolve_template(template_file)
+        fingerprint = self.fingerprint(partie_files, wahrheit_file, template_file)
+
+        async with self._submitting:
+            if fingerprint is not None:
+                running = await asyncio.to_thread(self.store.find_open, fingerprint)
+                if running is not None:
+                    logger.info(f"Upload job {running.id} already runs these files")
+                    return running, False
+            (admission,) = self._reserve([[*partie_files, wahrheit_file]])
+            try:
+                job, cached = await self._create_job(
+                    partie_files, wahrheit_file, template_file, fingerprint
+                )
+            except BaseException:
+                self._release(admission)
+                raise
+        if cached:
+            self._release(admission)
+        else:
+            self._start(
+                job.id,
+                self._run(
+                    job.id,
+                    partie_files,
+                    wahrheit_file,
+                    template_file,
+                    job.fingerprint,
+                    admission=admission,
+                ),
+                admission,
+            )
+            logger.info(f"Upload job {job.id} queued with {len(partie_files)} Partie files")
+        return job, cached
+
+    async def submit_batch(
+        self,
+        shipments: List[Shipment],
+        extraction_concurrency: int,
+        template_file: Optional[JobFile] = None,
+    ) -> BatchRun:
+        """Store one job per shipment and run them all under a shared extraction budget
+
+        Shipments do not wait for the per-process job slots; the scheduler
+        limits how many extractions run at once across the whole batch.
+        Shipments whose result is cached complete immediately.
+        """
+        if not shipments:
+            raise ValueError("A batch needs at least one shipment")
+        template_file = await self.resolve_template(template_file)
+
+        admissions = self._reserve(
+            [[*shipment.partie_files, shipment.wahrheit_file] for shipment in shipments]
+        )
+        batch = BatchRun(self.store, ExtractionScheduler(extraction_concurrency))
+        slots = asyncio.Semaphore(len(shipments))
+        for index, (shipment, admission) in enumerate(zip(shipments, admissions)):
+            try:
+                job, cached = await self._create_job(
+                    shipment.partie_files, shipment.wahrheit_file, template_file
+                )
+            except BaseException:
+                for unused in admissions[index:]:
+                    self._release(unused)
+                raise
+            if cached:
+                self._release(admission)
+                task = asyncio.get_running_loop().create_future()
+                task.set_result(None)
+            else:
+                task = self._start(
+                    job.id,
+                    self._run(
+                        job.id,
+                        shipment.partie_files,
+                        shipment.wahrheit_file,
+                        template_file,
+                        job.fingerprint,
+                        slots=slots,
+                        scheduler=batch.scheduler,
+                        admission=admission,
+                    ),
+                    admission,
+                )
+            batch.add(shipment.id, job, task)
+        logger.info(f"Batch of {len(shipments)} shipments queued")
+        return batch
+
+    def _start(self, job_id: str, coro, admission: Optional[Admission] = None) -> asyncio.Task:
+        # The task copies the current context, so its progress events go to job_id
+        with progress.job_scope(job_id):
+            task = asyncio.create_task(self._traced(job_id, coro))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        # Frees the admission budget however the job ends, including cancellation
+        task.add_done_callback(lambda _: self._release(admission))
+        if self._heartbeat is None or self._heartbeat.done():
+            self._heartbeat = asyncio.create_task(self._beat())
+        return task
+
+    async def _beat(self):
+        """Refresh the heartbeat of this process's open jobs while any are left"""
+        while self._tasks:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            try:
+                await asyncio.to_thread(self.store.heartbeat)
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to refresh upload job heartbeats: {str(e)}")
+
+    async def _traced(self, job_id: str, coro):
+        # The root span covers the whole task, including waiting for a slot
+        with tracing.trace(job_id, "upload_job"):
+            return await coro
+
+    async def _run(
+        self,
+        job_id: str,
+        partie_files: List[JobFile],
+        wahrheit_file: JobFile,
+        template_file: JobFile,
+        fingerprint: Optional[str] = None,
+        slots: Optional[asyncio.Semaphore] = None,
+        scheduler: Optional[ExtractionScheduler] = None,
+        admission: Optional[Admission] = None,
+    ):
+        start_time = time.time()
+        async with slots or self._slots:
+            if admission is not None:
+                await self.admission.acquire(admission)
+            await asyncio.to_thread(self.store.mark_running, job_id)
+            progress.emit(
+                "job_started", files=[f.filename for f in [*partie_files, wahrheit_file]]
+            )
+            try:
+                result = await asyncio.wait_for(
+                    self.packing_list_service.generate(
+                        partie_files=[_to_upload_file(f) for f in partie_files],
+                        wahrheit_file=_to_upload_file(wahrheit_file),
+                        template_file=_to_upload_file(template_file),
+                        scheduler=scheduler,
+                    ),
+                    timeout=self.store.timeout,
+                )
+            except asyncio.CancelledError:
+                await asyncio.to_thread(self.store.fail, job_id, "Job cancelled")
+                progress.emit(progress.JOB_FAILED, error="Job cancelled")
+                raise
+            except Exception as e:
+                error = "Job timed out" if isinstance(e, asyncio.TimeoutError) else str(e)
+                logger.error(f"Upload job {job_id} failed: {error}")
+                await asyncio.to_thread(self.store.fail, job_id, error)
+                progress.emit(progress.JOB_FAILED, error=error)
+                system_monitor.record_request(
+                    service="UploadJobs",
+                    operation="generate_packing_list",
+                    success=False,
+                    duration=time.time() - start_time,
+                    metadata={"job_id": job_id, "error_message": error},
+                )
+                return
+
+        await asyncio.to_thread(self.store.complete, job_id, result)
+        if fingerprint is not None:
+            try:
+                await asyncio.to_thread(self.result_cache.put, fingerprint, result)
+            except OSError as e:
+                logger.warning(f"Failed to cache result of upload job {job_id}: {str(e)}")
+        progress.emit(progress.JOB_COMPLETED, duration=time.time() - start_time)
+        system_monitor.record_request(
+            service="UploadJobs",
+            operation="generate_packing_list",
+            success=True,
+            duration=time.time() - start_time,
+            metadata={"job_id": job_id, "partie_count": len(partie_files)},
+        )
+        logger.info(f"Upload job {job_id} completed in {time.time() - start_time:.2f}s")
+
+    async def shutdown(self):
+        """Cancel jobs still running so they are recorded as failed"""
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"active_tasks": len(self._tasks)}
+
+
+def _to_upload_file(job_file: JobFile) -> UploadFile:
+    return UploadFile(filename=job_file.filename, file=io.BytesIO(job_file.content))
@@ -0,0 +1,120 @@
+import gzip
+import posixpath
+import tarfile
+import zipfile
+from io import BytesIO
+from typing import Callable, IO, Iterator, Tuple
+
+# Chunk size used when decompressing archive members
+CHUNK_SIZE = 64 * 1024
+
+TAR_GZ_EXTENSIONS = (".tar.gz", ".tgz")
+ARCHIVE_EXTENSIONS = (".zip", ".gz", ".tgz")
+
+
+def is_archive(filename: str) -> bool:
+    """Check if a file is a ZIP or gzip archive based on its extension"""
+    return filename.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def iter_archive_members(
+    filename: str,
+    content: bytes,
+    select: Callable[[str], bool],
+    max_member_bytes: int,
+    max_total_bytes: int,
+    max_members: int = 500,
+) -> Iterator[Tuple[str, bytes]]:
+    """Stream the selected members of a ZIP, tar.gz or gzip archive
+
+    Members are decompressed one at a time in fixed-size chunks and never written
+    to disk. Only members whose base name passes select() are decompressed, and
+    the limits guard against oversized members and decompression bombs.
+
+    Args:
+        filename: Archive filename, used to detect the archive type
+        content: Raw archive bytes
+        select: Called with each member's base name, True to extract it
+        max_member_bytes: Maximum decompressed size of a single member
+        max_total_bytes: Maximum decompressed size of all selected members
+        max_members: Maximum number of entries inspected in the archive
+
+    Yields:
+        (member base name, decompressed bytes) for each selected member
+
+    Raises:
+        ValueError: If the archive is invalid or a limit is exceeded
+    """
+    lower_filename = filename.lower()
+    if lower_filename.endswith(".zip"):
+        members = _iter_zip(content)
+    elif lower_filename.endswith(TAR_GZ_EXTENSIONS):
+        members = _iter_tar_gz(content)
+    elif lower_filename.endswith(".gz"):
+        members = _iter_gzip(filename, content)
+    else:
+        raise ValueError(f"Unsupported archive type: {filename}")
+
+    total_bytes = 0
+    try:
+        for index, (name, open_member) in enumerate(members):
+            if index >= max_members:
+                raise ValueError(
+                    f"Archive {filename} has more than {max_members} entries"
+                )
+            if not select(name):
+                continue
+            with open_member() as stream:
+                data = _read_limited(stream, max_member_bytes, name)
+            total_bytes += len(data)
+            if total_bytes > max_total_bytes:
+                raise ValueError(
+                    f"Archive {filename} exceeds {max_total_bytes} decompressed bytes"
+                )
+            yield name, data
+    except (zipfile.BadZipFile, tarfile.TarError, OSError, EOFError) as e:
+        raise ValueError(f"Invalid archive {filename}: {str(e)}")
+
+
+def _read_limited(stream: IO[bytes], limit: int, name: str) -> bytes:
+    buffer = bytearray()
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            return bytes(buffer)
+        buffer += chunk
+        if len(buffer) > limit:
+            raise ValueError(f"Archive member {name} exceeds {limit} bytes")
+
+
+def _is_hidden(path: str) -> bool:
+    # Skip macOS resource forks and dot files added by archivers
+    return path.startswith("__MACOSX/") or posixpath.basename(path).startswith(".")
+
+
+def _iter_zip(content: bytes) -> Iterator[Tuple[str, Callable[[], IO[bytes]]]]:
+    with zipfile.ZipFile(BytesIO(content)) as archive:
+        for info in archive.infolist():
+            if info.is_dir() or _is_hidden(info.filename):
+                continue
+            yield posixpath.basename(info.filename), lambda info=info: archive.open(info)
+
+
+def _iter_tar_gz(content: bytes) -> Iterator[Tuple[str, Callable[[], IO[bytes]]]]:
+    # Stream mode ("r|gz") reads the archive strictly sequentially
+    with tarfile.open(fileobj=BytesIO(content), mode="r|gz") as archive:
+        for member in archive:
+            if not member.isfile() or _is_hidden(member.name):
+                continue
+            yield posixpath.basename(member.name), lambda member=member: archive.extractfile(
+                member
+            )
+
+
+def _iter_gzip(
+    filename: str, content: bytes
+) -> Iterator[Tuple[str, Callable[[], IO[bytes]]]]:
+    # A plain .gz holds a single file named like the archive without the suffix
+    yield posixpath.basename(filename[: -len(".gz")]), lambda: gzip.GzipFile(
+        fileobj=BytesIO(content)
+    )
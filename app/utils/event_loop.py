@@ -0,0 +1,89 @@
+import asyncio
+import contextvars
+import threading
+from typing import Any, Coroutine, Optional, TypeVar
+from app.core.logger import LoggerSingleton
+
+# Get logger from singleton
+logger = LoggerSingleton.get_logger()
+
+T = TypeVar("T")
+
+
+class BackgroundEventLoop:
+    """A single long-lived asyncio event loop running on a dedicated thread
+
+    Synchronous code (the IMAP watcher and job worker threads) submits coroutines
+    with run(). Because every coroutine runs on the same loop, async clients,
+    connection pools and caches bound to that loop are reused across jobs.
+    """
+
+    def __init__(self, name: str = "background-event-loop"):
+        self.name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """The running loop, started on first use"""
+        self.start()
+        return self._loop
+
+    def start(self):
+        """Start the loop thread if it is not running yet"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._loop = asyncio.new_event_loop()
+            ready = threading.Event()
+            self._thread = threading.Thread(
+                target=self._run_forever, args=(ready,), name=self.name, daemon=True
+            )
+            self._thread.start()
+            ready.wait()
+            logger.debug(f"Background event loop '{self.name}' started")
+
+    def _run_forever(self, ready: threading.Event):
+        asyncio.set_event_loop(self._loop)
+        self._loop.call_soon(ready.set)
+        try:
+            self._loop.run_forever()
+        finally:
+            self._loop.run_until_complete(self._loop.shutdown_asyncgens())
+            self._loop.close()
+
+    def run(self, coro: Coroutine[Any, Any, T], timeout: Optional[float] = None) -> T:
+        """Run a coroutine on the loop from another thread and wait for its result
+
+        The caller's context variables (e.g. the job whose progress is reported)
+        are carried over to the coroutine.
+        """
+        loop = self.loop
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError(
+                "BackgroundEventLoop.run() called from the loop thread, await instead"
+            )
+        wrapped = _run_in_context(contextvars.copy_context(), coro)
+        return asyncio.run_coroutine_threadsafe(wrapped, loop).result(timeout)
+
+    def stop(self, timeout: float = 10.0):
+        """Stop the loop and wait for its thread to finish"""
+        with self._lock:
+            if self._thread is None:
+                return
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=timeout)
+            self._thread = None
+            logger.debug(f"Background event loop '{self.name}' stopped")
+
+
+async def _run_in_context(context: contextvars.Context, coro: Coroutine[Any, Any, T]) -> T:
+    for var, value in context.items():
+        var.set(value)
+    return await coro
+
+
+# Global instance shared by all background workers
+background_loop = BackgroundEventLoop()
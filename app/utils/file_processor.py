@@ -1,9 +1,9 @@
 from typing import Dict, List, Tuple, Any, Callable, TypeVar, Optional
-import pandas as pd
 from datetime import datetime
 from io import StringIO, BytesIO
-from app.services.ai_service import AIService
+from app.services.container import services
 from app.services.monitoring import system_monitor
+from app.services import progress, tracing
 from app.utils.retry_utils import execute_with_self_healing
 from rich.console import Console
 from app.core.models import PartieData, WahrheitData
@@ -13,14 +13,15 @@ from app.core.prompts import (
     WAHRHEIT_SYSTEM_PROMPT,
     WAHRHEIT_USER_PROMPT_TEMPLATE,
 )
+import asyncio
 import json
 import time
 import functools
 
 console = Console()
-ai_service = AIService()
 
 
+@tracing.traced("process_partie")
 async def process_partie(content: bytes, filename: str = None) -> Dict:
     """
     Process Partie data from bytes content using AI with self-healing capabilities
@@ -32,15 +33,17 @@ async def process_partie(content: bytes, filename: str = None) -> Dict:
     """
     start_time = time.time()
     operation = f"extract_partie_data:{filename or 'Unknown'}"
+    tracing.annotate(filename=filename)
 
     try:
         # Convert bytes to string
-        content_str = content.decode("utf-8")
+        with tracing.span("decode", bytes=len(content)):
+            content_str = content.decode("utf-8")
 
         # Execute with self-healing retry logic
         def extract():
             # Use structured data extraction with Pydantic model
-            result = ai_service.extract_structured_data(
+            result = services.get("ai_service").extract_structured_data(
                 content=content_str,
                 system_prompt=PARTIE_SYSTEM_PROMPT,
                 user_prompt=PARTIE_USER_PROMPT_TEMPLATE.format(
@@ -48,14 +51,18 @@ async def process_partie(content: bytes, filename: str = None) -> Dict:
                 ),
                 response_model=PartieData,
                 description=f"Partie data from {filename or 'Unknown Partie'}",
+                operation=operation,
             )
             # Return the Pydantic model directly
             return result
 
-        result = execute_with_self_healing(
-            operation_name=operation,
-            extraction_func=extract,
-        )
+        # The LLM call and retry backoff block, so run them off the event loop
+        with progress.usage_scope() as usage:
+            result = await asyncio.to_thread(
+                execute_with_self_healing,
+                operation_name=operation,
+                extraction_func=extract,
+            )
 
         # After successful execution, record additional metadata
         system_monitor.record_request(
@@ -84,6 +91,15 @@ async def process_partie(content: bytes, filename: str = None) -> Dict:
         console.print(f"[bold green]Total Bales:[/] [cyan]{total_bales}[/]")
         console.print(f"[bold green]Total Weight:[/] [cyan]{total_gross_kg} kg[/]")
 
+        progress.emit(
+            "partie_extracted",
+            filename=filename,
+            partie_no=result.partie_no,
+            bale_count=total_bales,
+            duration=time.time() - start_time,
+            **usage,
+        )
+
         return result
 
     except Exception as e:
@@ -107,6 +123,7 @@ async def process_partie(content: bytes, filename: str = None) -> Dict:
         raise
 
 
+@tracing.traced("load_wahrheit")
 async def load_wahrheit(content: bytes, filename: str = None) -> Tuple[Dict, str, str]:
     """
     Load Wahrheitsdatei mapping from bytes content using AI with self-healing capabilities
@@ -118,31 +135,36 @@ async def load_wahrheit(content: bytes, filename: str = None) -> Tuple[Dict, str
     """
     start_time = time.time()
     operation = "extract_wahrheit_data"
+    tracing.annotate(filename=filename)
 
     console.print("\n[bold blue]=== Processing Wahrheitsdatei ===[/]")
 
     try:
         # Convert bytes to string
-        content_str = content.decode("utf-8")
+        with tracing.span("decode", bytes=len(content)):
+            content_str = content.decode("utf-8")
 
         # Execute with self-healing retry logic
         def extract():
             # Use structured data extraction with Pydantic model
-            result = ai_service.extract_structured_data(
+            result = services.get("ai_service").extract_structured_data(
                 content=content_str,
                 system_prompt=WAHRHEIT_SYSTEM_PROMPT,
                 user_prompt=WAHRHEIT_USER_PROMPT_TEMPLATE,
                 response_model=WahrheitData,
                 description="Wahrheitsdatei data",
+                operation=operation,
             )
             # Return the Pydantic model directly
             return result
 
         # Execute with self-healing without passing metadata initially
-        result = execute_with_self_healing(
-            operation_name=operation,
-            extraction_func=extract,
-        )
+        with progress.usage_scope() as usage:
+            result = await asyncio.to_thread(
+                execute_with_self_healing,
+                operation_name=operation,
+                extraction_func=extract,
+            )
 
         # Convert the new products list structure to the product_map dictionary format
         # that the rest of the codebase expects
@@ -194,6 +216,16 @@ async def load_wahrheit(content: bytes, filename: str = None) -> Tuple[Dict, str
         for partie, desc in product_map.items():
             console.print(f"  [green]Partie {partie}:[/] [cyan]{desc}[/]")
 
+        progress.emit(
+            "wahrheit_extracted",
+            filename=filename,
+            container_no=container_no,
+            invoice_no=invoice_no,
+            product_count=len(result.products),
+            duration=time.time() - start_time,
+            **usage,
+        )
+
         # Return the product map and container/invoice numbers using attribute access
         return product_map, container_no, invoice_no
     except Exception as e:
@@ -237,11 +269,14 @@ def format_bales_data(bales: List[Dict]) -> str:
     return "\n".join(lines)
 
 
+@tracing.traced("generate_packing_list")
 async def generate_packing_list(
     partie_contents: List,
     wahrheit_content: bytes,
     template_content: str,
     wahrheit_filename: str = None,
+    extract_partie: Callable = None,
+    extract_wahrheit: Callable = None,
 ) -> str:
     """Generate packing list from partie, wahrheit and template files
 
@@ -250,16 +285,20 @@ async def generate_packing_list(
         wahrheit_content: Bytes content of wahrheit file
         template_content: String content of template file
         wahrheit_filename: Filename of the wahrheit file (optional)
+        extract_partie: Replaces process_partie, e.g. to share extractions across jobs
+        extract_wahrheit: Replaces load_wahrheit, e.g. to share extractions across jobs
 
     Returns:
         String content of generated packing list
     """
     start_time = time.time()
+    extract_partie = extract_partie or process_partie
+    extract_wahrheit = extract_wahrheit or load_wahrheit
 
     try:
         # Load Wahrheitsdatei using AI
         console.print("[bold blue]Processing Wahrheitsdatei...[/]")
-        product_map, container_no, invoice_no = await load_wahrheit(
+        product_map, container_no, invoice_no = await extract_wahrheit(
             wahrheit_content, wahrheit_filename
         )
 
@@ -289,7 +328,7 @@ async def generate_packing_list(
             # Extract partie number from filename (e.g., "Partie 33876.csv" -> "33876")
             partie_num = partie_content.filename.split()[1].split(".")[0]
             console.print(f"\n[bold green]Processing Partie[/] [cyan]{partie_num}[/]")
-            product_data = await process_partie(
+            product_data = await extract_partie(
                 partie_content.content, partie_content.filename
             )
 
@@ -305,10 +344,18 @@ async def generate_packing_list(
             console.print(
                 f"[bold green]Found description from Wahrheit:[/] [cyan]{description}[/]"
             )
-            section = generate_product_section(
-                product_template, product_data, partie_num, description
-            )
+            with tracing.span("render_section", partie_no=partie_num):
+                section = generate_product_section(
+                    product_template, product_data, partie_num, description
+                )
             product_sections.append(section)
+            progress.emit(
+                "section_rendered",
+                partie_no=partie_num,
+                index=idx + 1,
+                total=len(partie_contents),
+                section=section,
+            )
 
         # Generate final document
         console.print("\n[bold green]Generating final document[/]")
@@ -322,8 +369,10 @@ async def generate_packing_list(
 
         # Add all product sections
         output_content += "\n".join(product_sections)
+        progress.emit("document_rendered", partie_count=len(partie_contents))
 
         # Print cost summary if available
+        ai_service = services.get("ai_service")
         if hasattr(ai_service, "cost_tracker") and ai_service.cost_tracker:
             ai_service.cost_tracker.print_summary()
 
@@ -2,6 +2,7 @@ from typing import Dict, Any, Callable, TypeVar
 import time
 from rich.console import Console
 from app.services.monitoring import system_monitor
+from app.services import tracing
 
 console = Console()
 
@@ -65,6 +66,7 @@ def handle_retry_monitoring(
         )
 
 
+@tracing.traced("self_healing")
 def execute_with_self_healing(
     operation_name: str,
     extraction_func: Callable[..., T],
@@ -90,6 +92,7 @@ def execute_with_self_healing(
     retries = 0
     last_error = None
     result = None
+    tracing.annotate(operation=operation_name)
 
     # Loop until success or max retries reached
     while retries < MAX_RETRIES:
@@ -103,6 +106,7 @@ def execute_with_self_healing(
 
             # Call the extraction function
             result = extraction_func(*args, **kwargs)
+            tracing.annotate(attempts=retries + 1)
 
             extraction_duration = time.time() - extraction_start
 
@@ -143,7 +147,8 @@ def execute_with_self_healing(
                 # Backoff with increasing delay
                 delay = 2**retries
                 console.print(f"[blue]Waiting {delay} seconds before retry...[/]")
-                time.sleep(delay)
+                with tracing.span("retry_backoff", attempt=retries, delay=delay):
+                    time.sleep(delay)
 
     # All retries failed
     raise ValueError(
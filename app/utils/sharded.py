@@ -0,0 +1,70 @@
+import threading
+from typing import Callable, Generic, List, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class ThreadSharded(Generic[T]):
+    """One instance of a value per thread, merged on read
+
+    Each thread only ever updates its own shard, so recording needs no lock
+    and threads never wait for each other; asyncio tasks share the shard of
+    their loop's thread, which is safe as long as an update does not await.
+    collect() merges all shards into a fresh value. Shards of threads that
+    have exited are folded into one retired shard, so short-lived threads do
+    not accumulate.
+    """
+
+    def __init__(self, factory: Callable[[], T], merge: Callable[[T, T], None]):
+        self._factory = factory
+        # merge(target, source) adds source into target; source may still be updated
+        self._merge = merge
+        self._local = threading.local()
+        self._shards: List[Tuple[threading.Thread, T]] = []
+        self._retired = factory()
+        self._lock = threading.Lock()
+
+    def local(self) -> T:
+        """The calling thread's shard"""
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._factory()
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+            self._local.shard = shard
+            return shard
+
+    def collect(self) -> T:
+        """A new value with the contents of every shard"""
+        total = self._factory()
+        with self._lock:
+            live = []
+            for thread, shard in self._shards:
+                if thread.is_alive():
+                    live.append((thread, shard))
+                else:
+                    self._merge(self._retired, shard)
+            self._shards = live
+            self._merge(total, self._retired)
+            for _, shard in live:
+                self._merge(total, shard)
+        return total
+
+
+def _add_cell(target: List[float], source: List[float]):
+    target[0] += source[0]
+
+
+class ShardedCounter:
+    """A counter that many threads can increment without a lock"""
+
+    def __init__(self):
+        self._cells: ThreadSharded[List[float]] = ThreadSharded(lambda: [0], _add_cell)
+
+    def add(self, amount: float = 1):
+        self._cells.local()[0] += amount
+
+    @property
+    def value(self) -> float:
+        return self._cells.collect()[0]
@@ -0,0 +1,440 @@
+"""
+In-process IMAP and SMTP stand-ins for exercising the email pipeline locally.
+
+Only the subset of the protocols used by EmailService is implemented: LOGIN,
+CAPABILITY, SELECT, STATUS, UID SEARCH/FETCH/STORE, IDLE on the IMAP side and
+EHLO, AUTH PLAIN, MAIL/RCPT/DATA on the SMTP side. Both servers speak plaintext,
+so point the service at them with IMAP_SSL=false and SMTP_USE_TLS=false.
+Do NOT expose them beyond localhost.
+"""
+
+import base64
+import re
+import select
+import socketserver
+import threading
+import time
+from email import message_from_bytes
+from email.message import EmailMessage, Message
+from email.policy import default as default_policy
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+UIDVALIDITY = 1
+CAPABILITIES = "IMAP4rev1 IDLE UIDPLUS AUTH=PLAIN"
+HEADER_FIELDS_PATTERN = re.compile(r"BODY(?:\.PEEK)?\[HEADER\.FIELDS \(([^)]*)\)\]", re.I)
+PART_PATTERN = re.compile(r"BODY(?:\.PEEK)?\[([0-9.]*)\]", re.I)
+
+
+class StoredMessage:
+    """A message held by the fake IMAP store"""
+
+    def __init__(self, uid: int, raw: bytes, keywords: Set[str]):
+        self.uid = uid
+        self.raw = raw
+        self.message = message_from_bytes(raw, policy=default_policy)
+        self.flags: Set[str] = set()
+        self.keywords = keywords
+
+
+class MailStore:
+    """Thread-safe INBOX shared by all fake IMAP connections"""
+
+    def __init__(self):
+        self.messages: List[StoredMessage] = []
+        self.uidnext = 1
+        self.condition = threading.Condition()
+
+    def append(self, message: EmailMessage, keywords: Optional[Set[str]] = None) -> int:
+        with self.condition:
+            uid = self.uidnext
+            self.uidnext += 1
+            self.messages.append(StoredMessage(uid, message.as_bytes(), keywords or set()))
+            self.condition.notify_all()
+            return uid
+
+    def snapshot(self) -> List[StoredMessage]:
+        with self.condition:
+            return list(self.messages)
+
+
+def _quote(value: str) -> str:
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _params(params: Dict[str, str]) -> str:
+    if not params:
+        return "NIL"
+    return "(" + " ".join(f"{_quote(k)} {_quote(v)}" for k, v in params.items()) + ")"
+
+
+def _bodystructure(part: Message) -> str:
+    """Build the rfc3501 BODYSTRUCTURE of a message part"""
+    if part.is_multipart():
+        children = "".join(_bodystructure(child) for child in part.iter_parts())
+        boundary = part.get_boundary() or ""
+        return f'({children} {_quote(part.get_content_subtype())} ("boundary" {_quote(boundary)}) NIL NIL NIL)'
+
+    payload = part.get_payload()
+    payload = payload if isinstance(payload, str) else ""
+    main_type = part.get_content_maintype()
+    encoding = part.get("Content-Transfer-Encoding", "7bit")
+    filename = part.get_filename()
+    params = {"name": filename} if filename else {"charset": part.get_content_charset() or "us-ascii"}
+    fields = (
+        f"{_quote(main_type)} {_quote(part.get_content_subtype())} {_params(params)} "
+        f"NIL NIL {_quote(encoding)} {len(payload)}"
+    )
+    if main_type == "text":
+        fields += f" {payload.count(chr(10))}"
+    disposition = (
+        f"({_quote('attachment')} {_params({'filename': filename})})" if filename else "NIL"
+    )
+    return f"({fields} NIL {disposition} NIL NIL)"
+
+
+def _get_part(message: Message, part_id: str) -> Optional[Message]:
+    part = message
+    for index in part_id.split("."):
+        if not part.is_multipart():
+            return part if index == "1" else None
+        children = list(part.iter_parts())
+        if int(index) > len(children):
+            return None
+        part = children[int(index) - 1]
+    return part
+
+
+def _header_fields(message: StoredMessage, names: List[str]) -> bytes:
+    raw_headers = message.raw.split(b"\r\n\r\n", 1)[0].split(b"\n\n", 1)[0]
+    wanted = {name.upper() for name in names}
+    lines = []
+    for line in re.split(rb"\r?\n(?![ \t])", raw_headers):
+        name = line.split(b":", 1)[0].decode(errors="replace").strip().upper()
+        if name in wanted:
+            lines.append(line.rstrip(b"\r\n"))
+    return b"\r\n".join(lines) + b"\r\n\r\n"
+
+
+def _split_args(line: str) -> List[str]:
+    """Split an IMAP argument string, keeping quoted strings and parenthesized groups"""
+    args, current, depth, quoted = [], "", 0, False
+    i = 0
+    while i < len(line):
+        char = line[i]
+        if quoted:
+            if char == "\\" and i + 1 < len(line):
+                current += line[i + 1]
+                i += 2
+                continue
+            if char == '"':
+                quoted = False
+            else:
+                current += char
+        elif char == '"' and depth == 0:
+            quoted = True
+        elif char in "([":
+            depth += 1
+            current += char
+        elif char in ")]":
+            depth -= 1
+            current += char
+        elif char == " " and depth == 0:
+            if current:
+                args.append(current)
+            current = ""
+        else:
+            current += char
+        i += 1
+    if current:
+        args.append(current)
+    return args
+
+
+def _parse_uid_set(uid_set: str, max_uid: int) -> Set[int]:
+    uids: Set[int] = set()
+    for item in uid_set.split(","):
+        if ":" in item:
+            start, end = item.split(":")
+            start = max_uid if start == "*" else int(start)
+            end = max_uid if end == "*" else int(end)
+            uids.update(range(min(start, end), max(start, end) + 1))
+        else:
+            uids.add(max_uid if item == "*" else int(item))
+    return uids
+
+
+def _matches(message: StoredMessage, criteria: List[str], max_uid: int) -> bool:
+    i = 0
+    while i < len(criteria):
+        key = criteria[i].upper()
+        if key == "ALL":
+            pass
+        elif key == "UNSEEN":
+            if "\\Seen" in message.flags:
+                return False
+        elif key == "SEEN":
+            if "\\Seen" not in message.flags:
+                return False
+        elif key == "SUBJECT":
+            i += 1
+            if criteria[i].lower() not in str(message.message.get("Subject", "")).lower():
+                return False
+        elif key in ("KEYWORD", "X-GM-LABELS"):
+            i += 1
+            if criteria[i] not in message.keywords:
+                return False
+        elif key == "UID":
+            i += 1
+            if message.uid not in _parse_uid_set(criteria[i], max_uid):
+                return False
+        else:
+            raise ValueError(f"Unsupported search key {key}")
+        i += 1
+    return True
+
+
+class _IMAPHandler(socketserver.StreamRequestHandler):
+    server: "FakeIMAPServer"
+
+    def send(self, data: bytes):
+        self.wfile.write(data)
+        self.wfile.flush()
+
+    def handle(self):
+        self.selected = False
+        self.send(f"* OK [CAPABILITY {CAPABILITIES}] Fake IMAP ready\r\n".encode())
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            parts = line.decode(errors="replace").rstrip("\r\n").split(" ", 2)
+            if len(parts) < 2:
+                continue
+            tag, command = parts[0], parts[1].upper()
+            args = parts[2] if len(parts) > 2 else ""
+            try:
+                if not self.dispatch(tag, command, args):
+                    return
+            except Exception as e:
+                self.send(f"{tag} BAD {str(e)}\r\n".encode())
+
+    def dispatch(self, tag: str, command: str, args: str) -> bool:
+        store = self.server.store
+        if command == "CAPABILITY":
+            self.send(f"* CAPABILITY {CAPABILITIES}\r\n{tag} OK CAPABILITY completed\r\n".encode())
+        elif command == "LOGIN":
+            self.send(f"{tag} OK LOGIN completed\r\n".encode())
+        elif command == "SELECT":
+            messages = store.snapshot()
+            self.selected = True
+            self.send(
+                f"* {len(messages)} EXISTS\r\n* 0 RECENT\r\n"
+                f"* OK [UIDVALIDITY {UIDVALIDITY}] UIDs valid\r\n"
+                f"* OK [UIDNEXT {store.uidnext}] Predicted next UID\r\n"
+                f"* FLAGS (\\Seen \\Deleted)\r\n"
+                f"{tag} OK [READ-WRITE] SELECT completed\r\n".encode()
+            )
+        elif command == "STATUS":
+            folder = _split_args(args)[0]
+            self.send(
+                f"* STATUS {_quote(folder)} (UIDNEXT {store.uidnext} UIDVALIDITY {UIDVALIDITY})\r\n"
+                f"{tag} OK STATUS completed\r\n".encode()
+            )
+        elif command == "UID":
+            self.handle_uid(tag, args)
+        elif command == "IDLE":
+            self.handle_idle(tag)
+        elif command in ("NOOP", "EXPUNGE", "UNSELECT"):
+            self.send(f"{tag} OK {command} completed\r\n".encode())
+        elif command == "LOGOUT":
+            self.send(f"* BYE Logging out\r\n{tag} OK LOGOUT completed\r\n".encode())
+            return False
+        else:
+            self.send(f"{tag} BAD Unsupported command {command}\r\n".encode())
+        return True
+
+    def handle_uid(self, tag: str, args: str):
+        store = self.server.store
+        subcommand, rest = (args.split(" ", 1) + [""])[:2]
+        subcommand = subcommand.upper()
+        messages = store.snapshot()
+        max_uid = messages[-1].uid if messages else 0
+
+        if subcommand == "SEARCH":
+            criteria = _split_args(rest)
+            if criteria[:1] and criteria[0].upper() == "CHARSET":
+                criteria = criteria[2:]
+            if len(criteria) == 1 and criteria[0].startswith("("):
+                criteria = _split_args(criteria[0][1:-1])
+            uids = [str(m.uid) for m in messages if _matches(m, criteria, max_uid)]
+            self.send(f"* SEARCH {' '.join(uids)}\r\n{tag} OK SEARCH completed\r\n".encode())
+        elif subcommand == "FETCH":
+            uid_set, items = rest.split(" ", 1)
+            wanted = _parse_uid_set(uid_set, max_uid)
+            for seq, message in enumerate(messages, start=1):
+                if message.uid in wanted:
+                    self.send_fetch(seq, message, items)
+            self.send(f"{tag} OK FETCH completed\r\n".encode())
+        elif subcommand == "STORE":
+            uid_set, mode, flags = _split_args(rest)[:3]
+            wanted = _parse_uid_set(uid_set, max_uid)
+            flag_set = set(flags.strip("()").split())
+            for seq, message in enumerate(messages, start=1):
+                if message.uid in wanted:
+                    if mode.startswith("-"):
+                        message.flags -= flag_set
+                    else:
+                        message.flags |= flag_set
+                    self.send(
+                        f"* {seq} FETCH (UID {message.uid} FLAGS ({' '.join(sorted(message.flags))}))\r\n".encode()
+                    )
+            self.send(f"{tag} OK STORE completed\r\n".encode())
+        else:
+            self.send(f"{tag} BAD Unsupported UID command {subcommand}\r\n".encode())
+
+    def send_fetch(self, seq: int, message: StoredMessage, items: str):
+        items_upper = items.upper()
+        fields = [f"UID {message.uid}"]
+        literal: Optional[Tuple[str, bytes]] = None
+
+        if "FLAGS" in items_upper:
+            fields.append(f"FLAGS ({' '.join(sorted(message.flags))})")
+        if "RFC822.SIZE" in items_upper:
+            fields.append(f"RFC822.SIZE {len(message.raw)}")
+        if "BODYSTRUCTURE" in items_upper:
+            fields.append(f"BODYSTRUCTURE {_bodystructure(message.message)}")
+
+        header_match = HEADER_FIELDS_PATTERN.search(items)
+        part_match = PART_PATTERN.search(items)
+        if header_match:
+            names = header_match.group(1).split()
+            literal = (f"BODY[HEADER.FIELDS ({' '.join(names)})]", _header_fields(message, names))
+        elif part_match:
+            part_id = part_match.group(1)
+            if part_id:
+                part = _get_part(message.message, part_id)
+                payload = part.get_payload() if part is not None else ""
+                data = payload.encode() if isinstance(payload, str) else b""
+            else:
+                data = message.raw
+            literal = (f"BODY[{part_id}]", data)
+            if "PEEK" not in items_upper:
+                message.flags.add("\\Seen")
+
+        prefix = f"* {seq} FETCH ({' '.join(fields)}"
+        if literal:
+            name, data = literal
+            self.send(f"{prefix} {name} {{{len(data)}}}\r\n".encode() + data + b")\r\n")
+        else:
+            self.send(f"{prefix})\r\n".encode())
+
+    def handle_idle(self, tag: str):
+        store = self.server.store
+        self.send(b"+ idling\r\n")
+        known = len(store.snapshot())
+        while True:
+            readable, _, _ = select.select([self.connection], [], [], 0.1)
+            if readable:
+                line = self.rfile.readline()
+                if not line or line.strip().upper() == b"DONE":
+                    self.send(f"{tag} OK IDLE terminated\r\n".encode())
+                    return
+            with store.condition:
+                count = len(store.messages)
+            if count != known:
+                known = count
+                self.send(f"* {count} EXISTS\r\n".encode())
+
+
+class FakeIMAPServer(socketserver.ThreadingTCPServer):
+    """Plaintext IMAP server backed by an in-memory MailStore"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, store: MailStore, host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), _IMAPHandler)
+        self.store = store
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    server: "FakeSMTPServer"
+
+    def reply(self, line: str):
+        self.wfile.write(f"{line}\r\n".encode())
+        self.wfile.flush()
+
+    def handle(self):
+        self.reply("220 fake-smtp ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors="replace").strip()
+            verb = command.split(" ", 1)[0].upper()
+            if verb == "EHLO":
+                self.wfile.write(b"250-fake-smtp\r\n250-AUTH PLAIN\r\n250 8BITMIME\r\n")
+                self.wfile.flush()
+            elif verb == "HELO":
+                self.reply("250 fake-smtp")
+            elif verb == "AUTH":
+                self.reply("235 Authentication successful")
+            elif verb in ("MAIL", "RCPT", "RSET", "NOOP"):
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                while True:
+                    data_line = self.rfile.readline()
+                    if not data_line or data_line in (b".\r\n", b".\n"):
+                        break
+                    if data_line.startswith(b".."):
+                        data_line = data_line[1:]
+                    lines.append(data_line)
+                self.reply("250 Message accepted")
+                self.server.deliver(message_from_bytes(b"".join(lines), policy=default_policy))
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class FakeSMTPServer(socketserver.ThreadingTCPServer):
+    """Plaintext SMTP server that hands every accepted message to a callback"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(
+        self,
+        on_message: Optional[Callable[[Message, float], None]] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        super().__init__((host, port), _SMTPHandler)
+        self.on_message = on_message
+        self.received: List[Tuple[float, Message]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def deliver(self, message: Message):
+        received_at = time.time()
+        with self._lock:
+            self.received.append((received_at, message))
+        if self.on_message:
+            self.on_message(message, received_at)
+
+
+def start_in_thread(server: socketserver.BaseServer) -> threading.Thread:
+    """Serve a fake server on a daemon thread"""
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return thread
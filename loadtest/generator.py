@@ -0,0 +1,263 @@
+"""
+Load generator for the email pipeline.
+
+Starts the fake IMAP/SMTP servers, points EmailService at them and injects
+messages with Partie/Wahrheit attachments from context/ at a fixed rate. Each
+reply picked up by the fake SMTP server is matched to its injected message to
+report end-to-end throughput and latency percentiles.
+
+Usage:
+    python -m loadtest.generator --rate 2 --count 50
+    python -m loadtest.generator --rate 5 --count 200 --fake-llm-latency 1.5
+"""
+
+import argparse
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from email.message import EmailMessage, Message
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from loadtest.fake_mail_server import (
+    FakeIMAPServer,
+    FakeSMTPServer,
+    MailStore,
+    start_in_thread,
+)
+
+CONTEXT_DIR = Path(__file__).resolve().parent.parent / "context"
+LABEL = "Rohdex-Automation"
+
+
+def load_fixtures(context_dir: Path) -> List[List[Tuple[str, bytes]]]:
+    """Load one attachment set (Partie files + Wahrheitsdatei) per shipment folder"""
+    fixtures = []
+    for folder in sorted(p for p in context_dir.iterdir() if p.is_dir()):
+        files = [
+            (path.name, path.read_bytes())
+            for path in sorted(folder.glob("*.csv"))
+            if path.name.startswith("Partie") or path.name.startswith("Wahrheit")
+        ]
+        if any(name.startswith("Wahrheit") for name, _ in files):
+            fixtures.append(files)
+    if not fixtures:
+        raise ValueError(f"No Partie/Wahrheitsdatei fixtures found in {context_dir}")
+    return fixtures
+
+
+def build_message(index: int, attachments: List[Tuple[str, bytes]]) -> EmailMessage:
+    msg = EmailMessage()
+    msg["From"] = f"sender{index}@loadtest.local"
+    msg["To"] = "rohdex@loadtest.local"
+    msg["Subject"] = f"ROHDEX load {index}"
+    msg["Message-ID"] = f"<load-{index}-{time.time_ns()}@loadtest.local>"
+    msg.set_content(f"Load test message {index}")
+    for filename, content in attachments:
+        msg.add_attachment(content, maintype="text", subtype="csv", filename=filename)
+    return msg
+
+
+class FakeAIService:
+    """Stands in for AIService with a fixed latency and a deterministic CSV parser
+
+    Keeps the load test focused on the pipeline (IMAP, queue, workers, SMTP)
+    instead of the LLM provider's rate limits and cost.
+    """
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def extract_structured_data(self, content: str, response_model, **kwargs):
+        from app.core.models import PartieData, WahrheitData
+
+        time.sleep(self.latency)
+        if response_model is PartieData:
+            rows = [line.split(",") for line in content.splitlines() if line.strip()]
+            return PartieData(
+                partie_no=rows[0][3] if rows else "0",
+                bales=[
+                    {"bale_no": row[0], "gross_kg": float(row[10])}
+                    for row in rows
+                    if len(row) > 10
+                ],
+            )
+        if response_model is WahrheitData:
+            rows = [line.split("\t") for line in content.splitlines()]
+            invoice = re.search(r"(\d+)", content)
+            return WahrheitData(
+                invoice_no=int(invoice.group(1)) if invoice else 0,
+                container_no="LOADTEST",
+                products=[
+                    {"product_code": int(row[2]), "description": row[3]}
+                    for row in rows
+                    if len(row) > 3 and row[0] == "Artikel" and row[2].isdigit()
+                ],
+            )
+        raise ValueError(f"Unsupported response model {response_model}")
+
+
+class LatencyTracker:
+    """Matches replies to injected messages by subject"""
+
+    def __init__(self):
+        self.sent_at: Dict[str, float] = {}
+        self.latencies: List[float] = []
+        self.completed_at: List[float] = []
+        self.done = threading.Condition()
+
+    def injected(self, subject: str):
+        with self.done:
+            self.sent_at[subject] = time.time()
+
+    def on_reply(self, message: Message, received_at: float):
+        subject = str(message.get("Subject", "")).removeprefix("Re: ")
+        with self.done:
+            sent_at = self.sent_at.pop(subject, None)
+            if sent_at is None:
+                return
+            self.latencies.append(received_at - sent_at)
+            self.completed_at.append(received_at)
+            self.done.notify_all()
+
+    def wait(self, count: int, timeout: float) -> bool:
+        deadline = time.time() + timeout
+        with self.done:
+            while len(self.latencies) < count:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self.done.wait(remaining)
+        return True
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100 * len(ordered) + 0.5)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def configure_environment(imap_port: int, smtp_port: int, state_dir: str):
+    """Point the application settings at the fake servers before app modules load"""
+    os.environ.update(
+        {
+            "IMAP_SERVER": "127.0.0.1",
+            "IMAP_PORT": str(imap_port),
+            "IMAP_SSL": "false",
+            "SMTP_SERVER": "127.0.0.1",
+            "SMTP_PORT": str(smtp_port),
+            "SMTP_USE_TLS": "false",
+            "EMAIL_ADDRESS": "rohdex@loadtest.local",
+            "EMAIL_PASSWORD": "loadtest",
+            "EMAIL_LABEL_FILTER": LABEL,
+            "EMAIL_SUBJECT_FILTER": "ROHDEX",
+            "EMAIL_SYNC_STATE_PATH": os.path.join(state_dir, "email_sync_state.json"),
+            "JOB_QUEUE_PATH": os.path.join(state_dir, "jobs.sqlite3"),
+        }
+    )
+
+
+def run(
+    rate: float,
+    count: int,
+    fake_llm_latency: Optional[float],
+    timeout: float,
+    workers: Optional[int],
+) -> int:
+    fixtures = load_fixtures(CONTEXT_DIR)
+    tracker = LatencyTracker()
+    store = MailStore()
+    imap_server = FakeIMAPServer(store)
+    smtp_server = FakeSMTPServer(on_message=tracker.on_reply)
+    start_in_thread(imap_server)
+    start_in_thread(smtp_server)
+
+    state_dir = tempfile.mkdtemp(prefix="rohdex-loadtest-")
+    configure_environment(imap_server.port, smtp_server.port, state_dir)
+    if workers:
+        os.environ["EMAIL_WORKER_CONCURRENCY"] = str(workers)
+
+    from app.core.config import get_settings
+
+    get_settings.cache_clear()
+
+    from app.services.email_service import EmailService
+    from app.services.container import services
+    from app.utils.event_loop import background_loop
+
+    if fake_llm_latency is not None:
+        services.override("ai_service", FakeAIService(fake_llm_latency))
+
+    background_loop.start()
+    service = EmailService()
+    service.start_polling()
+    service.start_workers()
+
+    print(
+        f"Injecting {count} messages at {rate}/s "
+        f"(IMAP :{imap_server.port}, SMTP :{smtp_server.port})"
+    )
+    started_at = time.time()
+    try:
+        for index in range(count):
+            scheduled = started_at + index / rate
+            delay = scheduled - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            message = build_message(index, fixtures[index % len(fixtures)])
+            tracker.injected(str(message["Subject"]))
+            store.append(message, keywords={LABEL})
+
+        injected_at = time.time()
+        finished = tracker.wait(count, timeout)
+    finally:
+        service.stop_polling()
+        service.stop_workers()
+        background_loop.stop()
+        imap_server.shutdown()
+        smtp_server.shutdown()
+
+    completed = len(tracker.latencies)
+    elapsed = (max(tracker.completed_at) if tracker.completed_at else time.time()) - started_at
+    print("\n=== Load test results ===")
+    print(f"Injected:          {count} in {injected_at - started_at:.1f}s")
+    print(f"Completed:         {completed}" + ("" if finished else " (timed out)"))
+    print(f"Throughput:        {completed / elapsed * 60 if elapsed > 0 else 0:.1f} messages/min")
+    for pct in (50, 90, 95, 99):
+        print(f"Latency p{pct:<3}      {percentile(tracker.latencies, pct):.2f}s")
+    if tracker.latencies:
+        print(f"Latency max:       {max(tracker.latencies):.2f}s")
+    print(f"State directory:   {state_dir}")
+    return 0 if finished else 1
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Email pipeline load generator")
+    parser.add_argument("--rate", type=float, default=1.0, help="messages injected per second")
+    parser.add_argument("--count", type=int, default=20, help="total messages to inject")
+    parser.add_argument(
+        "--fake-llm-latency",
+        type=float,
+        default=None,
+        help="replace LLM calls with a fixed delay in seconds (default: use the real provider)",
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=600.0, help="seconds to wait for all replies"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None, help="override EMAIL_WORKER_CONCURRENCY"
+    )
+    args = parser.parse_args(argv)
+    if args.rate <= 0 or args.count <= 0:
+        parser.error("--rate and --count must be positive")
+    return run(args.rate, args.count, args.fake_llm_latency, args.timeout, args.workers)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,499 @@
+"""
+Offline analytics over the monitor logs.
+
+`ingest` streams every monitor_*.json / monitor_*.json.gz file in logs/ once
+and folds the events into per-minute and per-hour rollups in a SQLite
+database: request, error and retry counts, duration totals and a latency
+histogram with the log-bucket layout of app.utils.quantile_sketch (quantiles
+within 1%). Files are ingested incrementally; a segment that is still being
+written continues where the last run stopped, also after it was rotated into
+a .json.gz.
+
+`query` answers percentile, error-rate, retry-rate and throughput questions
+per service, operation and time window from the rollups, so its cost
+depends on the number of minutes (or hours) asked for, not on the number of
+events. Queries by hour, by day or over the whole range use the hourly
+rollups and round --since/--until to full hours.
+
+Usage:
+    python -m tools.analytics ingest
+    python -m tools.analytics query --since 30d --by day
+    python -m tools.analytics query --service AIService --since 2026-10-01 --by hour
+"""
+
+import argparse
+import glob
+import gzip
+import io
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.utils.quantile_sketch import QuantileSketch
+
+try:
+    import orjson
+except ImportError:  # optional, json is used instead
+    orjson = None
+
+_loads = orjson.loads if orjson is not None else json.loads
+
+# Bucket key of values too small for a log bucket (QuantileSketch.zero_count)
+ZERO_BUCKET = -(2**31)
+
+WINDOWS = {"minute": 1, "hour": 60, "day": 1440, "none": None}
+# Rollup tables by resolution in minutes
+RESOLUTIONS = {1: "minute", 60: "hour"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    name TEXT PRIMARY KEY,
+    offset INTEGER NOT NULL,
+    compressed_size INTEGER,
+    ingested_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS names (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+"""
+
+# Created once per resolution
+TABLES = """
+CREATE TABLE IF NOT EXISTS rollups_{resolution} (
+    service INTEGER NOT NULL,
+    operation INTEGER NOT NULL,
+    period INTEGER NOT NULL,  -- first minute since the epoch
+    requests INTEGER NOT NULL,
+    successful INTEGER NOT NULL,
+    errors INTEGER NOT NULL,
+    retries INTEGER NOT NULL,
+    duration_sum REAL NOT NULL,
+    duration_min REAL,
+    duration_max REAL,
+    PRIMARY KEY (service, operation, period)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_rollups_{resolution}_period ON rollups_{resolution} (period);
+CREATE TABLE IF NOT EXISTS latency_{resolution} (
+    service INTEGER NOT NULL,
+    operation INTEGER NOT NULL,
+    period INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (service, operation, period, bucket)
+) WITHOUT ROWID;
+"""
+
+
+class _Rollup:
+    __slots__ = ("requests", "successful", "errors", "retries", "duration_sum", "min", "max", "buckets")
+
+    def __init__(self):
+        self.requests = 0
+        self.successful = 0
+        self.errors = 0
+        self.retries = 0
+        self.duration_sum = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self.buckets: Dict[int, int] = {}
+
+    def merge(self, other: "_Rollup"):
+        self.requests += other.requests
+        self.successful += other.successful
+        self.errors += other.errors
+        self.retries += other.retries
+        self.duration_sum += other.duration_sum
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        for bucket, count in other.buckets.items():
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+
+
+def connect(db_path: str) -> sqlite3.Connection:
+    directory = os.path.dirname(db_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    for resolution in RESOLUTIONS.values():
+        conn.executescript(TABLES.format(resolution=resolution))
+    return conn
+
+
+def _source_name(path: str) -> str:
+    # A rotated segment keeps its name with .gz appended
+    name = os.path.basename(path)
+    return name[:-3] if name.endswith(".gz") else name
+
+
+def _read_lines(path: str, offset: int) -> Iterator[bytes]:
+    """Complete lines after `offset` uncompressed bytes"""
+    if path.endswith(".gz"):
+        # BufferedReader splits lines in C; GzipFile.readline is much slower
+        with io.BufferedReader(gzip.GzipFile(path, "rb"), buffer_size=1 << 20) as f:
+            skipped = 0
+            for line in f:
+                if skipped < offset:
+                    skipped += len(line)
+                    continue
+                if line.endswith(b"\n"):
+                    yield line
+        return
+    with open(path, "rb", buffering=1 << 20) as f:
+        f.seek(offset)
+        for line in f:
+            # A partial last line is still being written; read it next time
+            if line.endswith(b"\n"):
+                yield line
+
+
+class Ingester:
+    """Folds monitor log events into per-minute and per-hour rollups"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.sketch = QuantileSketch()
+        self._names: Dict[str, int] = dict(
+            (name, name_id) for name_id, name in conn.execute("SELECT id, name FROM names")
+        )
+        self.events = 0
+        self.skipped_files = 0
+
+    def _name_id(self, name: str) -> int:
+        name_id = self._names.get(name)
+        if name_id is None:
+            self.conn.execute("INSERT OR IGNORE INTO names (name) VALUES (?)", (name,))
+            name_id = self.conn.execute("SELECT id FROM names WHERE name = ?", (name,)).fetchone()[0]
+            self._names[name] = name_id
+        return name_id
+
+    def ingest_file(self, path: str):
+        name = _source_name(path)
+        row = self.conn.execute(
+            "SELECT offset, compressed_size FROM sources WHERE name = ?", (name,)
+        ).fetchone()
+        offset, compressed_size = row if row else (0, None)
+        size = os.path.getsize(path)
+        if path.endswith(".gz"):
+            if compressed_size == size:
+                self.skipped_files += 1
+                return
+        elif size <= offset:
+            self.skipped_files += 1
+            return
+
+        rollups: Dict[Tuple[str, str, int], _Rollup] = {}
+        read = 0
+        for line in _read_lines(path, offset):
+            read += len(line)
+            try:
+                entry = _loads(line)
+                data = entry["data"]
+                key = (
+                    data["service"],
+                    data["operation"].split(":", 1)[0],
+                    int(data["timestamp"] // 60),
+                )
+            except (ValueError, KeyError, TypeError, AttributeError):
+                continue
+            rollup = rollups.get(key)
+            if rollup is None:
+                rollup = rollups[key] = _Rollup()
+            kind = entry.get("type")
+            if kind == "request":
+                duration = data.get("duration") or 0.0
+                rollup.requests += 1
+                if data.get("success"):
+                    rollup.successful += 1
+                rollup.duration_sum += duration
+                rollup.min = duration if rollup.min is None else min(rollup.min, duration)
+                rollup.max = duration if rollup.max is None else max(rollup.max, duration)
+                bucket = self.sketch.bucket_key(duration)
+                bucket = ZERO_BUCKET if bucket is None else bucket
+                rollup.buckets[bucket] = rollup.buckets.get(bucket, 0) + 1
+            elif kind == "error":
+                rollup.errors += 1
+            elif kind == "retry":
+                rollup.retries += 1
+            self.events += 1
+
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._write("minute", rollups)
+            hours: Dict[Tuple[str, str, int], _Rollup] = {}
+            for (service, operation, minute), rollup in rollups.items():
+                key = (service, operation, minute // 60 * 60)
+                hour = hours.get(key)
+                if hour is None:
+                    hour = hours[key] = _Rollup()
+                hour.merge(rollup)
+            self._write("hour", hours)
+            self.conn.execute(
+                "INSERT INTO sources (name, offset, compressed_size, ingested_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET offset = excluded.offset, "
+                "compressed_size = excluded.compressed_size, ingested_at = excluded.ingested_at",
+                (
+                    name,
+                    offset + read,
+                    size if path.endswith(".gz") else None,
+                    time.time(),
+                ),
+            )
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def _write(self, resolution: str, rollups: Dict[Tuple[str, str, int], _Rollup]):
+        rows = []
+        latency_rows = []
+        for (service, operation, period), rollup in rollups.items():
+            service_id = self._name_id(service)
+            operation_id = self._name_id(operation)
+            rows.append(
+                (
+                    service_id,
+                    operation_id,
+                    period,
+                    rollup.requests,
+                    rollup.successful,
+                    rollup.errors,
+                    rollup.retries,
+                    rollup.duration_sum,
+                    rollup.min,
+                    rollup.max,
+                )
+            )
+            latency_rows.extend(
+                (service_id, operation_id, period, bucket, count)
+                for bucket, count in rollup.buckets.items()
+            )
+        self.conn.executemany(
+            f"INSERT INTO rollups_{resolution} VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (service, operation, period) DO UPDATE SET "
+            "requests = requests + excluded.requests, "
+            "successful = successful + excluded.successful, "
+            "errors = errors + excluded.errors, "
+            "retries = retries + excluded.retries, "
+            "duration_sum = duration_sum + excluded.duration_sum, "
+            "duration_min = min(coalesce(duration_min, excluded.duration_min), "
+            "coalesce(excluded.duration_min, duration_min)), "
+            "duration_max = max(coalesce(duration_max, excluded.duration_max), "
+            "coalesce(excluded.duration_max, duration_max))",
+            rows,
+        )
+        self.conn.executemany(
+            f"INSERT INTO latency_{resolution} VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (service, operation, period, bucket) DO UPDATE SET "
+            "count = count + excluded.count",
+            latency_rows,
+        )
+
+
+def ingest(conn: sqlite3.Connection, log_dir: str) -> Dict[str, float]:
+    started = time.time()
+    # Plain segments first, so a segment rotated since the last run continues from its offset
+    paths = sorted(glob.glob(os.path.join(log_dir, "monitor_*.json"))) + sorted(
+        glob.glob(os.path.join(log_dir, "monitor_*.json.gz"))
+    )
+    ingester = Ingester(conn)
+    for path in paths:
+        ingester.ingest_file(path)
+    return {
+        "files": len(paths),
+        "unchanged": ingester.skipped_files,
+        "events": ingester.events,
+        "seconds": round(time.time() - started, 2),
+    }
+
+
+def parse_time(value: Optional[str], now: float) -> Optional[int]:
+    """Minute number of "30d", "12h", "45m" (ago) or an ISO date/time"""
+    if value is None:
+        return None
+    match = re.fullmatch(r"(\d+)([dhm])", value)
+    if match:
+        seconds = int(match.group(1)) * {"d": 86400, "h": 3600, "m": 60}[match.group(2)]
+        return int((now - seconds) // 60)
+    return int(datetime.fromisoformat(value).timestamp() // 60)
+
+
+def query(
+    conn: sqlite3.Connection,
+    since: Optional[int] = None,
+    until: Optional[int] = None,
+    service: Optional[str] = None,
+    operation: Optional[str] = None,
+    window: Optional[int] = None,
+    quantiles: Iterable[float] = (0.5, 0.95, 0.99),
+) -> List[Dict]:
+    """Statistics per window (of `window` minutes, or the whole range), service and operation"""
+    step = 60 if window is None or window % 60 == 0 else 1
+    resolution = RESOLUTIONS[step]
+    bounds = conn.execute(f"SELECT min(period), max(period) FROM rollups_{resolution}").fetchone()
+    if bounds[0] is None:
+        return []
+    since = bounds[0] if since is None else since // step * step
+    until = bounds[1] + step if until is None else -(-until // step) * step
+
+    conditions = ["r.period >= ?", "r.period < ?"]
+    params: List = [since, until]
+    if service is not None:
+        conditions.append("s.name = ?")
+        params.append(service)
+    if operation is not None:
+        conditions.append("o.name = ?")
+        params.append(operation)
+    where = " AND ".join(conditions)
+    # Windows are aligned to multiples of their length, e.g. full hours and UTC days
+    group = f"(r.period / {window}) * {window}" if window else str(since)
+    joins = "JOIN names s ON s.id = r.service JOIN names o ON o.id = r.operation"
+
+    stats: Dict[Tuple[int, str, str], Dict] = {}
+    for row in conn.execute(
+        f"SELECT {group} AS start, s.name, o.name, sum(r.requests), sum(r.successful), "
+        f"sum(r.errors), sum(r.retries), sum(r.duration_sum), min(r.duration_min), "
+        f"max(r.duration_max) FROM rollups_{resolution} r {joins} WHERE {where} "
+        f"GROUP BY start, r.service, r.operation",
+        params,
+    ):
+        start, service_name, operation_name = row[0], row[1], row[2]
+        stats[(start, service_name, operation_name)] = {
+            "start": start,
+            "service": service_name,
+            "operation": operation_name,
+            "requests": row[3],
+            "successful": row[4],
+            "errors": row[5],
+            "retries": row[6],
+            "duration_sum": row[7],
+            "duration_min": row[8],
+            "duration_max": row[9],
+            "buckets": {},
+        }
+
+    for start, service_name, operation_name, bucket, count in conn.execute(
+        f"SELECT {group} AS start, s.name, o.name, r.bucket, sum(r.count) "
+        f"FROM latency_{resolution} r {joins} WHERE {where} "
+        f"GROUP BY start, r.service, r.operation, r.bucket",
+        params,
+    ):
+        stats[(start, service_name, operation_name)]["buckets"][bucket] = count
+
+    results = []
+    for (start, _, _), entry in sorted(stats.items()):
+        sketch = QuantileSketch()
+        buckets = entry.pop("buckets")
+        if entry["requests"]:
+            zero_count = buckets.pop(ZERO_BUCKET, 0)
+            sketch.add_counts(
+                buckets,
+                zero_count,
+                entry["duration_sum"],
+                entry["duration_min"],
+                entry["duration_max"],
+            )
+        end = min(start + window, until) if window else until
+        minutes = max(1, end - max(start, since))
+        requests = entry["requests"]
+        entry.update(
+            {
+                "error_rate": 1 - entry["successful"] / requests if requests else 0.0,
+                "retry_rate": entry["retries"] / requests if requests else 0.0,
+                "throughput": entry["successful"] / minutes,
+                "avg_duration": entry["duration_sum"] / requests if requests else 0.0,
+                "quantiles": sketch.quantiles(quantiles),
+            }
+        )
+        results.append(entry)
+    return results
+
+
+def format_results(results: List[Dict], window: Optional[int]) -> str:
+    header = (
+        f"{'window':<17} {'service':<22} {'operation':<28} {'requests':>8} {'errors':>7} "
+        f"{'retries':>7} {'/min':>7} {'avg':>8} {'p50':>8} {'p95':>8} {'p99':>8}"
+    )
+    lines = [header]
+    for entry in results:
+        start = (
+            datetime.fromtimestamp(entry["start"] * 60).strftime("%Y-%m-%d %H:%M")
+            if window
+            else "all"
+        )
+        quantiles = entry["quantiles"]
+        lines.append(
+            f"{start:<17} {entry['service'][:22]:<22} {entry['operation'][:28]:<28} "
+            f"{entry['requests']:>8} {entry['error_rate']:>7.1%} {entry['retry_rate']:>7.1%} "
+            f"{entry['throughput']:>7.2f} {entry['avg_duration']:>7.2f}s "
+            f"{quantiles[0.5]:>7.2f}s {quantiles[0.95]:>7.2f}s {quantiles[0.99]:>7.2f}s"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline analytics over the monitor logs")
+    parser.add_argument(
+        "--db", default="data/monitor_analytics.sqlite3", help="rollup database"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ingest_parser = commands.add_parser("ingest", help="add new monitor log events to the rollups")
+    ingest_parser.add_argument("--logs", default="logs", help="monitor log directory")
+
+    query_parser = commands.add_parser("query", help="latency, error, retry and throughput statistics")
+    query_parser.add_argument("--since", help='start, e.g. "30d", "12h" or "2026-10-01"')
+    query_parser.add_argument("--until", help="end, same formats as --since")
+    query_parser.add_argument("--service", help="only this service, e.g. AIService")
+    query_parser.add_argument("--operation", help="only this operation, e.g. extract_partie_data")
+    query_parser.add_argument(
+        "--by", choices=list(WINDOWS), default="none", help="window length (default: whole range)"
+    )
+    query_parser.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    query_parser.add_argument(
+        "--ingest", metavar="LOGS", help="ingest this log directory before querying"
+    )
+    args = parser.parse_args(argv)
+
+    conn = connect(args.db)
+    if args.command == "ingest":
+        stats = ingest(conn, args.logs)
+        print(
+            f"Ingested {stats['events']} events from {stats['files'] - stats['unchanged']} "
+            f"of {stats['files']} files in {stats['seconds']}s"
+        )
+        return 0
+
+    if args.ingest:
+        ingest(conn, args.ingest)
+    now = time.time()
+    window = WINDOWS[args.by]
+    results = query(
+        conn,
+        since=parse_time(args.since, now),
+        until=parse_time(args.until, now),
+        service=args.service,
+        operation=args.operation,
+        window=window,
+    )
+    if not results:
+        print("No events in the selected range; run `python -m tools.analytics ingest` first")
+        return 1
+    if args.json:
+        print(json.dumps(results, indent=2, default=str))
+    else:
+        print(format_results(results, window))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+"""
+Print the stages of a packing list job as a waterfall.
+
+Reads the span files written by app.services.tracing (TRACE_DIR, including
+rotated .json.gz segments) and shows every span of one job with its start
+offset, duration and a bar on a shared time axis, nested by parent.
+
+Usage:
+    python -m tools.waterfall email-7f3a9c1e-42
+    python -m tools.waterfall 3f0c1c2e-...-upload-job-id --dir logs/traces
+    python -m tools.waterfall --list
+"""
+
+import argparse
+import gzip
+import json
+import sys
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from app.services.tracing import SPAN_PREFIX, trace_id_for
+
+# Attributes shown next to a span name
+SHOWN_ATTRIBUTES = (
+    "filename",
+    "partie_no",
+    "model",
+    "input_tokens",
+    "output_tokens",
+    "attempt",
+    "attempts",
+    "delay",
+    "bytes",
+)
+
+
+def iter_spans(trace_dir: Path) -> Iterator[Dict]:
+    """All spans in a directory, oldest segment first"""
+    paths = sorted(trace_dir.glob(f"{SPAN_PREFIX}_*.json*"), key=lambda p: p.stat().st_mtime)
+    for path in paths:
+        opener = gzip.open if path.suffix == ".gz" else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # A line cut short by a crash
+                    continue
+
+
+def load_trace(trace_dir: Path, job_or_trace_id: str) -> List[Dict]:
+    wanted = {job_or_trace_id, trace_id_for(job_or_trace_id)}
+    return [span for span in iter_spans(trace_dir) if span.get("trace_id") in wanted]
+
+
+def _ordered(spans: List[Dict]) -> List[tuple]:
+    """(depth, span) pairs, children after their parent, siblings by start time"""
+    ids = {span["span_id"] for span in spans}
+    children: Dict[Optional[str], List[Dict]] = {}
+    for span in spans:
+        parent = span.get("parent_span_id")
+        # Spans whose parent was not written (e.g. the process died) are shown as roots
+        children.setdefault(parent if parent in ids else None, []).append(span)
+
+    ordered = []
+
+    def visit(parent: Optional[str], depth: int):
+        for span in sorted(children.get(parent, []), key=lambda s: s["start_time"]):
+            ordered.append((depth, span))
+            visit(span["span_id"], depth + 1)
+
+    visit(None, 0)
+    return ordered
+
+
+def render(spans: List[Dict], width: int = 40) -> str:
+    start = min(span["start_time"] for span in spans)
+    end = max(span["end_time"] for span in spans)
+    total = max(end - start, 1e-9)
+    rows = _ordered(spans)
+    name_width = max(len("  " * depth + span["name"]) for depth, span in rows)
+
+    job_id = spans[0].get("job_id")
+    lines = [
+        f"Job {job_id}  trace {spans[0]['trace_id']}  {len(spans)} spans  {total:.3f}s",
+        "",
+        f"{'start':>10} {'duration':>10}  {'stage':<{name_width}}  timeline",
+    ]
+    for depth, span in rows:
+        offset = span["start_time"] - start
+        duration = span["end_time"] - span["start_time"]
+        first = int(offset / total * width)
+        length = max(1, round(duration / total * width))
+        bar = " " * first + "#" * min(length, width - first)
+        name = "  " * depth + span["name"]
+        attributes = span.get("attributes") or {}
+        details = " ".join(
+            f"{key}={attributes[key]}" for key in SHOWN_ATTRIBUTES if key in attributes
+        )
+        if span.get("status") == "error":
+            details = f"ERROR {span.get('error')} {details}".strip()
+        lines.append(
+            f"{offset:>9.3f}s {duration:>9.3f}s  {name:<{name_width}}  |{bar:<{width}}| {details}".rstrip()
+        )
+    return "\n".join(lines)
+
+
+def list_jobs(trace_dir: Path, limit: int) -> str:
+    jobs: Dict[str, Dict] = {}
+    for span in iter_spans(trace_dir):
+        if span.get("parent_span_id") is not None:
+            continue
+        job = jobs.setdefault(
+            span["job_id"], {"start": span["start_time"], "end": span["end_time"], "error": False}
+        )
+        job["start"] = min(job["start"], span["start_time"])
+        job["end"] = max(job["end"], span["end_time"])
+        job["error"] = job["error"] or span.get("status") == "error"
+    recent = sorted(jobs.items(), key=lambda item: item[1]["start"])[-limit:]
+    return "\n".join(
+        f"{job_id:<40} {job['end'] - job['start']:>9.3f}s{'  failed' if job['error'] else ''}"
+        for job_id, job in recent
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Print the stage waterfall of a packing list job")
+    parser.add_argument("job", nargs="?", help="job id (e.g. email-7f3a9c1e-42 or an upload job id) or trace id")
+    parser.add_argument("--dir", default="logs/traces", help="span directory (TRACE_DIR)")
+    parser.add_argument("--width", type=int, default=40, help="width of the timeline in characters")
+    parser.add_argument("--list", action="store_true", help="list the most recent traced jobs")
+    parser.add_argument("--limit", type=int, default=20, help="jobs shown by --list")
+    args = parser.parse_args(argv)
+
+    trace_dir = Path(args.dir)
+    if args.list:
+        print(list_jobs(trace_dir, args.limit) or f"No spans in {trace_dir}")
+        return 0
+    if not args.job:
+        parser.error("a job id is required unless --list is given")
+
+    spans = load_trace(trace_dir, args.job)
+    if not spans:
+        print(f"No spans for {args.job} in {trace_dir}")
+        return 1
+    print(render(spans, args.width))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())